@@ -1,10 +1,18 @@
 import streamlit as st
-from workflow import app
+from tripcraft_config import load_env
+
+load_env()
+
+from workflow import preload_llm, stream_plan, format_day_as_markdown
 from helper_func import clean_itinerary, clean_weather
+from progress_events import format_progress
 
 
 st.set_page_config(page_title="Travel Planner AI", page_icon="🌍", layout="wide")
 
+# Load the model while the user fills in the form; safe to call on every rerun
+preload_llm()
+
 st.title("🌍 AI Travel Planner")
 st.write("Plan your trip with an AI-powered itinerary generator.")
 
@@ -30,7 +38,22 @@ if submitted:
             "dates": dates
         }
         try:
-            result = app.invoke({"preferences": preferences})
+            # Render each day as soon as it is generated instead of waiting for the whole plan
+            status = st.empty()
+            preview = st.empty()
+            streamed_days = []
+            result = {}
+            for event in stream_plan(preferences):
+                if event["event"] == "day":
+                    streamed_days.append(format_day_as_markdown(event["day"]))
+                    preview.markdown("\n".join(streamed_days))
+                elif event["event"] == "done":
+                    result = event["result"]
+                else:
+                    status.caption(format_progress(event))
+            status.empty()
+            preview.empty()
+
             itinerary = clean_itinerary(result.get("itinerary", "No itinerary generated."))
             weather = clean_weather(result.get("weather", "No weather data available."))
 
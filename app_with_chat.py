@@ -1,14 +1,20 @@
 import streamlit as st
+from tripcraft_config import load_env
+
+load_env()
 
 # Try to import regular workflow, fallback to simplified
 try:
-    from workflow import app
+    from workflow import app, preload_llm, stream_plan, format_day_as_markdown
     print("✅ Using LangGraph workflow")
+    # Load the model while the user fills in the form; safe to call on every rerun
+    preload_llm()
 except (ImportError, ModuleNotFoundError):
-    from workflow_simple import app
+    from workflow_simple import app, stream_plan, format_day_as_markdown
     print("✅ Using simplified workflow (LangGraph not available)")
 
 from helper_func import clean_itinerary, clean_weather
+from progress_events import format_progress
 from chat_widget import ChatWidget
 from supabase_helpers import save_itinerary, is_supabase_configured
 import uuid
@@ -41,7 +47,22 @@ if submitted:
         }
 
         try:
-            result = app.invoke({"preferences": preferences})
+            # Render each day as soon as it is generated instead of waiting for the whole plan
+            status = st.empty()
+            preview = st.empty()
+            streamed_days = []
+            result = {}
+            for event in stream_plan(preferences):
+                if event["event"] == "day":
+                    streamed_days.append(format_day_as_markdown(event["day"]))
+                    preview.markdown("\n".join(streamed_days))
+                elif event["event"] == "done":
+                    result = event["result"]
+                else:
+                    status.caption(format_progress(event))
+            status.empty()
+            preview.empty()
+
             itinerary = clean_itinerary(result.get("itinerary", "No itinerary generated."))
             weather = clean_weather(result.get("weather", "No weather data available."))
             itinerary_json = result.get("itinerary_json", {})
@@ -1,6 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from backend.routes import chat
+from fastapi.responses import PlainTextResponse
+from tripcraft_config import load_env
+
+load_env()
+
+from backend.routes import chat, plan
+from metrics import REGISTRY
 import uvicorn
 
 app = FastAPI(title="Itinerary Planner Backend", version="1.0.0")
@@ -14,6 +20,7 @@ app.add_middleware(
 )
 
 app.include_router(chat.router)
+app.include_router(plan.router)
 
 
 @app.get("/")
@@ -30,5 +37,11 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Planning metrics in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
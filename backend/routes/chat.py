@@ -6,13 +6,16 @@ import uuid
 import os
 from datetime import datetime
 import json
+import re
 from backend.supabase_client import supabase
-from tripcraft_config import build_edit_prompt, extract_json_from_text
+from tripcraft_config import build_edit_prompt, extract_json_from_text, edit_schema_errors
+from openai_backend import get_openai_backend
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 NLP_SERVICE_URL = "http://localhost:8001"
 USE_OPENAI_FALLBACK = os.getenv("OPENAI_API_KEY") is not None
+OPENAI_FALLBACK_TIMEOUT = 10.0
 
 
 class ChatMessageRequest(BaseModel):
@@ -185,6 +188,13 @@ async def apply_edit(request: ApplyEditRequest):
             request.edit_command
         )
 
+        introduced = edit_schema_errors(before_snapshot, updated_content)
+        if introduced:
+            raise HTTPException(
+                status_code=422,
+                detail={"message": "Edit would make the itinerary invalid", "errors": [str(e) for e in introduced]}
+            )
+
         change_id = f"change_{uuid.uuid4().hex[:8]}"
 
         await supabase.table("itineraries") \
@@ -220,6 +230,8 @@ async def apply_edit(request: ApplyEditRequest):
             message="Edit applied successfully"
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -271,73 +283,128 @@ async def undo_edit(request: UndoEditRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Start times for the parser's named time slots
+TIME_SLOTS = {"morning": "09:00", "afternoon": "14:00", "evening": "19:00", "night": "21:00"}
+DEFAULT_ACTIVITY_MINUTES = 120
+
+
+def _clock_time(value: Any, default: Optional[str] = None) -> Optional[str]:
+    """HH:MM for a parsed time ("morning", "7pm", "14:30"); other text is kept as it is"""
+    if value is None or value == "":
+        return default
+    text = str(value).strip().lower()
+    if text in TIME_SLOTS:
+        return TIME_SLOTS[text]
+    match = re.fullmatch(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", text)
+    if not match:
+        return str(value)
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    return f"{hour:02d}:{minute:02d}" if hour < 24 and minute < 60 else str(value)
+
+
+def _minutes(clock: Any) -> Optional[int]:
+    match = re.fullmatch(r"(\d{2}):(\d{2})", str(clock))
+    return int(match.group(1)) * 60 + int(match.group(2)) if match else None
+
+
+def _shift_clock(clock: str, minutes: int) -> str:
+    start = _minutes(clock)
+    if start is None:
+        return clock
+    end = min(start + minutes, 23 * 60 + 59)
+    return f"{end // 60:02d}:{end % 60:02d}"
+
+
+def _duration_minutes(value: Any) -> int:
+    match = re.search(r"(\d+(?:\.\d+)?)\s*(h|hour|hours|m|min|mins|minutes)?\b", str(value or ""))
+    if not match:
+        return DEFAULT_ACTIVITY_MINUTES
+    amount = float(match.group(1))
+    return int(amount * 60) if (match.group(2) or "h").startswith("h") else int(amount)
+
+
+def _day_plan(updated: Dict, day: Any, create: bool = False) -> Optional[Dict]:
+    """The daily_plans entry for a day number; create adds one without a date (which the schema rejects)"""
+    try:
+        day_number = int(day)
+    except (TypeError, ValueError):
+        return None
+    plans = updated.setdefault("daily_plans", []) if create else updated.get("daily_plans") or []
+    for plan in plans:
+        if isinstance(plan, dict) and plan.get("day") == day_number:
+            plan.setdefault("activities", [])
+            return plan
+    if not create:
+        return None
+    plan = {"day": day_number, "activities": []}
+    plans.append(plan)
+    return plan
+
+
 def _apply_edit_command(itinerary: Dict, command: Dict) -> Dict:
+    """Apply a parsed edit command to stored itinerary content (daily_plans, total_estimated_cost)
+
+    Days are matched by their "day" number and activities by title (or id).
+    The result is not validated here; apply_edit rejects edits that break the schema.
+    """
     action = command.get("action")
     target = command.get("target")
 
     updated = json.loads(json.dumps(itinerary))
 
     if action == "add" and target == "activity":
-        day_num = command.get("day", 1)
-        day_key = f"day_{day_num}"
-
-        if day_key not in updated:
-            updated[day_key] = {"activities": []}
-
-        new_activity = {
-            "id": f"act_{uuid.uuid4().hex[:8]}",
-            "name": command.get("poi", "New Activity"),
-            "time_slot": command.get("time_slot", "morning"),
-            "duration": command.get("duration", "2 hours"),
-            "cost": 0
-        }
-
-        if "activities" not in updated[day_key]:
-            updated[day_key]["activities"] = []
-
-        updated[day_key]["activities"].append(new_activity)
+        plan = _day_plan(updated, command.get("day", 1), create=True)
+        if plan is not None:
+            start_time = _clock_time(command.get("start_time") or command.get("time_slot"), TIME_SLOTS["morning"])
+            plan["activities"].append({
+                "id": f"act_{uuid.uuid4().hex[:8]}",
+                "start_time": start_time,
+                "end_time": _shift_clock(start_time, _duration_minutes(command.get("duration"))),
+                "title": command.get("poi", "New Activity"),
+                "type": command.get("activity_type", "activity")
+            })
 
     elif action == "remove" and target == "activity":
-        day_num = command.get("day")
+        plan = _day_plan(updated, command.get("day"))
         poi = command.get("poi")
         activity_id = command.get("activity_id")
 
-        if day_num:
-            day_key = f"day_{day_num}"
-            if day_key in updated and "activities" in updated[day_key]:
-                activities = updated[day_key]["activities"]
-                updated[day_key]["activities"] = [
-                    act for act in activities
-                    if act.get("id") != activity_id and act.get("name") != poi
-                ]
+        if plan is not None:
+            plan["activities"] = [
+                act for act in plan["activities"]
+                if not (activity_id and act.get("id") == activity_id) and not (poi and act.get("title") == poi)
+            ]
 
     elif action == "update" and target == "budget":
-        updated["total_budget"] = command.get("amount", updated.get("total_budget", 0))
+        updated["total_estimated_cost"] = command.get("amount", updated.get("total_estimated_cost", 0))
 
     elif action == "update" and target == "hotel":
-        day_num = command.get("day")
         hotel_name = command.get("hotel_name")
+        plan = _day_plan(updated, command.get("day"))
 
-        if day_num:
-            day_key = f"day_{day_num}"
-            if day_key not in updated:
-                updated[day_key] = {}
-            updated[day_key]["hotel"] = hotel_name
-        else:
+        if plan is not None:
+            plan["hotel"] = hotel_name
+        elif not command.get("day"):
             updated["default_hotel"] = hotel_name
 
     elif action == "update" and target == "time":
-        day_num = command.get("day")
-        new_time = command.get("new_time")
+        plan = _day_plan(updated, command.get("day"))
+        new_time = _clock_time(command.get("new_time"))
         poi = command.get("poi")
 
-        if day_num and new_time:
-            day_key = f"day_{day_num}"
-            if day_key in updated and "activities" in updated[day_key]:
-                for activity in updated[day_key]["activities"]:
-                    if activity.get("name") == poi:
-                        activity["time_slot"] = new_time
-                        break
+        if plan is not None and new_time:
+            for activity in plan["activities"]:
+                if activity.get("title") == poi:
+                    # Keep the activity's length when both times are clock times
+                    start, end = _minutes(activity.get("start_time")), _minutes(activity.get("end_time"))
+                    activity["start_time"] = new_time
+                    if start is not None and end is not None and end >= start:
+                        activity["end_time"] = _shift_clock(new_time, end - start)
+                    break
 
     return updated
 
@@ -397,29 +464,21 @@ def _compute_diff(before: Dict, after: Dict) -> Dict:
 async def parse_with_openai_fallback(message: str, itinerary: Dict[str, Any]) -> Dict[str, Any]:
     """Use OpenAI as fallback for NLP parsing"""
     try:
-        import openai
-
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-
         prompt = build_edit_prompt(message, itinerary)
 
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[
+        result_text = await get_openai_backend().acomplete(
+            [
                 {"role": "system", "content": "You are TripCraft's NLP parser. Parse user edit requests and return structured JSON."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=500
+            max_tokens=500,
+            timeout=OPENAI_FALLBACK_TIMEOUT
         )
-
-        result_text = response.choices[0].message.content.strip()
         parsed_data = extract_json_from_text(result_text)
 
         return parsed_data
 
-    except ImportError:
-        raise Exception("OpenAI package not installed. Run: pip install openai")
     except Exception as e:
         return {
             "intent": "unknown",
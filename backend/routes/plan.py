@@ -0,0 +1,76 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, Any, Optional
+import json
+
+from deadlines import plan_config
+
+router = APIRouter(prefix="/api/plan", tags=["plan"])
+
+
+class PlanRequest(BaseModel):
+    preferences: Dict[str, Any]
+    bypass_cache: bool = False
+    # Time budget in seconds; None uses TRIPCRAFT_PLAN_SLA, 0 means no limit
+    sla_seconds: Optional[float] = None
+    # An earlier result's preferences and itinerary_json: only the days the
+    # changed preferences affect are generated again
+    previous_preferences: Optional[Dict[str, Any]] = None
+    previous_itinerary: Optional[Dict[str, Any]] = None
+
+
+# Request inputs that are part of the workflow state but not of the plan
+INPUT_KEYS = {"bypass_cache", "previous_preferences", "previous_itinerary"}
+
+
+def public_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in result.items() if key not in INPUT_KEYS}
+
+
+def planning_workflow():
+    """The LangGraph workflow, or the simplified one where LangGraph is not installed
+
+    Imported on first use so the chat endpoints start without loading the planner.
+    """
+    try:
+        import workflow
+        # Importing it does not load langgraph; compiling the graph does
+        workflow.compiled_app()
+    except ImportError:
+        import workflow_simple as workflow
+    return workflow
+
+
+@router.post("")
+async def plan_trip(request: PlanRequest):
+    """Plan a trip on the server's event loop; concurrent requests plan concurrently"""
+    if not request.preferences.get("destination"):
+        raise HTTPException(status_code=422, detail="preferences.destination is required")
+
+    result = await planning_workflow().app.ainvoke({
+        "preferences": request.preferences,
+        "bypass_cache": request.bypass_cache,
+        "previous_preferences": request.previous_preferences,
+        "previous_itinerary": request.previous_itinerary
+    }, plan_config(request.sla_seconds))
+    return public_result(result)
+
+
+@router.post("/stream")
+async def plan_trip_stream(request: PlanRequest):
+    """Newline-delimited JSON progress events, ending with {"event": "done", "result": {...}}"""
+    if not request.preferences.get("destination"):
+        raise HTTPException(status_code=422, detail="preferences.destination is required")
+
+    async def events():
+        async for event in planning_workflow().astream_progress(
+            request.preferences,
+            request.bypass_cache,
+            sla_seconds=request.sla_seconds
+        ):
+            if event["event"] == "done":
+                event = {"event": "done", "result": public_result(event["result"])}
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
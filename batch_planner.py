@@ -0,0 +1,163 @@
+"""
+Bulk itinerary planning
+Plans an iterable of preferences with a bounded number of plans in flight on
+one event loop and yields a record per input as soon as it finishes. Inputs
+are pulled lazily and records are not kept, so memory stays flat however
+long the batch is. Shared destination and weather searches are coalesced and
+cached by search_cache; LLM calls are bounded per backend by the router.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, Optional
+
+from deadlines import plan_config
+
+DEFAULT_BATCH_WORKERS = int(os.getenv("TRIPCRAFT_BATCH_WORKERS", "8"))
+
+# Keys of the workflow result written to batch records
+RESULT_KEYS = ("itinerary_json", "weather", "errors", "prompt_stats")
+
+
+def batch_preferences(item: Any) -> Dict[str, Any]:
+    """The preferences in a batch item, or ValueError if it cannot be planned"""
+    if not isinstance(item, dict):
+        raise ValueError(f"expected a preferences object, got {type(item).__name__}")
+    if not str(item.get("destination", "")).strip():
+        raise ValueError("preferences.destination is required")
+    return item
+
+
+def _default_ainvoke() -> Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]:
+    from workflow import app
+    return app.ainvoke
+
+
+async def aplan_many(
+    preferences_iterable: Iterable[Any],
+    workers: Optional[int] = None,
+    bypass_cache: bool = False,
+    ainvoke: Optional[Callable[..., Awaitable[Dict[str, Any]]]] = None,
+    sla_seconds: Optional[float] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Plan every item, yielding records in completion order
+
+    Each record has the input's position ("index"), its "id" if it had one,
+    a "status" of "ok", "fallback" (the workflow fell back to a basic
+    itinerary; see "errors") or "error" (the item could not be planned) and
+    the plan's duration in seconds.
+
+    Args:
+        preferences_iterable: Preferences dicts; read lazily
+        workers: Plans in flight at once (default TRIPCRAFT_BATCH_WORKERS)
+        bypass_cache: Regenerate even when a cached itinerary exists
+        ainvoke: Planner coroutine taking (state, config) (default: the LangGraph app's ainvoke)
+        sla_seconds: Time budget per plan, from when it starts (default
+            TRIPCRAFT_PLAN_SLA); plans short of time degrade instead of waiting
+    """
+    workers = max(1, workers or DEFAULT_BATCH_WORKERS)
+    ainvoke = ainvoke or _default_ainvoke()
+    items = enumerate(preferences_iterable)
+
+    async def plan_one(index: int, item: Any) -> Dict[str, Any]:
+        record = {"index": index}
+        if isinstance(item, dict) and "id" in item:
+            record["id"] = item["id"]
+        start = time.perf_counter()
+        try:
+            preferences = batch_preferences(item)
+            result = await ainvoke({"preferences": preferences, "bypass_cache": bypass_cache}, plan_config(sla_seconds))
+        except Exception as e:
+            record.update(status="error", input=item, error=f"{type(e).__name__}: {e}")
+        else:
+            record.update(
+                status="fallback" if result.get("errors") else "ok",
+                preferences=preferences,
+                **{key: result.get(key) for key in RESULT_KEYS}
+            )
+        record["duration"] = round(time.perf_counter() - start, 3)
+        return record
+
+    pending = set()
+
+    def refill():
+        while len(pending) < workers:
+            nxt = next(items, None)
+            if nxt is None:
+                return
+            pending.add(asyncio.ensure_future(plan_one(*nxt)))
+
+    refill()
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+            refill()
+    finally:
+        # The caller stopped early: do not leave plans running for nobody
+        for task in pending:
+            task.cancel()
+
+
+def plan_many(
+    preferences_iterable: Iterable[Any],
+    workers: Optional[int] = None,
+    bypass_cache: bool = False,
+    ainvoke: Optional[Callable[..., Awaitable[Dict[str, Any]]]] = None,
+    sla_seconds: Optional[float] = None
+) -> Iterator[Dict[str, Any]]:
+    """aplan_many for synchronous callers
+
+    The event loop runs in a background thread; at most `workers` finished
+    records wait for the caller, after which planning pauses until it catches up.
+    When the caller stops iterating early, the plans still running are cancelled.
+    """
+    workers = max(1, workers or DEFAULT_BATCH_WORKERS)
+    records: "queue.Queue" = queue.Queue(maxsize=workers)
+    stopped = threading.Event()
+    finished = object()
+    failure = []
+
+    def put(item) -> bool:
+        """Hand an item to the caller; False once it has stopped reading"""
+        while not stopped.is_set():
+            try:
+                records.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def forward():
+        plans = aplan_many(preferences_iterable, workers, bypass_cache, ainvoke, sla_seconds)
+        try:
+            async for record in plans:
+                if not await asyncio.to_thread(put, record):
+                    return
+        finally:
+            await plans.aclose()
+
+    def run():
+        try:
+            asyncio.run(forward())
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            put(finished)
+
+    thread = threading.Thread(target=run, name="plan-many", daemon=True)
+    thread.start()
+    try:
+        while True:
+            record = records.get()
+            if record is finished:
+                break
+            yield record
+    finally:
+        stopped.set()
+    thread.join()
+    if failure:
+        raise failure[0]
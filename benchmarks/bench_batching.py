@@ -0,0 +1,67 @@
+"""
+Throughput benchmark for the micro-batching queue in front of llm()
+
+    python benchmarks/bench_batching.py            # simulated model cost
+    python benchmarks/bench_batching.py --real     # TinyLlama via llm.generate_batch
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm_batching import MicroBatcher
+
+
+def simulated_generate_batch(prompts, step_s=0.05, per_item_s=0.005, **_):
+    """A generate call costs a fixed decode time plus a small per-row overhead"""
+    time.sleep(step_s + per_item_s * len(prompts))
+    return [f"completion for {p}" for p in prompts]
+
+
+def run(generate_one, concurrency: int, requests: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(generate_one, [f"prompt {i}" for i in range(requests)]))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--real", action="store_true", help="Use the local TinyLlama model")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--wait-ms", type=float, default=10)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.real:
+        import llm
+        llm.warmup()
+
+        def generate_batch(prompts, **_):
+            return llm.generate_batch(prompts, max_new_tokens=args.max_new_tokens)
+    else:
+        generate_batch = simulated_generate_batch
+
+    # Without the batcher every call holds the model for a full generate
+    model_lock = threading.Lock()
+
+    def generate_serial(prompt):
+        with model_lock:
+            return generate_batch([prompt])[0]
+
+    print(f"{'callers':>8} {'serial req/s':>14} {'batched req/s':>14} {'speedup':>8}")
+    for concurrency in (1, 4, 16):
+        batcher = MicroBatcher(generate_batch, max_batch_size=args.batch_size, max_wait_ms=args.wait_ms)
+        serial = run(generate_serial, concurrency, args.requests)
+        batched = run(batcher.generate, concurrency, args.requests)
+        batcher.close()
+        print(f"{concurrency:>8} {serial:>14.2f} {batched:>14.2f} {batched / serial:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
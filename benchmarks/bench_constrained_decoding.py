@@ -0,0 +1,60 @@
+"""
+Wasted-generation rate and latency with and without schema-constrained decoding
+
+    python benchmarks/bench_constrained_decoding.py [--runs 5] [--days 3]
+
+A generation is "wasted" when its output fails extract_json_from_text or
+validate_itinerary_json, i.e. generate_itinerary would fall back to
+create_fallback_itinerary. Requires transformers/torch and the TinyLlama weights.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ["TRIPCRAFT_MICRO_BATCHING"] = "0"
+
+import llm
+from tripcraft_config import build_itinerary_prompt, extract_json_from_text, validate_itinerary_json
+
+
+def run(prompt: str, constrained: bool, runs: int):
+    llm.USE_CONSTRAINED_DECODING = constrained
+    latencies, wasted = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = llm.llm(prompt, return_json=False)
+        latencies.append(time.perf_counter() - start)
+        try:
+            if not validate_itinerary_json(extract_json_from_text(output)):
+                wasted += 1
+        except ValueError:
+            wasted += 1
+    return wasted / runs, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--days", type=int, default=3)
+    args = parser.parse_args()
+
+    llm.warmup()
+    prompt = build_itinerary_prompt(
+        preferences={"destination": "Lisbon", "budget": 1200, "interests": ["history", "food"], "dates": "2025-05-01 to 2025-05-03"},
+        destination_info="Lisbon offers Belém Tower, Alfama and pastel de nata bakeries.",
+        num_days=args.days
+    )
+
+    print(f"{'mode':<14} {'wasted':>8} {'median latency':>16}")
+    for constrained in (False, True):
+        rate, latency = run(prompt, constrained, args.runs)
+        print(f"{'constrained' if constrained else 'free':<14} {rate:>7.0%} {latency:>15.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Tokens/sec, peak RSS and JSON-validity rate for each CPU inference profile
+
+    python benchmarks/bench_cpu_profiles.py [--profiles default int8 ...] [--runs 3] [--days 2]
+
+Every profile runs in its own subprocess, because thread settings are
+process-wide and peak RSS can only grow. An output is valid when it passes
+extract_json_from_text and validate_itinerary_json. Requires transformers/torch
+and the TinyLlama weights.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cpu_profiles import CPU_PROFILES
+
+
+def measure(profile: str, runs: int, days: int) -> dict:
+    """Load the model with one profile and time itinerary generations (runs in the child)"""
+    os.environ.pop("OPENAI_API_KEY", None)
+    os.environ["TRIPCRAFT_CPU_PROFILE"] = profile
+    os.environ["TRIPCRAFT_MICRO_BATCHING"] = "0"
+
+    import llm
+    from tripcraft_config import build_itinerary_prompt, extract_json_from_text, validate_itinerary_json
+
+    start = time.perf_counter()
+    llm.warmup()
+    load_seconds = time.perf_counter() - start
+
+    prompt = llm.format_chat_prompt(build_itinerary_prompt(
+        preferences={"destination": "Lisbon", "budget": 1200, "interests": ["history", "food"], "dates": "2025-05-01 to 2025-05-02"},
+        destination_info="Lisbon offers Belém Tower, Alfama and pastel de nata bakeries.",
+        num_days=days
+    ))
+    # The first call pays for torch.compile tracing; keep it out of the timings
+    llm.generate_batch([prompt], max_new_tokens=16)
+
+    tokens, seconds, valid = 0, 0.0, 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = llm.generate_batch([prompt])[0]
+        seconds += time.perf_counter() - start
+        tokens += len(llm.provider.tokenizer(output, add_special_tokens=False).input_ids)
+        try:
+            valid += bool(validate_itinerary_json(extract_json_from_text(output)))
+        except ValueError:
+            pass
+
+    return {
+        "profile": profile,
+        "load_seconds": load_seconds,
+        "tokens_per_second": tokens / seconds if seconds else 0.0,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "valid_rate": valid / runs
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=list(CPU_PROFILES), choices=list(CPU_PROFILES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.runs, args.days)))
+        return
+
+    print(f"{'profile':<15} {'load':>7} {'tok/s':>8} {'peak RSS':>10} {'valid':>7}")
+    for profile in args.profiles:
+        completed = subprocess.run(
+            [sys.executable, __file__, "--child", profile, "--runs", str(args.runs), "--days", str(args.days)],
+            capture_output=True,
+            text=True
+        )
+        if completed.returncode != 0:
+            print(f"{profile:<15} failed: {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{profile:<15} {r['load_seconds']:>6.1f}s {r['tokens_per_second']:>8.1f} "
+              f"{r['peak_rss_mb']:>8.0f}MB {r['valid_rate']:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Cold import time of the workflow modules, with a budget
+
+    python benchmarks/bench_import_time.py [--runs 7] [--budget-ms 150] [--modules workflow_simple workflow]
+
+Each run imports the module in a fresh interpreter with the mock backend and
+reports the median and fastest import. Exits non-zero when the first module's
+median exceeds the budget (default TRIPCRAFT_IMPORT_BUDGET_MS or 150), when an
+import prints anything, or when it loads a heavy dependency (langgraph,
+tavily, transformers, torch) that should wait for first use.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HEAVY_MODULES = ("langgraph", "tavily", "transformers", "torch")
+
+PROBE = """
+import io, json, sys, time
+from contextlib import redirect_stdout
+out = io.StringIO()
+start = time.perf_counter()
+with redirect_stdout(out):
+    import {module}
+seconds = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy, "output": out.getvalue()}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """One cold import of module in a fresh interpreter"""
+    env = dict(os.environ, TRIPCRAFT_LLM_BACKENDS="mock")
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("TRIPCRAFT_IMPORT_BUDGET_MS", "150")))
+    parser.add_argument("--modules", nargs="+", default=["workflow_simple", "workflow"])
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<16} {'median':>9} {'min':>9}  heavy imports")
+    for i, module in enumerate(args.modules):
+        samples = [measure(module) for _ in range(args.runs)]
+        timings = [s["seconds"] * 1000 for s in samples]
+        median = statistics.median(timings)
+        heavy = sorted({m for s in samples for m in s["heavy"]})
+        print(f"{module:<16} {median:>7.1f}ms {min(timings):>7.1f}ms  {', '.join(heavy) or '-'}")
+
+        if i == 0 and median > args.budget_ms:
+            failures.append(f"{module} imports in {median:.1f}ms, over the {args.budget_ms:g}ms budget")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at import time")
+        if any(s["output"] for s in samples):
+            failures.append(f"{module} prints at import: {samples[0]['output'].strip()!r}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
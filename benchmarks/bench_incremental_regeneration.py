@@ -0,0 +1,91 @@
+"""
+LLM tokens spent regenerating an itinerary after common preference edits
+
+    python benchmarks/bench_incremental_regeneration.py [--days 5] [--backend openai]
+
+For each edit, compares planning the new preferences from scratch (day by
+day) with replan_itinerary_by_day updating the earlier plan. Tokens are
+prompt plus output, counted with the backend's tokenizer (a character
+estimate when it is not available); outputs come from the mock LLM, so no
+model weights or API keys are needed.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from day_planner import plan_itinerary_by_day, replan_itinerary_by_day
+from llm_mock import generate_mock_itinerary
+from prompt_builder import active_token_counter
+
+DESTINATION_INFO = "Lisbon: São Jorge Castle, Alfama's fado houses, the Belém monuments and pastéis de nata."
+
+
+def trip_dates(start: str, num_days: int) -> str:
+    first = datetime.strptime(start, "%Y-%m-%d")
+    return f"{start} to {(first + timedelta(days=num_days - 1)).strftime('%Y-%m-%d')}"
+
+
+def counting_generate(counter, totals):
+    def generate(prompt: str) -> str:
+        output = generate_mock_itinerary(prompt)
+        totals["calls"] += 1
+        totals["tokens"] += counter.count(prompt) + counter.count(output)
+        return output
+    return generate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--backend", default=None, help="tokenizer to count with (default: the local model's)")
+    args = parser.parse_args()
+
+    counter = active_token_counter(args.backend)
+    base = {
+        "destination": "Lisbon",
+        "budget": 1500,
+        "interests": ["history", "food", "art"],
+        "dates": trip_dates("2025-05-01", args.days)
+    }
+    edits = {
+        "budget +50%": dict(base, budget=2250),
+        "budget -30%": dict(base, budget=1050),
+        "add interest": dict(base, interests=base["interests"] + ["nature"]),
+        "drop interest": dict(base, interests=base["interests"][:2]),
+        "shift dates": dict(base, dates=trip_dates("2025-06-10", args.days)),
+        "one more day": dict(base, dates=trip_dates("2025-05-01", args.days + 1)),
+        "new destination": dict(base, destination="Porto"),
+    }
+
+    previous = plan_itinerary_by_day(base, DESTINATION_INFO, args.days, generate_mock_itinerary)
+
+    print(f"Counting with {counter.name}, {args.days}-day trip")
+    print(f"{'edit':<16} {'full':>8} {'incremental':>12} {'days':>6} {'saved':>7}")
+    full_total = incremental_total = 0
+    for name, preferences in edits.items():
+        num_days = args.days + 1 if name == "one more day" else args.days
+
+        full = {"calls": 0, "tokens": 0}
+        plan_itinerary_by_day(preferences, DESTINATION_INFO, num_days, counting_generate(counter, full))
+
+        incremental = {"calls": 0, "tokens": 0}
+        updated = replan_itinerary_by_day(
+            previous, base, preferences, DESTINATION_INFO, num_days, counting_generate(counter, incremental)
+        )
+        if updated is None:
+            # Needs a full regeneration, as before
+            incremental = full
+
+        full_total += full["tokens"]
+        incremental_total += incremental["tokens"]
+        saved = 1 - incremental["tokens"] / full["tokens"]
+        print(f"{name:<16} {full['tokens']:>8} {incremental['tokens']:>12} {incremental['calls']:>3}/{num_days:<2} {saved:>6.0%}")
+
+    print(f"{'all edits':<16} {full_total:>8} {incremental_total:>12} {'':>6} {1 - incremental_total / full_total:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
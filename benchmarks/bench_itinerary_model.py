@@ -0,0 +1,98 @@
+"""
+Typed itinerary model and codec versus plain dicts and JSON
+
+    python benchmarks/bench_itinerary_model.py [--days 3 7 14] [--runs 300]
+
+For mock itineraries, reports the memory one decoded itinerary holds (a
+json.loads dict versus Itinerary records, measured with tracemalloc), the
+encoded size, and the time to encode and decode it: json.dumps/json.loads of
+the dict, then itinerary_model.encode/decode with compact JSON rows and with
+msgpack rows (skipped when msgpack is not installed). No model weights needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from itinerary_model import Itinerary, decode, encode
+from llm_mock import generate_mock_itinerary
+from tripcraft_config import build_itinerary_prompt
+
+
+def mock_itinerary(num_days: int) -> dict:
+    preferences = {
+        "destination": "Lisbon",
+        "budget": 300 * num_days,
+        "interests": ["food", "art", "history"],
+        "dates": f"2025-05-01 to 2025-05-{num_days:02d}"
+    }
+    return json.loads(generate_mock_itinerary(build_itinerary_prompt(preferences, "info", num_days)))
+
+
+def time_per_call(fn, value, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(value)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def retained_bytes(build, copies: int = 50) -> float:
+    """Memory held per object built by build(), averaged over a batch kept alive"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build() for _ in range(copies)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / copies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 14])
+    parser.add_argument("--runs", type=int, default=300)
+    args = parser.parse_args()
+
+    try:
+        import msgpack  # noqa: F401
+        formats = [("dict+json", None), ("rows json", False), ("rows msgpack", True)]
+    except ImportError:
+        print("msgpack not installed: skipping the msgpack rows")
+        formats = [("dict+json", None), ("rows json", False)]
+
+    for num_days in args.days:
+        document = mock_itinerary(num_days)
+        text = json.dumps(document)
+        dict_memory = retained_bytes(lambda: json.loads(text))
+        model_memory = retained_bytes(lambda: decode(encode(document, binary=False)))
+        print(
+            f"\n{num_days} days: {dict_memory / 1024:.1f}KB as dicts, {model_memory / 1024:.1f}KB as records "
+            f"({1 - model_memory / dict_memory:.0%} less)"
+        )
+
+        print(f"  {'format':<13} {'size':>8} {'encode':>9} {'decode':>9}")
+        itinerary = Itinerary.from_json(document)
+        for label, binary in formats:
+            if binary is None:
+                data = text.encode("utf-8")
+                encode_seconds = time_per_call(lambda d: json.dumps(d).encode("utf-8"), document, args.runs)
+                decode_seconds = time_per_call(json.loads, data, args.runs)
+            else:
+                data = encode(itinerary, binary=binary)
+                assert decode(data).to_json() == document
+                encode_seconds = time_per_call(lambda i: encode(i, binary=binary), itinerary, args.runs)
+                decode_seconds = time_per_call(decode, data, args.runs)
+            print(
+                f"  {label:<13} {len(data) / 1024:>6.1f}KB {encode_seconds * 1e6:>7.0f}us {decode_seconds * 1e6:>7.0f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+JSON extraction from LLM output: single-pass scanner versus the regex extractor
+
+    python benchmarks/bench_json_extraction.py [--days 3 7 14] [--runs 200]
+
+Outputs are mock itineraries wrapped in chatter and a code fence, a few to
+tens of kilobytes long. Reports the time per extraction for complete output
+and for repairing output cut off two thirds of the way through, and for
+output cut off at random points how often each extractor still returns an
+itinerary with at least one day (the regex extractor never does; those plans
+used to fall back). No model weights needed.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from json_stream import extract_json
+from llm_mock import generate_mock_itinerary
+from tripcraft_config import build_itinerary_prompt
+
+
+def regex_extract(text: str):
+    """The extractor extract_json replaced: regexes, then up to three json.loads"""
+    text = text.strip()
+    json_match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
+    if json_match:
+        text = json_match.group(1)
+    text = re.sub(r'^```.*?\n', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n```$', '', text)
+    text = text.strip()
+    if text.startswith('{') or text.startswith('['):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+    start = text.find('{')
+    end = text.rfind('}')
+    if start != -1 and end != -1 and end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            pass
+    raise ValueError("Could not extract valid JSON from text")
+
+
+def scanner_extract(text: str):
+    return extract_json(text, repair=True).value
+
+
+def llm_output(num_days: int) -> str:
+    preferences = {
+        "destination": "Lisbon",
+        "budget": 300 * num_days,
+        "interests": ["food", "art", "history"],
+        "dates": f"2025-05-01 to 2025-05-{num_days:02d}"
+    }
+    itinerary = json.loads(generate_mock_itinerary(build_itinerary_prompt(preferences, "info", num_days)))
+    return "Here is your itinerary:\n```json\n" + json.dumps(itinerary, indent=2) + "\n```\nEnjoy your trip!"
+
+
+def time_per_call(extract, text: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        extract(text)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def has_days(extract, text: str) -> bool:
+    try:
+        return bool(extract(text)["itinerary"]["daily_plans"])
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 14])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--cuts", type=int, default=200, help="random truncation points per output")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'days':>4} {'size':>8} {'regex':>10} {'scanner':>10} {'repair':>10} {'cut off: regex':>15} {'scanner':>8}")
+    for num_days in args.days:
+        text = llm_output(num_days)
+        assert regex_extract(text) == scanner_extract(text)
+
+        regex_seconds = time_per_call(regex_extract, text, args.runs)
+        scanner_seconds = time_per_call(scanner_extract, text, args.runs)
+        repair_seconds = time_per_call(scanner_extract, text[:len(text) * 2 // 3], args.runs)
+
+        # Cut somewhere after the first day could have started
+        first_day = text.index('"daily_plans"')
+        cuts = [rng.randrange(first_day, len(text) - len("\n```\nEnjoy your trip!") - 1) for _ in range(args.cuts)]
+        regex_ok = sum(has_days(regex_extract, text[:cut]) for cut in cuts) / len(cuts)
+        scanner_ok = sum(has_days(scanner_extract, text[:cut]) for cut in cuts) / len(cuts)
+
+        print(
+            f"{num_days:>4} {len(text) / 1024:>6.1f}KB {regex_seconds * 1e6:>8.0f}us {scanner_seconds * 1e6:>8.0f}us "
+            f"{repair_seconds * 1e6:>8.0f}us "
+            f"{regex_ok:>15.0%} {scanner_ok:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
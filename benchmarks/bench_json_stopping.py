@@ -0,0 +1,59 @@
+"""
+Decode steps and latency with and without JSON-aware stopping
+
+    python benchmarks/bench_json_stopping.py [--runs 3] [--days 1 3 5]
+
+Compares the fixed 800-token budget without stopping against the adaptive
+itinerary_token_budget with JSONStoppingCriteria, and reports how often the
+output was truncated before its JSON object closed. Requires
+transformers/torch and the TinyLlama weights.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ["TRIPCRAFT_MICRO_BATCHING"] = "0"
+
+import llm
+from json_stream import JSONObjectTracker
+from tripcraft_config import build_itinerary_prompt, itinerary_token_budget
+
+
+def run(prompt: str, stopping: bool, max_new_tokens: int, runs: int):
+    llm.USE_JSON_STOPPING = stopping
+    tokens, latencies, truncated = [], [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = llm.generate_batch([prompt], max_new_tokens=max_new_tokens)[0]
+        latencies.append(time.perf_counter() - start)
+        tokens.append(len(llm.provider.tokenizer(output, add_special_tokens=False).input_ids))
+        truncated += not JSONObjectTracker().feed(output)
+    return statistics.mean(tokens), statistics.median(latencies), truncated / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 3, 5])
+    args = parser.parse_args()
+
+    llm.warmup()
+    print(f"{'days':>4} {'mode':<10} {'budget':>7} {'tokens':>8} {'latency':>9} {'truncated':>10}")
+    for days in args.days:
+        prompt = llm.format_chat_prompt(build_itinerary_prompt(
+            preferences={"destination": "Lisbon", "budget": 1200, "interests": ["history", "food"], "dates": "2025-05-01 to 2025-05-07"},
+            destination_info="Lisbon offers Belém Tower, Alfama and pastel de nata bakeries.",
+            num_days=days
+        ))
+        for mode, stopping, budget in (("fixed", False, 800), ("adaptive", True, itinerary_token_budget(days))):
+            tokens, latency, truncated = run(prompt, stopping, budget, args.runs)
+            print(f"{days:>4} {mode:<10} {budget:>7} {tokens:>8.0f} {latency:>8.1f}s {truncated:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
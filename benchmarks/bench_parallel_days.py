@@ -0,0 +1,62 @@
+"""
+Whole-trip prompt vs. parallel per-day generation
+
+    python benchmarks/bench_parallel_days.py [--seconds-per-day 0.5]
+
+The model is simulated with the mock LLM plus a decode delay proportional to
+the number of days in the requested output, which is what dominates real
+generation time. With the local model, parallel days rely on micro-batching
+(llm_batching) to share generate calls; with OpenAI they are independent requests.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from day_planner import plan_itinerary_by_day
+from llm_mock import extract_date_info, generate_mock_itinerary
+from tripcraft_config import build_itinerary_prompt
+
+
+def simulated_llm(seconds_per_day: float, overhead: float):
+    def generate(prompt: str) -> str:
+        start, end = extract_date_info(prompt)
+        days = 1
+        if start and end:
+            days = (time.strptime(end, "%Y-%m-%d").tm_yday - time.strptime(start, "%Y-%m-%d").tm_yday) + 1
+        time.sleep(overhead + seconds_per_day * days)
+        return generate_mock_itinerary(prompt)
+    return generate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds-per-day", type=float, default=0.5)
+    parser.add_argument("--overhead", type=float, default=0.2, help="Per-call prefill/setup time")
+    args = parser.parse_args()
+
+    generate = simulated_llm(args.seconds_per_day, args.overhead)
+    print(f"{'days':>5} {'single prompt':>14} {'per-day':>10}")
+    for num_days in (2, 5, 10):
+        preferences = {
+            "destination": "Tokyo",
+            "budget": 300 * num_days,
+            "interests": ["food", "history"],
+            "dates": f"2025-04-01 to 2025-04-{num_days:02d}"
+        }
+
+        start = time.perf_counter()
+        generate(build_itinerary_prompt(preferences, "Tokyo info", num_days))
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        plan_itinerary_by_day(preferences, "Tokyo info", num_days, generate)
+        per_day = time.perf_counter() - start
+
+        print(f"{num_days:>5} {single:>13.2f}s {per_day:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+End-to-end latency of the sequential versus the parallel LangGraph workflow
+
+    python benchmarks/bench_parallel_graph.py [--search-ms 800] [--weather-ms 600] [--llm-ms 1500] [--runs 5]
+
+Tavily is replaced by a stub that sleeps for the given latencies and the
+mock LLM backend is slowed down to --llm-ms, so only graph structure is
+measured. Needs langgraph; no API keys or model weights.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ["TRIPCRAFT_LLM_BACKENDS"] = "mock"
+os.environ["TRIPCRAFT_CACHE_PATH"] = ""
+# Every run should pay the stubbed search latency
+os.environ["TRIPCRAFT_SEARCH_TTL_ATTRACTIONS"] = "0"
+os.environ["TRIPCRAFT_SEARCH_TTL_WEATHER"] = "0"
+
+import workflow
+
+PREFERENCES = {"destination": "Lisbon", "budget": 1200, "interests": ["history", "food"], "dates": "2025-05-01 to 2025-05-03"}
+
+
+class StubTavily:
+    def __init__(self, search_seconds: float, weather_seconds: float):
+        self.search_seconds = search_seconds
+        self.weather_seconds = weather_seconds
+
+    def search(self, query: str, **kwargs):
+        time.sleep(self.weather_seconds if query.startswith("Weather") else self.search_seconds)
+        return {"results": [{"content": f"Stub result for: {query}"}]}
+
+
+def slowed(fn, seconds: float):
+    def wrapper(*args, **kwargs):
+        time.sleep(seconds)
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--search-ms", type=float, default=800)
+    parser.add_argument("--weather-ms", type=float, default=600)
+    parser.add_argument("--llm-ms", type=float, default=1500)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    tavily = StubTavily(args.search_ms / 1000, args.weather_ms / 1000)
+    workflow.tavily_client = lambda: tavily
+    workflow.llm = slowed(workflow.llm, args.llm_ms / 1000)
+    # Warm up the token counter so neither graph pays for it
+    workflow.build_prompt_request(PREFERENCES, "", 3)
+
+    print(f"{'graph':<12} {'median':>9} {'min':>9}")
+    for name, parallel in (("sequential", False), ("parallel", True)):
+        app = workflow.build_workflow(parallel).compile()
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            result = app.invoke({"preferences": PREFERENCES, "bypass_cache": True})
+            timings.append(time.perf_counter() - start)
+            assert result["weather"] and result["itinerary_json"], "incomplete result"
+        print(f"{name:<12} {statistics.median(timings):>8.2f}s {min(timings):>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Prefill latency for itinerary prompts with and without the prefix KV-cache
+
+    python benchmarks/bench_prefix_cache.py [--runs 5]
+
+Requires transformers/torch and the TinyLlama weights.
+"""
+import argparse
+import copy
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.pop("OPENAI_API_KEY", None)
+
+import torch
+import llm
+from tripcraft_config import build_itinerary_prompt
+
+
+def timed(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    loaded = llm.provider.warmup()
+    tokenizer, model = loaded.tokenizer, loaded.model
+
+    prompt = build_itinerary_prompt(
+        preferences={"destination": "Paris", "budget": 1500, "interests": ["art", "food"], "dates": "2025-10-01 to 2025-10-04"},
+        destination_info="Paris is known for the Louvre, Musée d'Orsay and its bistros.",
+        num_days=4
+    )
+    chat_prompt = llm.format_chat_prompt(prompt)
+
+    full_ids = tokenizer(chat_prompt, return_tensors="pt").input_ids.to(model.device)
+    cached_inputs = llm.prefix_cache.prepare(model, tokenizer, chat_prompt)
+    prefix_ids, past_key_values = llm.prefix_cache.get(model, tokenizer, llm.ITINERARY_CHAT_PREFIX)
+    suffix_ids = cached_inputs["input_ids"][:, prefix_ids.shape[1]:]
+
+    def prefill_full():
+        with torch.inference_mode():
+            model(input_ids=full_ids, use_cache=True)
+
+    def prefill_cached():
+        with torch.inference_mode():
+            model(input_ids=suffix_ids, past_key_values=copy.deepcopy(past_key_values), use_cache=True)
+
+    without_cache = timed(prefill_full, args.runs)
+    with_cache = timed(prefill_cached, args.runs)
+
+    print(f"prompt tokens:         {full_ids.shape[1]}")
+    print(f"cached prefix tokens:  {prefix_ids.shape[1]}")
+    print(f"one-off cache build:   {llm.prefix_cache.build_seconds * 1000:.1f} ms")
+    print(f"prefill without cache: {without_cache * 1000:.1f} ms")
+    print(f"prefill with cache:    {with_cache * 1000:.1f} ms ({without_cache / with_cache:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
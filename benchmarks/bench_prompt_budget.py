@@ -0,0 +1,67 @@
+"""
+Prompt tokens versus prefill latency for each schema variant and context budget
+
+    python benchmarks/bench_prompt_budget.py [--budgets 64 192 512] [--runs 5]
+
+Prefill is timed as one forward pass over the chat-formatted prompt with the
+prefix cache disabled, i.e. the cost paid before the first generated token.
+Requires transformers/torch and the TinyLlama weights.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.pop("OPENAI_API_KEY", None)
+
+import llm
+from prompt_builder import active_token_counter, build_budgeted_itinerary_prompt
+
+# Three search results worth of context, longer than any budget below
+DESTINATION_INFO = "\n\n".join([
+    "Lisbon is Portugal's hilly coastal capital. From the São Jorge Castle the view takes in the old city's "
+    "pastel-coloured buildings, the Tagus estuary and the 25 de Abril suspension bridge. " * 3,
+    "The Belém district holds the Jerónimos Monastery, Belém Tower and the MAAT museum; the famous pastéis de "
+    "Belém bakery has been making custard tarts since 1837. Trams 15 and 28 connect the main sights. " * 3,
+    "Alfama's narrow lanes host fado houses, the Feira da Ladra flea market on Tuesdays and Saturdays, and "
+    "viewpoints such as Miradouro de Santa Luzia. Restaurants fill up after 20:00. " * 3,
+])
+
+
+def prefill_seconds(prompt: str, runs: int) -> float:
+    import torch
+
+    loaded = llm.provider.warmup()
+    inputs = loaded.tokenizer(llm.format_chat_prompt(prompt), return_tensors="pt").to(loaded.model.device)
+    timings = []
+    with torch.inference_mode():
+        for _ in range(runs):
+            start = time.perf_counter()
+            loaded.model(**inputs, use_cache=True)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[64, 192, 512])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    llm.warmup()
+    counter = active_token_counter("transformers")
+    preferences = {"destination": "Lisbon", "budget": 1200, "interests": ["history", "food"], "dates": "2025-05-01 to 2025-05-03"}
+
+    print(f"{'schema':<8} {'context budget':>15} {'prompt tokens':>14} {'prefill':>9}")
+    for variant in ("full", "compact"):
+        for budget in args.budgets:
+            request = build_budgeted_itinerary_prompt(preferences, DESTINATION_INFO, 3, variant, budget, counter)
+            seconds = prefill_seconds(request["prompt"], args.runs)
+            print(f"{variant:<8} {budget:>15} {request['prompt_stats']['prompt_tokens']:>14} {seconds * 1000:>7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
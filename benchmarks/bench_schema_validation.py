@@ -0,0 +1,82 @@
+"""
+Full-depth itinerary validation: compiled validator versus jsonschema
+
+    python benchmarks/bench_schema_validation.py [--days 3 7 14] [--runs 500]
+
+Validates mock itineraries against ITINERARY_JSON_SCHEMA with the compiled
+validator, with a prebuilt jsonschema Draft 2020-12 validator, and with
+jsonschema.validate as usually called (which checks the schema on every call).
+Reports the time per valid document and per document with one deep error,
+where both collect every error with its path. Requires jsonschema
+(pip install jsonschema); no model weights needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm_mock import generate_mock_itinerary
+from tripcraft_config import ITINERARY_JSON_SCHEMA, ITINERARY_VALIDATOR, build_itinerary_prompt
+
+
+def mock_itinerary(num_days: int) -> dict:
+    preferences = {
+        "destination": "Lisbon",
+        "budget": 300 * num_days,
+        "interests": ["food", "art", "history"],
+        "dates": f"2025-05-01 to 2025-05-{num_days:02d}"
+    }
+    return json.loads(generate_mock_itinerary(build_itinerary_prompt(preferences, "info", num_days)))
+
+
+def time_per_call(check, document, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        check(document)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 14])
+    parser.add_argument("--runs", type=int, default=500)
+    args = parser.parse_args()
+
+    try:
+        import jsonschema
+    except ImportError:
+        sys.exit("jsonschema is not installed: pip install jsonschema")
+
+    reference = jsonschema.Draft202012Validator(ITINERARY_JSON_SCHEMA)
+
+    def jsonschema_validate(document):
+        try:
+            jsonschema.validate(document, ITINERARY_JSON_SCHEMA)
+        except jsonschema.ValidationError:
+            pass
+
+    print(f"{'days':>4} {'document':>9} {'compiled':>10} {'jsonschema':>11} {'validate()':>11} {'speedup':>8}")
+    for num_days in args.days:
+        valid = mock_itinerary(num_days)
+        invalid = mock_itinerary(num_days)
+        del invalid["itinerary"]["daily_plans"][-1]["activities"][-1]["start_time"]
+
+        for label, document in (("valid", valid), ("1 error", invalid)):
+            assert ITINERARY_VALIDATOR.is_valid(document) == reference.is_valid(document)
+            compiled = time_per_call(ITINERARY_VALIDATOR.errors, document, args.runs)
+            prebuilt = time_per_call(lambda d: list(reference.iter_errors(d)), document, args.runs)
+            per_call = time_per_call(jsonschema_validate, document, max(1, args.runs // 10))
+            print(
+                f"{num_days:>4} {label:>9} {compiled * 1e6:>8.0f}us {prebuilt * 1e6:>9.0f}us "
+                f"{per_call * 1e6:>9.0f}us {prebuilt / compiled:>7.0f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
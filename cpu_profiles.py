@@ -0,0 +1,96 @@
+"""
+CPU inference profiles for the local model
+A profile bundles dynamic int8 quantisation of the linear layers, optional
+torch.compile and intra/inter-op thread counts, selected with TRIPCRAFT_CPU_PROFILE
+"""
+import os
+from typing import Any, Dict, Optional
+
+# threads/interop_threads: None keeps torch's defaults, "physical" uses one thread per core
+CPU_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {"quantize": False, "compile": False, "threads": None, "interop_threads": None},
+    "tuned": {"quantize": False, "compile": False, "threads": "physical", "interop_threads": 1},
+    "int8": {"quantize": True, "compile": False, "threads": "physical", "interop_threads": 1},
+    "compiled": {"quantize": False, "compile": True, "threads": "physical", "interop_threads": 1},
+    "int8-compiled": {"quantize": True, "compile": True, "threads": "physical", "interop_threads": 1},
+}
+DEFAULT_CPU_PROFILE = "default"
+
+
+def get_cpu_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """Look up a profile by name (defaults to TRIPCRAFT_CPU_PROFILE)
+
+    TRIPCRAFT_CPU_THREADS, when set, overrides the profile's intra-op thread count.
+    """
+    name = name or os.getenv("TRIPCRAFT_CPU_PROFILE", DEFAULT_CPU_PROFILE)
+    if name not in CPU_PROFILES:
+        raise ValueError(f"Unknown CPU profile '{name}'. Choose from: {', '.join(CPU_PROFILES)}")
+    profile = dict(CPU_PROFILES[name], name=name)
+    if os.getenv("TRIPCRAFT_CPU_THREADS"):
+        profile["threads"] = int(os.environ["TRIPCRAFT_CPU_THREADS"])
+    return profile
+
+
+def physical_cores() -> int:
+    """Best guess at physical cores; hyper-threads rarely help matrix multiplies"""
+    logical = os.cpu_count() or 1
+    cores, socket = set(), None
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key.strip() == "physical id":
+                    socket = value.strip()
+                elif key.strip() == "core id":
+                    cores.add((socket, value.strip()))
+    except OSError:
+        pass
+    if cores:
+        return max(1, min(logical, len(cores)))
+    return max(1, logical // 2)
+
+
+def _thread_count(value) -> Optional[int]:
+    if value == "physical":
+        return physical_cores()
+    return value
+
+
+def configure_threads(profile: Dict[str, Any]):
+    """Apply the profile's thread counts to torch (process-wide)"""
+    import torch
+
+    threads = _thread_count(profile.get("threads"))
+    if threads:
+        torch.set_num_threads(threads)
+    interop_threads = _thread_count(profile.get("interop_threads"))
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only settable before the first parallel op; keep whatever is in place
+            pass
+
+
+def apply_cpu_profile(model, profile: Dict[str, Any]):
+    """Quantise and/or compile a CPU model in place according to the profile; returns the model"""
+    import torch
+
+    configure_threads(profile)
+
+    if profile.get("quantize"):
+        from torch.ao.quantization import quantize_dynamic
+
+        # Weights become int8, activations are quantised on the fly per batch
+        model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    if profile.get("compile"):
+        # Only forward is compiled so generate() and its cache handling stay in eager Python
+        model.forward = torch.compile(model.forward, dynamic=True)
+
+    return model
+
+
+def profile_model_suffix(profile: Dict[str, Any]) -> str:
+    """Suffix for MODEL_VERSION when a profile changes model outputs"""
+    return "+int8" if profile.get("quantize") else ""
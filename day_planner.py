@@ -0,0 +1,463 @@
+"""
+Parallel per-day itinerary generation
+A cheap trip skeleton fixes each day's date, theme and budget, every day is then
+generated concurrently, and the results are merged into one TripCraft itinerary.
+When only some preferences change, an earlier itinerary is updated instead:
+only the days the change affects are generated again.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from json_stream import extract_json
+from tripcraft_config import DAY_PLAN_VALIDATOR, build_day_prompt
+
+DEFAULT_MAX_WORKERS = int(os.getenv("TRIPCRAFT_DAY_WORKERS", "8"))
+# Trips at least this long are generated day by day unless a mode is requested (0 = never)
+PER_DAY_MIN_DAYS = int(os.getenv("TRIPCRAFT_PER_DAY_MIN_DAYS", "4"))
+
+
+def use_per_day_generation(num_days: int, mode: Optional[str] = None) -> bool:
+    """Decide between one whole-trip prompt ("single") and parallel days ("per_day")"""
+    if mode == "per_day":
+        return True
+    if mode == "single":
+        return False
+    return PER_DAY_MIN_DAYS > 0 and num_days >= PER_DAY_MIN_DAYS
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace("$", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def _interests(preferences: Dict[str, Any]) -> List[str]:
+    interests = preferences.get("interests") or ["sightseeing"]
+    if isinstance(interests, str):
+        interests = [i.strip() for i in interests.split(",") if i.strip()] or ["sightseeing"]
+    return list(interests)
+
+
+def build_skeleton(preferences: Dict[str, Any], num_days: int) -> List[Dict[str, Any]]:
+    """Fix date, theme and budget for every day before any generation starts"""
+    dates = preferences.get("dates", "")
+    try:
+        start = datetime.strptime(dates.split(" to ")[0].strip(), "%Y-%m-%d")
+    except (ValueError, AttributeError):
+        start = datetime.now()
+
+    interests = _interests(preferences)
+
+    budget = _number(preferences.get("budget"))
+    daily_budget = int(budget / num_days) if budget else 150
+
+    skeleton = []
+    for index in range(num_days):
+        # Pair interests on each day so every theme shows up across the trip
+        day_interests = [interests[index % len(interests)]]
+        if len(interests) > 1:
+            day_interests.append(interests[(index + 1) % len(interests)])
+        skeleton.append({
+            "day": index + 1,
+            "date": (start + timedelta(days=index)).strftime("%Y-%m-%d"),
+            "theme": " and ".join(day_interests),
+            "interests": day_interests,
+            "daily_budget": daily_budget
+        })
+    return skeleton
+
+
+def _fallback_day(slot: Dict[str, Any], destination: str) -> Dict[str, Any]:
+    return {
+        "day": slot["day"],
+        "date": slot["date"],
+        "summary": f"Day {slot['day']} in {destination}: {slot['theme']}",
+        "activities": [
+            {
+                "start_time": "09:00",
+                "end_time": "12:00",
+                "title": f"Morning exploration of {destination}",
+                "type": "sightseeing",
+                "address": destination,
+                "notes": "Explore the main attractions"
+            },
+            {
+                "start_time": "14:00",
+                "end_time": "17:00",
+                "title": f"Afternoon of {slot['theme']}",
+                "type": "leisure",
+                "address": destination,
+                "notes": "Enjoy local culture"
+            }
+        ],
+        "meals": [
+            {"time": "12:30", "suggestion": "Local restaurant", "est_cost": 25},
+            {"time": "19:00", "suggestion": "Dinner venue", "est_cost": 40}
+        ],
+        "estimated_daily_cost": slot["daily_budget"]
+    }
+
+
+def parse_day_output(raw_output: str) -> Tuple[Dict[str, Any], List[str]]:
+    """parse_day, plus what was repaired when the output was cut off"""
+    extraction = extract_json(raw_output, repair=True)
+    data = extraction.value
+    if isinstance(data, dict) and "itinerary" in data:
+        data = data["itinerary"]
+    if isinstance(data, dict) and isinstance(data.get("daily_plans"), list) and data["daily_plans"]:
+        data = data["daily_plans"][0]
+    if not isinstance(data, dict) or not isinstance(data.get("activities"), list):
+        raise ValueError("Output is not a day plan")
+    if extraction.repaired and not data["activities"]:
+        raise ValueError("Output was cut off before the first activity")
+    return data, extraction.repairs
+
+
+def parse_day(raw_output: str) -> Dict[str, Any]:
+    """Accept either a bare day object or a full itinerary and return one day plan"""
+    return parse_day_output(raw_output)[0]
+
+
+def _normalise_day(day: Dict[str, Any], slot: Dict[str, Any]) -> Dict[str, Any]:
+    """Force the skeleton's day/date and make the daily cost a number"""
+    day = dict(day)
+    day["day"] = slot["day"]
+    day["date"] = slot["date"]
+
+    cost = _number(day.get("estimated_daily_cost"))
+    if cost is None:
+        cost = 0
+        items = [a.get("transportation") for a in day.get("activities", []) if isinstance(a, dict)]
+        items += day.get("meals") or []
+        for item in items:
+            if isinstance(item, dict):
+                cost += _number(item.get("est_cost")) or 0
+    day["estimated_daily_cost"] = int(cost) if float(cost).is_integer() else cost
+    return day
+
+
+def _generate_days(
+    preferences: Dict[str, Any],
+    destination_info: str,
+    num_days: int,
+    slots: List[Dict[str, Any]],
+    generate: Callable[[str], str],
+    max_workers: int
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Generate the given skeleton days concurrently: (day plans, notes on days that failed or were repaired)"""
+    destination = preferences.get("destination", "Unknown Destination")
+
+    def generate_day(slot: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        prompt = build_day_prompt(
+            preferences,
+            destination_info,
+            day=slot["day"],
+            date=slot["date"],
+            theme=slot["theme"],
+            daily_budget=slot["daily_budget"],
+            num_days=num_days
+        )
+        day, repairs = parse_day_output(generate(prompt))
+        # Catch missing start times or non-numeric costs now, not when the day is rendered
+        day = DAY_PLAN_VALIDATOR.validate(_normalise_day(day, slot))
+        return day, repairs
+
+    days, failures = [], []
+    if not slots:
+        return days, failures
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(slots)))) as pool:
+        futures = [pool.submit(generate_day, slot) for slot in slots]
+        for slot, future in zip(slots, futures):
+            try:
+                day, repairs = future.result()
+                if repairs:
+                    failures.append(f"Day {slot['day']} was cut off and repaired ({'; '.join(repairs)})")
+            except Exception as e:
+                day = _normalise_day(_fallback_day(slot, destination), slot)
+                failures.append(f"Day {slot['day']} uses a basic plan because generation failed: {e}")
+            days.append(day)
+    return days, failures
+
+
+def _skeleton_note(skeleton: List[Dict[str, Any]]) -> str:
+    """Assumption listing the day themes an itinerary was planned around"""
+    return f"Each day was planned separately around a theme: {', '.join(s['theme'] for s in skeleton)}"
+
+
+def _skeleton_record(skeleton: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """What an itinerary stores of its skeleton: the interests each day was planned around"""
+    return [{"day": slot["day"], "interests": list(slot["interests"])} for slot in skeleton]
+
+
+def _stored_day_interests(itinerary: Dict[str, Any], num_days: int) -> Optional[List[List[str]]]:
+    """Interests per day from an itinerary's stored skeleton; None when it has none (e.g. a one-prompt trip)"""
+    stored = itinerary.get("skeleton")
+    if not isinstance(stored, list) or len(stored) != num_days:
+        return None
+    interests = [slot.get("interests") if isinstance(slot, dict) else None for slot in stored]
+    if not all(isinstance(day, list) and day for day in interests):
+        return None
+    return interests
+
+
+def plan_itinerary_by_day(
+    preferences: Dict[str, Any],
+    destination_info: str,
+    num_days: int,
+    generate: Callable[[str], str],
+    max_workers: int = DEFAULT_MAX_WORKERS
+) -> Dict[str, Any]:
+    """Generate every day concurrently and merge into a TripCraft itinerary dict
+
+    Args:
+        generate: Prompt -> raw model output, e.g. lambda p: llm(p, return_json=True)
+        max_workers: Upper bound on days generated at the same time
+
+    Days whose output cannot be parsed are replaced with a basic plan and
+    listed in the itinerary's assumptions.
+    """
+    destination = preferences.get("destination", "Unknown Destination")
+    skeleton = build_skeleton(preferences, num_days)
+
+    daily_plans, failures = _generate_days(preferences, destination_info, num_days, skeleton, generate, max_workers)
+    assumptions = [_skeleton_note(skeleton)]
+    assumptions += failures
+
+    total_cost = sum(day["estimated_daily_cost"] for day in daily_plans)
+
+    return {
+        "itinerary": {
+            "destination": destination,
+            "start_date": skeleton[0]["date"] if skeleton else "",
+            "end_date": skeleton[-1]["date"] if skeleton else "",
+            "currency": "USD",
+            "daily_plans": daily_plans,
+            "total_estimated_cost": total_cost,
+            "assumptions": assumptions,
+            "sources": [{"type": "generated", "citation": "Per-day generation"}],
+            "skeleton": _skeleton_record(skeleton)
+        },
+        "human_readable": f"Generated a {num_days}-day itinerary for {destination}, planned day by day. Estimated total: ${total_cost}."
+    }
+
+
+# Preference changes replan_itinerary_by_day applies to an earlier itinerary;
+# any other change (destination, pace, ...) needs a full regeneration
+INCREMENTAL_KEYS = {"budget", "dates", "interests"}
+
+
+def diff_preferences(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """What changed between the preferences an itinerary was planned for and new ones
+
+    Returns {"changed": [keys], "interests_added": [...], "interests_removed": [...],
+    "incremental": True when only INCREMENTAL_KEYS changed}. Reordered
+    interests are not a change.
+    """
+    old_interests, new_interests = _interests(old), _interests(new)
+    changed = []
+    for key in sorted(set(old) | set(new)):
+        if key == "interests":
+            if set(old_interests) != set(new_interests):
+                changed.append(key)
+        elif old.get(key) != new.get(key):
+            changed.append(key)
+    return {
+        "changed": changed,
+        "interests_added": [i for i in new_interests if i not in old_interests],
+        "interests_removed": [i for i in old_interests if i not in new_interests],
+        "incremental": set(changed) <= INCREMENTAL_KEYS
+    }
+
+
+def rebase_skeleton(
+    old_preferences: Dict[str, Any],
+    preferences: Dict[str, Any],
+    old_num_days: int,
+    num_days: int,
+    old_day_interests: Optional[List[List[str]]] = None
+) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Skeleton for new preferences that keeps the earlier days' themes where it can
+
+    Args:
+        old_day_interests: Interests each earlier day was planned around, as
+            stored in its itinerary (default: rebuilt from old_preferences)
+
+    Returns (skeleton, replan) with replan the 0-based indexes of days that
+    need a new plan: days themed on a removed interest, days past the earlier
+    trip's end, and one day per added interest (the day whose interests are
+    best covered elsewhere gives way when no day is free).
+    """
+    old = build_skeleton(old_preferences, old_num_days)
+    for slot, day_interests in zip(old, old_day_interests or []):
+        slot["interests"] = day_interests
+    skeleton = build_skeleton(preferences, num_days)
+    interests = _interests(preferences)
+    added = [i for i in interests if i not in _interests(old_preferences)]
+
+    replan = []
+    for index, slot in enumerate(skeleton):
+        if index < len(old) and set(old[index]["interests"]) <= set(interests):
+            slot["interests"] = old[index]["interests"]
+        else:
+            replan.append(index)
+
+    def coverage() -> Dict[str, int]:
+        counts = {i: 0 for i in interests}
+        for index, slot in enumerate(skeleton):
+            if index not in replan:
+                for interest in slot["interests"]:
+                    counts[interest] += 1
+        return counts
+
+    for _ in added[len(replan):]:
+        kept = [index for index in range(num_days) if index not in replan]
+        if not kept:
+            break
+        counts = coverage()
+        replan.append(max(kept, key=lambda index: (min(counts[i] for i in skeleton[index]["interests"]), index)))
+    replan.sort()
+
+    counts = coverage()
+    pending = list(added)
+    for index in replan:
+        by_coverage = sorted(interests, key=lambda i: (counts[i], interests.index(i)))
+        first = pending.pop(0) if pending else by_coverage[0]
+        day_interests = [first]
+        if len(interests) > 1:
+            day_interests.append(next(i for i in by_coverage if i != first))
+        for interest in day_interests:
+            counts[interest] += 1
+        skeleton[index]["interests"] = day_interests
+
+    for slot in skeleton:
+        slot["theme"] = " and ".join(slot["interests"])
+    return skeleton, replan
+
+
+def _scaled(value: Any, factor: float) -> Any:
+    number = _number(value)
+    if number is None:
+        return value
+    scaled = number * factor
+    return int(round(scaled)) if isinstance(value, int) else round(scaled, 2)
+
+
+def _rescale_day(day: Dict[str, Any], factor: float) -> Dict[str, Any]:
+    """Scale a day's meal, transport and daily costs to a new budget"""
+    day = dict(day)
+    day["meals"] = [
+        dict(meal, est_cost=_scaled(meal["est_cost"], factor)) if isinstance(meal, dict) and "est_cost" in meal else meal
+        for meal in day.get("meals") or []
+    ]
+    activities = []
+    for activity in day.get("activities") or []:
+        transport = activity.get("transportation") if isinstance(activity, dict) else None
+        if isinstance(transport, dict) and "est_cost" in transport:
+            activity = dict(activity, transportation=dict(transport, est_cost=_scaled(transport["est_cost"], factor)))
+        activities.append(activity)
+    day["activities"] = activities
+    if "estimated_daily_cost" in day:
+        day["estimated_daily_cost"] = _scaled(day["estimated_daily_cost"], factor)
+    return day
+
+
+def replan_itinerary_by_day(
+    previous: Dict[str, Any],
+    old_preferences: Dict[str, Any],
+    preferences: Dict[str, Any],
+    destination_info: str,
+    num_days: int,
+    generate: Callable[[str], str],
+    max_workers: int = DEFAULT_MAX_WORKERS
+) -> Optional[Dict[str, Any]]:
+    """Update an earlier itinerary for changed preferences, generating only the affected days
+
+    Args:
+        previous: Itinerary planned for old_preferences ({"itinerary": {...}, ...})
+        generate: Prompt -> raw model output, as for plan_itinerary_by_day
+
+    Kept days move to the new dates and have their costs scaled to the new
+    daily budget, so a budget or date change costs no generation at all, on
+    any itinerary. Changes to interests or the number of days re-plan days
+    around the skeleton stored in the earlier itinerary.
+    Returns None when the change needs a full regeneration: anything but
+    budget, dates or interests changed, the earlier itinerary has no days,
+    interests or the day count changed on one without a stored skeleton
+    (e.g. a short trip made from one prompt), or every day would have to be
+    planned again.
+    """
+    old_itinerary = (previous or {}).get("itinerary") or {}
+    old_plans = old_itinerary.get("daily_plans")
+    if not isinstance(old_plans, list) or not old_plans:
+        return None
+    diff = diff_preferences(old_preferences, preferences)
+    if not diff["incremental"]:
+        return None
+
+    # Only the daily budget is needed from the old skeleton to scale costs
+    old_skeleton = build_skeleton(old_preferences, len(old_plans))
+    day_interests = _stored_day_interests(old_itinerary, len(old_plans))
+    if "interests" not in diff["changed"] and num_days == len(old_plans):
+        # Same days, same themes: only dates and costs move
+        skeleton, replan = build_skeleton(preferences, num_days), []
+        for slot, interests in zip(skeleton, day_interests or []):
+            slot["interests"], slot["theme"] = interests, " and ".join(interests)
+    elif day_interests is None:
+        # Kept days are matched to themes by position, which needs the themes they were planned around
+        return None
+    else:
+        skeleton, replan = rebase_skeleton(old_preferences, preferences, len(old_plans), num_days, day_interests)
+    if len(replan) == num_days:
+        return None
+
+    generated, failures = _generate_days(
+        preferences,
+        destination_info,
+        num_days,
+        [skeleton[index] for index in replan],
+        generate,
+        max_workers
+    )
+    generated = dict(zip(replan, generated))
+
+    daily_plans = []
+    for index, slot in enumerate(skeleton):
+        if index in generated:
+            daily_plans.append(generated[index])
+            continue
+        day = old_plans[index]
+        old_budget = old_skeleton[index]["daily_budget"]
+        if old_budget and slot["daily_budget"] != old_budget:
+            day = _rescale_day(day, slot["daily_budget"] / old_budget)
+        daily_plans.append(_normalise_day(day, slot))
+
+    destination = preferences.get("destination", "Unknown Destination")
+    total_cost = sum(day["estimated_daily_cost"] for day in daily_plans)
+    replanned = ", ".join(str(index + 1) for index in replan) or "none"
+    assumptions = [_skeleton_note(skeleton)] if day_interests is not None else []
+    assumptions.append(f"Updated from an earlier plan; re-planned days: {replanned}")
+    if any(s["daily_budget"] != o["daily_budget"] for s, o in zip(skeleton, old_skeleton)):
+        assumptions.append(f"Costs of kept days were scaled to a daily budget of ${skeleton[0]['daily_budget']}")
+    assumptions += failures
+
+    itinerary = dict(
+        previous["itinerary"],
+        start_date=skeleton[0]["date"],
+        end_date=skeleton[-1]["date"],
+        daily_plans=daily_plans,
+        total_estimated_cost=total_cost,
+        assumptions=assumptions
+    )
+    if day_interests is not None:
+        itinerary["skeleton"] = _skeleton_record(skeleton)
+    return {
+        "itinerary": itinerary,
+        "human_readable": f"Updated the {num_days}-day itinerary for {destination}, re-planning {len(replan)} of {num_days} days. Estimated total: ${total_cost}."
+    }
@@ -0,0 +1,138 @@
+"""
+Per-run time budgets for planning
+A plan carries a Deadline from its caller's SLA. Nodes ask how much time is
+left and skip or shorten optional work (weather, advanced search depth);
+LLM calls get the remainder as their timeout and generation switches to the
+fallback itinerary when it cannot finish in time. A deadline can also be
+cancelled, which is how the losing call of a hedged request is stopped.
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# Seconds of budget below which optional work is skipped or shortened
+MIN_SEARCH_SECONDS = float(os.getenv("TRIPCRAFT_MIN_SEARCH_SECONDS", "1"))
+MIN_ADVANCED_SEARCH_SECONDS = float(os.getenv("TRIPCRAFT_MIN_ADVANCED_SEARCH_SECONDS", "10"))
+MIN_WEATHER_SECONDS = float(os.getenv("TRIPCRAFT_MIN_WEATHER_SECONDS", "2"))
+# Assumed generation time while no backend has latency statistics yet
+MIN_GENERATION_SECONDS = float(os.getenv("TRIPCRAFT_MIN_GENERATION_SECONDS", "3"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a run's time budget is spent before the work is done"""
+
+
+class Deadline:
+    """Point in time a run must finish by; seconds=None means no limit
+
+    Args:
+        seconds: Budget from now
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.expires_at = math.inf if seconds is None else time.monotonic() + seconds
+        self.parent: Optional["Deadline"] = None
+        self._cancelled = threading.Event()
+
+    def child(self) -> "Deadline":
+        """Same expiry, but can be cancelled without cancelling this one"""
+        child = Deadline()
+        child.seconds, child.expires_at, child.parent = self.seconds, self.expires_at, self
+        return child
+
+    def cancel(self):
+        """Expire now; work checking this deadline (or a child of it) stops"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    @property
+    def bounded(self) -> bool:
+        return self.seconds is not None
+
+    def remaining(self) -> float:
+        """Seconds left (inf without a limit, never negative, 0 once cancelled)"""
+        if self.cancelled:
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, seconds: Optional[float]) -> bool:
+        """Whether work expected to take this long can still finish (unknown durations always can)"""
+        return seconds is None or self.remaining() >= seconds
+
+    def timeout(self, default: Optional[float] = None) -> Optional[float]:
+        """Timeout for a blocking call: the time left, capped at default"""
+        if not self.bounded:
+            return default
+        return self.remaining() if default is None else min(default, self.remaining())
+
+    def check(self, what: str = "planning"):
+        if self.cancelled:
+            raise DeadlineExceeded(f"Cancelled during {what}")
+        if self.expired():
+            raise DeadlineExceeded(f"Time budget of {self.seconds:g}s ran out during {what}")
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f})" if self.bounded else "Deadline(None)"
+
+
+def deadline_for(sla_seconds: Optional[float] = None) -> Deadline:
+    """Deadline for a run starting now; None uses TRIPCRAFT_PLAN_SLA, 0 or unset means no limit"""
+    if sla_seconds is None:
+        sla_seconds = float(os.getenv("TRIPCRAFT_PLAN_SLA") or 0)
+    return Deadline(sla_seconds if sla_seconds > 0 else None)
+
+
+def plan_config(sla_seconds: Optional[float] = None, **configurable) -> Dict[str, Any]:
+    """Run config carrying the deadline, for app.invoke(state, config) and friends
+
+    The deadline lives in the config rather than the state, so it is never
+    checkpointed: a resumed run gets a fresh budget.
+    """
+    return {"configurable": dict(configurable, deadline=deadline_for(sla_seconds))}
+
+
+def config_deadline(config: Optional[Dict[str, Any]]) -> Optional[Deadline]:
+    return ((config or {}).get("configurable") or {}).get("deadline")
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("tripcraft_deadline", default=None)
+
+
+def current_deadline() -> Deadline:
+    """Deadline of the run this code is part of (unbounded outside one)"""
+    return _current.get() or Deadline()
+
+
+def deadline_context(deadline: Deadline) -> contextvars.Context:
+    """Copy of the current context with deadline current
+
+    For ctx.run() in pool threads and generators, where a with-block cannot
+    follow the work. A context runs in one thread at a time, so take a copy each.
+    """
+    context = contextvars.copy_context()
+    context.run(_current.set, deadline)
+    return context
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Deadline]:
+    """Make deadline current for the block; None keeps the enclosing one"""
+    if deadline is None:
+        yield current_deadline()
+        return
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
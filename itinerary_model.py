@@ -0,0 +1,291 @@
+"""
+Typed itinerary model with a compact codec
+Itinerary, DailyPlan, Activity, Meal and Transportation are slotted records that
+convert losslessly to and from the TripCraft JSON shape: keys the model does not
+know, and explicit nulls, are kept in each record's `extra`. encode/decode store
+an itinerary as positional rows, so keys are not repeated for every activity,
+packed with msgpack when it is installed and as compact JSON otherwise.
+"""
+import json
+import keyword
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Rows are [extra, *FIELDS values]. Appending a field keeps older rows readable
+# (the new field decodes as None); bump this when fields are removed or reordered
+CODEC_VERSION = 2
+_MSGPACK_TAG = b"M"
+_JSON_TAG = b"J"
+_msgpack_module = None
+_msgpack_resolved = False
+
+
+def _attributes(fields: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Attribute names for JSON keys; keywords get a trailing underscore (from -> from_)"""
+    return tuple(f"{field}_" if keyword.iskeyword(field) else field for field in fields)
+
+
+def _nested_from_json(value: Any, kind: type, many: bool) -> Any:
+    # Values of an unexpected shape are kept as they are, so conversion stays lossless
+    if many:
+        if isinstance(value, list):
+            return [kind.from_json(item) if isinstance(item, dict) else item for item in value]
+        return value
+    return kind.from_json(value) if isinstance(value, dict) else value
+
+
+def _nested_to_json(value: Any) -> Any:
+    if isinstance(value, _Record):
+        return value.to_json()
+    if isinstance(value, list):
+        return [item.to_json() if isinstance(item, _Record) else item for item in value]
+    return value
+
+
+# In rows a nested record is a list; anything else in its place is wrapped as {"raw": value}
+def _nested_to_row(value: Any, many: bool) -> Any:
+    if value is None:
+        return None
+    if many and isinstance(value, list):
+        return [item.to_row() if isinstance(item, _Record) else {"raw": item} for item in value]
+    if not many and isinstance(value, _Record):
+        return value.to_row()
+    return {"raw": value}
+
+
+def _nested_from_row(value: Any, kind: type, many: bool) -> Any:
+    if value.__class__ is dict:
+        return value["raw"]
+    from_row = kind.from_row
+    if many:
+        return [from_row(item) if item.__class__ is list else item["raw"] for item in value]
+    return from_row(value)
+
+
+class _Record:
+    """Shared conversion for the itinerary records
+
+    FIELDS are the JSON keys the record knows, in row order; NESTED maps a key
+    to (record class, whether it holds a list of them).
+    """
+    __slots__ = ("extra",)
+    FIELDS: Tuple[str, ...] = ()
+    NESTED: Dict[str, Tuple[type, bool]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._PAIRS = tuple(zip(cls.FIELDS, _attributes(cls.FIELDS)))
+        cls._ATTRIBUTE_OF = dict(cls._PAIRS)
+        # (attribute, (record class, many) or None) per row position; extra always comes first
+        cls._ROW_PLAN = (("extra", None),) + tuple((attribute, cls.NESTED.get(key)) for key, attribute in cls._PAIRS)
+
+    def __init__(self, extra: Optional[Dict[str, Any]] = None, **fields):
+        for _, attribute in self._PAIRS:
+            setattr(self, attribute, fields.pop(attribute, None))
+        if fields:
+            raise TypeError(f"{type(self).__name__} has no field {next(iter(fields))!r}")
+        self.extra = extra or None
+
+    def __repr__(self) -> str:
+        shown = ", ".join(
+            f"{attribute}={getattr(self, attribute)!r}" for _, attribute in self._PAIRS[:3]
+            if getattr(self, attribute) is not None
+        )
+        return f"{type(self).__name__}({shown})"
+
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is type(self) and self.to_row() == other.to_row()
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]):
+        record = cls.__new__(cls)
+        for _, attribute in cls._PAIRS:
+            setattr(record, attribute, None)
+        extra = None
+        attribute_of, nested = cls._ATTRIBUTE_OF, cls.NESTED
+        for key, value in data.items():
+            attribute = attribute_of.get(key)
+            if attribute is None or value is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            if key in nested:
+                value = _nested_from_json(value, *nested[key])
+            setattr(record, attribute, value)
+        record.extra = extra
+        return record
+
+    def to_json(self) -> Dict[str, Any]:
+        data = {}
+        nested = self.NESTED
+        for key, attribute in self._PAIRS:
+            value = getattr(self, attribute)
+            if value is None:
+                continue
+            data[key] = _nested_to_json(value) if key in nested else value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_row(self) -> List[Any]:
+        """extra (None when empty), then field values in FIELDS order (None when absent)"""
+        nested = self.NESTED
+        row = [self.extra or None]
+        row.extend(
+            _nested_to_row(getattr(self, attribute), nested[key][1]) if key in nested else getattr(self, attribute)
+            for key, attribute in self._PAIRS
+        )
+        return row
+
+    @classmethod
+    def from_row(cls, row: List[Any]):
+        """Inverse of to_row; fields missing from a shorter (older) row are None"""
+        record = cls.__new__(cls)
+        for (attribute, nested), value in zip(cls._ROW_PLAN, row):
+            if nested is not None and value is not None:
+                value = _nested_from_row(value, *nested)
+            setattr(record, attribute, value)
+        for attribute, _ in cls._ROW_PLAN[len(row):]:
+            setattr(record, attribute, None)
+        return record
+
+
+class Transportation(_Record):
+    FIELDS = ("from", "mode", "duration_min", "est_cost")
+    __slots__ = _attributes(FIELDS)
+
+
+class Activity(_Record):
+    FIELDS = (
+        "start_time", "end_time", "title", "type", "address",
+        "transportation", "notes", "booking_info", "accessibility"
+    )
+    NESTED = {"transportation": (Transportation, False)}
+    __slots__ = _attributes(FIELDS)
+
+
+class Meal(_Record):
+    FIELDS = ("time", "suggestion", "est_cost", "dietary_notes")
+    __slots__ = _attributes(FIELDS)
+
+
+class DailyPlan(_Record):
+    FIELDS = ("day", "date", "summary", "activities", "meals", "estimated_daily_cost", "alternative_options")
+    NESTED = {"activities": (Activity, True), "meals": (Meal, True)}
+    __slots__ = _attributes(FIELDS)
+
+
+class Itinerary(_Record):
+    """A TripCraft itinerary; from_json/to_json use the full document
+
+    {"itinerary": {...}, "human_readable": "..."}. from_content/to_content use
+    the inner "itinerary" object on its own, the form Supabase stores.
+    """
+    FIELDS = (
+        "destination", "start_date", "end_date", "timezone", "currency", "daily_plans",
+        "total_estimated_cost", "assumptions", "sources", "packing_list", "safety_notes"
+    )
+    NESTED = {"daily_plans": (DailyPlan, True)}
+    # document_extra: top-level keys besides "itinerary" and "human_readable"
+    __slots__ = _attributes(FIELDS) + ("human_readable", "document_extra")
+
+    def __init__(self, extra=None, human_readable: Optional[str] = None, document_extra=None, **fields):
+        super().__init__(extra, **fields)
+        self.human_readable = human_readable
+        self.document_extra = document_extra or None
+
+    @classmethod
+    def from_content(cls, content: Dict[str, Any]) -> "Itinerary":
+        itinerary = super().from_json(content)
+        itinerary.human_readable = itinerary.document_extra = None
+        return itinerary
+
+    def to_content(self) -> Dict[str, Any]:
+        return super().to_json()
+
+    @classmethod
+    def from_row(cls, row: List[Any]) -> "Itinerary":
+        itinerary = super().from_row(row)
+        itinerary.human_readable = itinerary.document_extra = None
+        return itinerary
+
+    @classmethod
+    def from_json(cls, document: Dict[str, Any]) -> "Itinerary":
+        if not isinstance(document, dict) or not isinstance(document.get("itinerary"), dict):
+            raise ValueError("Not a TripCraft itinerary document: expected an 'itinerary' object")
+        itinerary = cls.from_content(document["itinerary"])
+        document_extra = None
+        for key, value in document.items():
+            if key == "itinerary":
+                continue
+            if key == "human_readable" and value is not None:
+                itinerary.human_readable = value
+            else:
+                if document_extra is None:
+                    document_extra = {}
+                document_extra[key] = value
+        itinerary.document_extra = document_extra
+        return itinerary
+
+    def to_json(self) -> Dict[str, Any]:
+        document = {"itinerary": self.to_content()}
+        if self.human_readable is not None:
+            document["human_readable"] = self.human_readable
+        if self.document_extra:
+            document.update(self.document_extra)
+        return document
+
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is type(self) and self.to_json() == other.to_json()
+
+
+def _msgpack():
+    """The msgpack module, or None when it is not installed (looked up once)"""
+    global _msgpack_module, _msgpack_resolved
+    if not _msgpack_resolved:
+        try:
+            import msgpack
+            _msgpack_module = msgpack
+        except ImportError:
+            _msgpack_module = None
+        _msgpack_resolved = True
+    return _msgpack_module
+
+
+def encode(itinerary: Union[Itinerary, Dict[str, Any]], binary: Optional[bool] = None) -> bytes:
+    """Pack an itinerary (model or TripCraft dict) into compact bytes
+
+    Args:
+        binary: True for msgpack, False for compact JSON, None for msgpack when installed
+    """
+    if not isinstance(itinerary, Itinerary):
+        itinerary = Itinerary.from_json(itinerary)
+    payload = [CODEC_VERSION, itinerary.to_row(), itinerary.human_readable, itinerary.document_extra]
+    msgpack = _msgpack() if binary is not False else None
+    if binary and msgpack is None:
+        raise ImportError("msgpack is not installed. Run: pip install msgpack")
+    if msgpack is not None:
+        return _MSGPACK_TAG + msgpack.packb(payload, use_bin_type=True)
+    return _JSON_TAG + json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode(data: bytes) -> Itinerary:
+    """Unpack bytes from encode, in either format"""
+    tag, body = data[:1], data[1:]
+    if tag == _MSGPACK_TAG:
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise ImportError("Itinerary was packed with msgpack, which is not installed. Run: pip install msgpack")
+        payload = msgpack.unpackb(body, raw=False)
+    elif tag == _JSON_TAG:
+        payload = json.loads(body)
+    else:
+        raise ValueError(f"Not an encoded itinerary (format tag {tag!r})")
+
+    version, row, human_readable, document_extra = payload
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unsupported itinerary codec version {version} (expected {CODEC_VERSION})")
+    itinerary = Itinerary.from_row(row)
+    itinerary.human_readable = human_readable
+    itinerary.document_extra = document_extra
+    return itinerary
@@ -0,0 +1,380 @@
+"""
+Schema-constrained decoding for the local model
+A character-level JSON automaton guided by ITINERARY_JSON_SCHEMA decides which
+tokens may come next, so generations always parse as TripCraft JSON
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+WHITESPACE = " \t\n\r"
+MAX_WHITESPACE_RUN = 24
+DEFAULT_MAX_STRING_LENGTH = 400
+_HEX = set("0123456789abcdefABCDEF")
+_ESCAPES = set('"\\/bfnrtu')
+_LITERALS = {"t": ("true", "boolean"), "f": ("false", "boolean"), "n": ("null", "null")}
+
+
+def _types(schema: Dict[str, Any]) -> Optional[set]:
+    kind = schema.get("type")
+    if kind is None:
+        return None
+    return set(kind) if isinstance(kind, list) else {kind}
+
+
+def _allows(schema: Dict[str, Any], kind: str) -> bool:
+    types = _types(schema)
+    if types is None:
+        return True
+    if kind == "integer":
+        return bool(types & {"integer", "number"})
+    return kind in types
+
+
+class _Frame:
+    __slots__ = ()
+
+    def copy(self):
+        clone = object.__new__(type(self))
+        for slot in type(self).__slots__:
+            value = getattr(self, slot)
+            setattr(clone, slot, set(value) if isinstance(value, set) else value)
+        return clone
+
+
+class _Value(_Frame):
+    __slots__ = ("schema",)
+
+    def __init__(self, schema):
+        self.schema = schema
+
+
+class _Object(_Frame):
+    # state: "key_or_end" | "key" | "colon" | "comma_or_end"
+    __slots__ = ("schema", "state", "seen", "key")
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.state = "key_or_end"
+        self.seen = set()
+        self.key = None
+
+    def required_done(self) -> bool:
+        return set(self.schema.get("required", [])) <= self.seen
+
+
+class _Array(_Frame):
+    # state: "value_or_end" | "value" | "comma_or_end"
+    __slots__ = ("schema", "state", "count")
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.state = "value_or_end"
+        self.count = 0
+
+
+class _String(_Frame):
+    # escape: 0 normal, 1 after backslash, 2-5 reading \\uXXXX digits
+    __slots__ = ("is_key", "chars", "escape", "length", "allowed_keys")
+
+    def __init__(self, is_key: bool = False, allowed_keys: Optional[tuple] = None):
+        self.is_key = is_key
+        self.chars = "" if is_key else None
+        self.escape = 0
+        self.length = 0
+        self.allowed_keys = allowed_keys
+
+
+class _Number(_Frame):
+    __slots__ = ("text", "integer")
+
+    def __init__(self, first: str, integer: bool):
+        self.text = first
+        self.integer = integer
+
+
+class _Literal(_Frame):
+    __slots__ = ("word", "pos")
+
+    def __init__(self, word: str):
+        self.word = word
+        self.pos = 1
+
+
+# Text that can still grow into a JSON number, and a complete JSON number
+_NUMBER_PREFIX = re.compile(r"-?((0|[1-9]\d*)(\.\d*|\.\d+[eE][+-]?\d*|[eE][+-]?\d*)?)?")
+_NUMBER_FULL = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?")
+MAX_NUMBER_LENGTH = 16
+
+
+class SchemaJSONAutomaton:
+    """Incremental acceptor for JSON documents shaped by a JSON schema
+
+    feed() returns False as soon as the text so far cannot be extended into a
+    document that matches the schema's types and required keys. Unknown
+    object keys are accepted unless the schema sets additionalProperties to
+    False. After a False, discard the instance (use copy() to probe).
+    """
+
+    def __init__(self, schema: Dict[str, Any], max_string_length: int = DEFAULT_MAX_STRING_LENGTH):
+        self.max_string_length = max_string_length
+        self.stack: List[_Frame] = [_Value(schema)]
+        self.done = False
+        self.whitespace_run = 0
+
+    def copy(self) -> "SchemaJSONAutomaton":
+        clone = object.__new__(SchemaJSONAutomaton)
+        clone.max_string_length = self.max_string_length
+        clone.stack = [frame.copy() for frame in self.stack]
+        clone.done = self.done
+        clone.whitespace_run = self.whitespace_run
+        return clone
+
+    @property
+    def complete(self) -> bool:
+        """True once the top-level value is closed"""
+        return self.done
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if not self._step(ch):
+                return False
+        return True
+
+    def _whitespace(self) -> bool:
+        self.whitespace_run += 1
+        return self.whitespace_run <= MAX_WHITESPACE_RUN
+
+    def _value_done(self):
+        """Called when a complete value has been popped off the stack"""
+        if not self.stack:
+            self.done = True
+            return
+        parent = self.stack[-1]
+        if isinstance(parent, _Object):
+            parent.seen.add(parent.key)
+            parent.state = "comma_or_end"
+        elif isinstance(parent, _Array):
+            parent.count += 1
+            parent.state = "comma_or_end"
+
+    def _step(self, ch: str) -> bool:
+        if self.done:
+            return ch in WHITESPACE and self._whitespace()
+
+        frame = self.stack[-1]
+
+        if isinstance(frame, _String):
+            return self._string_step(frame, ch)
+        if isinstance(frame, _Number):
+            candidate = frame.text + ch
+            if (_NUMBER_PREFIX.fullmatch(candidate) and len(candidate) <= MAX_NUMBER_LENGTH
+                    and not (frame.integer and ch in ".eE")):
+                frame.text = candidate
+                return True
+            if not _NUMBER_FULL.fullmatch(frame.text):
+                return False
+            self.stack.pop()
+            self._value_done()
+            return self._step(ch)
+        if isinstance(frame, _Literal):
+            if ch != frame.word[frame.pos]:
+                return False
+            frame.pos += 1
+            if frame.pos == len(frame.word):
+                self.stack.pop()
+                self._value_done()
+            return True
+
+        if ch in WHITESPACE:
+            return self._whitespace()
+        self.whitespace_run = 0
+
+        if isinstance(frame, _Value):
+            return self._start_value(frame.schema, ch)
+        if isinstance(frame, _Object):
+            return self._object_step(frame, ch)
+        if isinstance(frame, _Array):
+            return self._array_step(frame, ch)
+        return False
+
+    def _start_value(self, schema: Dict[str, Any], ch: str) -> bool:
+        self.stack.pop()
+        if ch == "{" and _allows(schema, "object"):
+            self.stack.append(_Object(schema))
+        elif ch == "[" and _allows(schema, "array"):
+            self.stack.append(_Array(schema))
+        elif ch == '"' and _allows(schema, "string"):
+            self.stack.append(_String())
+        elif (ch == "-" or ch.isdigit()) and ch.isascii() and _allows(schema, "integer"):
+            types = _types(schema)
+            integer_only = types is not None and "number" not in types
+            self.stack.append(_Number(ch, integer_only))
+        elif ch in _LITERALS and _allows(schema, _LITERALS[ch][1]):
+            self.stack.append(_Literal(_LITERALS[ch][0]))
+        else:
+            return False
+        return True
+
+    def _object_step(self, frame: _Object, ch: str) -> bool:
+        if frame.state in ("key_or_end", "key") and ch == '"':
+            properties = frame.schema.get("properties", {})
+            closed = frame.schema.get("additionalProperties") is False
+            remaining = tuple(k for k in properties if k not in frame.seen) if closed else None
+            self.stack.append(_String(is_key=True, allowed_keys=remaining))
+            return True
+        if frame.state in ("key_or_end", "comma_or_end") and ch == "}":
+            if not frame.required_done():
+                return False
+            self.stack.pop()
+            self._value_done()
+            return True
+        if frame.state == "colon" and ch == ":":
+            schema = frame.schema.get("properties", {}).get(frame.key, {})
+            self.stack.append(_Value(schema))
+            return True
+        if frame.state == "comma_or_end" and ch == ",":
+            frame.state = "key"
+            return True
+        return False
+
+    def _array_step(self, frame: _Array, ch: str) -> bool:
+        if frame.state in ("value_or_end", "comma_or_end") and ch == "]":
+            if frame.count < frame.schema.get("minItems", 0):
+                return False
+            self.stack.pop()
+            self._value_done()
+            return True
+        if frame.state == "comma_or_end" and ch == ",":
+            frame.state = "value"
+            return True
+        if frame.state in ("value_or_end", "value"):
+            self.stack.append(_Value(frame.schema.get("items", {})))
+            return self._step(ch)
+        return False
+
+    def _string_step(self, frame: _String, ch: str) -> bool:
+        if frame.escape == 1:
+            if ch not in _ESCAPES:
+                return False
+            frame.escape = 2 if ch == "u" else 0
+        elif frame.escape >= 2:
+            if ch not in _HEX:
+                return False
+            frame.escape = 0 if frame.escape == 5 else frame.escape + 1
+        elif ch == "\\":
+            frame.escape = 1
+        elif ch == '"':
+            self.stack.pop()
+            parent = self.stack[-1] if frame.is_key else None
+            if frame.is_key:
+                if frame.chars in parent.seen:
+                    return False
+                if frame.allowed_keys is not None and frame.chars not in frame.allowed_keys:
+                    return False
+                parent.key = frame.chars
+                parent.state = "colon"
+            else:
+                self._value_done()
+            return True
+        elif ord(ch) < 0x20:
+            return False
+
+        frame.length += 1
+        if frame.length > self.max_string_length:
+            return False
+        if frame.is_key:
+            frame.chars += ch
+            if frame.allowed_keys is not None and not any(k.startswith(frame.chars) for k in frame.allowed_keys):
+                return False
+        return True
+
+
+def build_token_texts(tokenizer) -> List[Optional[str]]:
+    """Surface text of every vocabulary entry; None for tokens that can never be emitted"""
+    special_ids = set(tokenizer.all_special_ids)
+    tokens = tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))
+    sentencepiece = any(t and t.startswith("▁") for t in tokens[:1000])
+    texts: List[Optional[str]] = []
+
+    for token_id, token in enumerate(tokens):
+        if token_id in special_ids or token is None:
+            texts.append(None)
+            continue
+        byte = re.fullmatch(r"<0x([0-9A-Fa-f]{2})>", token)
+        if byte:
+            value = int(byte.group(1), 16)
+            texts.append(chr(value) if value < 0x80 else None)
+        elif sentencepiece:
+            texts.append(token.replace("▁", " "))
+        else:
+            texts.append(tokenizer.convert_tokens_to_string([token]))
+    return texts
+
+
+class JSONSchemaLogitsProcessor:
+    """transformers LogitsProcessor that masks tokens the schema automaton rejects
+
+    At each step the highest-scoring candidates are probed in order and the
+    first `keep` acceptable ones survive, so sampling still has a choice.
+    Once the top-level object is closed only EOS is allowed.
+    """
+
+    def __init__(
+        self,
+        schema: Dict[str, Any],
+        tokenizer,
+        token_texts: Optional[List[Optional[str]]] = None,
+        keep: int = 8,
+        probe: int = 64
+    ):
+        self.schema = schema
+        self.eos_token_id = tokenizer.eos_token_id
+        self.token_texts = token_texts if token_texts is not None else build_token_texts(tokenizer)
+        self.keep = keep
+        self.probe = probe
+        self.prompt_length: Optional[int] = None
+        self.states: List[SchemaJSONAutomaton] = []
+        self.rejected_steps = 0
+
+    def _sync(self, row: int, token_ids) -> SchemaJSONAutomaton:
+        state = self.states[row]
+        if token_ids.shape[0] > self.prompt_length:
+            text = self.token_texts[int(token_ids[-1])]
+            if text is not None and not state.complete:
+                state.feed(text)
+        return state
+
+    def _allowed(self, state: SchemaJSONAutomaton, order) -> List[int]:
+        allowed = []
+        for token_id in order:
+            token_id = int(token_id)
+            text = self.token_texts[token_id]
+            if text and state.copy().feed(text):
+                allowed.append(token_id)
+                if len(allowed) >= self.keep:
+                    break
+        return allowed
+
+    def __call__(self, input_ids, scores):
+        import torch
+
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+            self.states = [SchemaJSONAutomaton(self.schema) for _ in range(input_ids.shape[0])]
+
+        mask = torch.full_like(scores, float("-inf"))
+        for row in range(input_ids.shape[0]):
+            state = self._sync(row, input_ids[row])
+            if state.complete:
+                mask[row, self.eos_token_id] = 0
+                continue
+
+            order = torch.argsort(scores[row], descending=True)
+            allowed = self._allowed(state, order[:self.probe])
+            if not allowed:
+                # Nothing plausible fits the grammar; search the whole vocabulary
+                self.rejected_steps += 1
+                allowed = self._allowed(state, order[self.probe:]) or [self.eos_token_id]
+            mask[row, allowed] = 0
+
+        return scores + mask
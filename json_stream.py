@@ -0,0 +1,309 @@
+"""
+Incremental JSON scanning for streamed LLM output
+Emits each completed daily_plans[i] object as soon as its closing brace arrives,
+and extracts (and if need be repairs) the JSON object in a finished output
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+
+class DailyPlanStreamParser:
+    """Feed streamed text chunks and collect completed day plans
+
+    The scanner tracks string/escape state and the key that opened each
+    container, so braces inside strings and nested activity objects do not
+    confuse it. Text before the first '{' (code fences, chatter) is ignored.
+    """
+
+    def __init__(self, array_key: str = "daily_plans"):
+        self.array_key = array_key
+        self._text = ""
+        self.days: List[Dict[str, Any]] = []
+        self._pos = 0
+        self._stack: List[tuple] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._plans_depth: Optional[int] = None
+        self._day_start: Optional[int] = None
+        self.root_closed = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._text
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk; returns the day plans completed by it"""
+        if not chunk or self.root_closed:
+            self._text += chunk or ""
+            return []
+        self._text += chunk
+        text = self._text
+        completed = []
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start:i]
+                continue
+
+            if not self._stack and ch != "{":
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif ch == ":":
+                self._pending_key = self._last_string
+            elif ch == ",":
+                self._pending_key = None
+            elif ch in "{[":
+                key = self._pending_key if self._stack and self._stack[-1][0] == "{" else None
+                self._stack.append((ch, key))
+                self._pending_key = None
+                depth = len(self._stack)
+                if ch == "[" and key == self.array_key and self._plans_depth is None:
+                    self._plans_depth = depth
+                elif ch == "{" and self._plans_depth is not None and depth == self._plans_depth + 1:
+                    self._day_start = i
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                depth = len(self._stack)
+                self._stack.pop()
+                if ch == "}" and self._day_start is not None and depth == self._plans_depth + 1:
+                    day = self._decode(text[self._day_start:i + 1])
+                    self._day_start = None
+                    if day is not None:
+                        self.days.append(day)
+                        completed.append(day)
+                elif ch == "]" and depth == self._plans_depth:
+                    self._plans_depth = None
+                    self._day_start = None
+                if not self._stack:
+                    self.root_closed = True
+                    break
+
+        self._pos = len(text)
+        return completed
+
+    @staticmethod
+    def _decode(fragment: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = json.loads(fragment)
+        except json.JSONDecodeError:
+            return None
+        return value if isinstance(value, dict) else None
+
+
+class JSONObjectTracker:
+    """Brace/string state of streamed text, to tell when the top-level object closes
+
+    Text before the first '{' is ignored, as in DailyPlanStreamParser.
+    """
+
+    __slots__ = ("depth", "in_string", "escape", "complete")
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk; returns True once the top-level object is closed"""
+        for ch in chunk:
+            if self.complete:
+                break
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                if ch == "{":
+                    self.depth = 1
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                self.complete = self.depth == 0
+        return self.complete
+
+
+# Characters that matter outside strings, and inside them
+_STRUCTURAL = re.compile(r'[{}\[\]",:]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+# Leading whitespace and an opening code fence, after which a top-level array may start
+_LEADING_FENCE = re.compile(r'\s*(?:```[\w-]*\s*)?')
+_CLOSERS = {"{": "}", "[": "]"}
+_DECODER = json.JSONDecoder()
+
+
+class JSONExtraction:
+    """JSON value found in text by extract_json
+
+    start/end delimit its source text (end exclusive); repairs describes
+    what was done to a cut-off value to make it parse, empty when nothing was.
+    """
+
+    __slots__ = ("value", "start", "end", "repairs")
+
+    def __init__(self, value: Any, start: int, end: int, repairs: List[str]):
+        self.value = value
+        self.start = start
+        self.end = end
+        self.repairs = repairs
+
+    @property
+    def repaired(self) -> bool:
+        return bool(self.repairs)
+
+
+def _root_start(text: str) -> int:
+    """Index of the top-level value: an array only if the text (after a code fence) opens with one"""
+    lead = _LEADING_FENCE.match(text).end()
+    if text.startswith("[", lead):
+        return lead
+    return text.find("{")
+
+
+def extract_json(text: str, repair: bool = True) -> JSONExtraction:
+    """The first balanced top-level JSON object in text, found in linear time
+
+    Text before it (chatter, code fences) and after it is ignored; braces
+    inside strings and escaped quotes do not count. Output that ends before
+    the object closes is repaired: the partial last element is dropped and
+    the open arrays and objects are closed. Raises ValueError when there is
+    no object, it does not parse, or it is cut off and repair is False.
+    """
+    start = _root_start(text)
+    if start < 0:
+        raise ValueError("No JSON object found in text")
+
+    # Complete output: the C decoder parses the object and stops at its end
+    try:
+        value, end = _DECODER.raw_decode(text, start)
+        return JSONExtraction(value, start, end, [])
+    except json.JSONDecodeError as e:
+        error = e
+
+    # Otherwise scan for where it breaks off, skipping to structural characters.
+    # safe is where the text can be cut so that closing stack[:safe_depth]
+    # leaves valid JSON. Array elements are kept whole or not at all, so no
+    # cut is made inside one (from atomic_depth down) until it closes.
+    stack: List[str] = []
+    safe, safe_depth = start, 0
+    atomic_depth: Optional[int] = None
+    value_pending = False
+    pos = start
+    while True:
+        match = _STRUCTURAL.search(text, pos)
+        if match is None:
+            break
+        i = match.start()
+        ch = text[i]
+        pos = i + 1
+
+        if ch == '"':
+            closing = None
+            while True:
+                special = _STRING_SPECIAL.search(text, pos)
+                if special is None:
+                    break
+                if text[special.start()] == "\\":
+                    pos = special.start() + 2
+                    continue
+                closing = special.start()
+                break
+            if closing is None:
+                break
+            pos = closing + 1
+            if (value_pending or stack[-1] == "[") and atomic_depth is None:
+                safe, safe_depth = pos, len(stack)
+            value_pending = False
+        elif ch == ":":
+            value_pending = True
+        elif ch == ",":
+            if atomic_depth is None:
+                safe, safe_depth = i, len(stack)
+            value_pending = False
+        elif ch in "{[":
+            if stack and stack[-1] == "[":
+                if atomic_depth is None:
+                    atomic_depth = len(stack)
+            elif atomic_depth is None:
+                # The root or an object's member can be kept, closed empty
+                safe, safe_depth = pos, len(stack) + 1
+            stack.append(ch)
+            value_pending = False
+        else:
+            if not stack or _CLOSERS[stack[-1]] != ch:
+                raise ValueError(f"Unexpected {ch!r} at offset {i}")
+            stack.pop()
+            if not stack:
+                # Balanced, so not cut off: the decoder's error stands
+                raise ValueError(f"Invalid JSON object: {error}") from error
+            if atomic_depth == len(stack):
+                atomic_depth = None
+            if atomic_depth is None:
+                safe, safe_depth = pos, len(stack)
+            value_pending = False
+
+    if not repair:
+        raise ValueError("JSON object is cut off")
+    closers = "".join(_CLOSERS[opener] for opener in reversed(stack[:safe_depth]))
+    repairs = []
+    dropped = text[safe:].strip().lstrip(",").strip()
+    if dropped:
+        repairs.append(f"dropped partial element {dropped[:40]!r}" + ("..." if len(dropped) > 40 else ""))
+    repairs.append(f"closed {closers}")
+    try:
+        value = json.loads(text[start:safe] + closers)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Could not repair cut-off JSON: {e}") from e
+    return JSONExtraction(value, start, len(text), repairs)
+
+
+class JSONStoppingCriteria:
+    """transformers StoppingCriteria that ends each sequence once its JSON object closes
+
+    Args:
+        token_texts: Surface text of every vocabulary entry (see
+            json_constraints.build_token_texts)
+    """
+
+    def __init__(self, token_texts: List[Optional[str]]):
+        self.token_texts = token_texts
+        self.trackers: List[JSONObjectTracker] = []
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        # Called once after every generated token, starting with the first
+        if not self.trackers:
+            self.trackers = [JSONObjectTracker() for _ in range(input_ids.shape[0])]
+
+        done = []
+        for row, tracker in enumerate(self.trackers):
+            if not tracker.complete:
+                text = self.token_texts[int(input_ids[row, -1])]
+                if text:
+                    tracker.feed(text)
+            done.append(tracker.complete)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
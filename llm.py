@@ -1,26 +1,176 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-import torch
 import os
 import json
-from typing import Dict, Any, Optional
-from tripcraft_config import extract_json_from_text, validate_itinerary_json
+import threading
+from importlib.util import find_spec
+from typing import Dict, Any, Iterator, List, Optional, Union
+from llm_batching import MicroBatcher
+from openai_backend import get_openai_backend
+from cpu_profiles import apply_cpu_profile, get_cpu_profile, profile_model_suffix
+from prefix_cache import PrefixKVCache
+from json_constraints import JSONSchemaLogitsProcessor, build_token_texts
+from json_stream import JSONStoppingCriteria
+from deadlines import Deadline, current_deadline
+from tripcraft_config import (
+    extract_json_from_text,
+    validate_itinerary_json,
+    ITINERARY_PROMPT_PREFIX,
+    ITINERARY_PROMPT_PREFIXES,
+    ITINERARY_JSON_SCHEMA
+)
 
 MODEL_NAME = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
 
 USE_OPENAI_FALLBACK = os.getenv("OPENAI_API_KEY") is not None
+USE_MICRO_BATCHING = os.getenv("TRIPCRAFT_MICRO_BATCHING", "1") != "0"
+USE_PREFIX_CACHE = os.getenv("TRIPCRAFT_PREFIX_CACHE", "1") != "0"
+USE_CONSTRAINED_DECODING = os.getenv("TRIPCRAFT_CONSTRAINED_DECODING", "0") == "1"
+USE_JSON_STOPPING = os.getenv("TRIPCRAFT_JSON_STOPPING", "1") != "0"
+# Default budget when the caller does not pass one (see tripcraft_config.itinerary_token_budget)
+MAX_NEW_TOKENS = 800
+# Quantisation/compile/thread settings used when the model runs on CPU
+CPU_PROFILE = get_cpu_profile()
+# Identifies which model produced a result, e.g. for result caching
+LOCAL_MODEL_VERSION = MODEL_NAME + profile_model_suffix(CPU_PROFILE)
+MODEL_VERSION = "openai/gpt-4o-mini" if USE_OPENAI_FALLBACK else LOCAL_MODEL_VERSION
+DEFAULT_SYSTEM_PROMPT = "You are TripCraft, a professional travel itinerary assistant. Generate detailed, realistic travel plans in valid JSON format."
+
+# transformers/torch are only imported when the model is first needed, but a
+# missing install should still fail at import so callers can fall back to llm_mock
+if not USE_OPENAI_FALLBACK and (find_spec("transformers") is None or find_spec("torch") is None):
+    raise ImportError("transformers and torch are required for the local TinyLlama backend")
+
+
+class ModelProvider:
+    """Lazily loads the TinyLlama tokenizer, model and pipeline once per process
+
+    On CPU-only hosts the model is prepared with the given CPU profile
+    (see cpu_profiles.CPU_PROFILES).
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, cpu_profile: Optional[Dict[str, Any]] = None):
+        self.model_name = model_name
+        self.cpu_profile = cpu_profile if cpu_profile is not None else CPU_PROFILE
+        self.tokenizer = None
+        self.model = None
+        self.pipeline = None
+        self.token_texts = None
+        self.load_count = 0
+        self.load_error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_ready(self) -> bool:
+        """True once the model has finished loading"""
+        return self._ready.is_set()
+
+    def _load(self):
+        from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+        import torch
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # Decoder-only models need left padding so batched prompts end where generation starts
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        model = AutoModelForCausalLM.from_pretrained(
+            self.model_name,
+            device_map="auto",
+            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+        )
+        if not torch.cuda.is_available():
+            model = apply_cpu_profile(model, self.cpu_profile)
+        self.pipeline = pipeline(
+            "text-generation",
+            model=model,
+            tokenizer=tokenizer,
+            max_new_tokens=MAX_NEW_TOKENS,
+            temperature=0.7,
+            top_p=0.9,
+            do_sample=True,
+            pad_token_id=tokenizer.eos_token_id
+        )
+        self.tokenizer = tokenizer
+        self.model = model
+        self.load_count += 1
+
+    def warmup(self) -> "ModelProvider":
+        """Load the model synchronously; a no-op once it is loaded"""
+        if self._ready.is_set():
+            return self
+        with self._lock:
+            if not self._ready.is_set():
+                self._load()
+                self.load_error = None
+                self._ready.set()
+        return self
+
+    def preload(self) -> threading.Thread:
+        """Start loading the model on a background daemon thread"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._background_warmup,
+                    name="tinyllama-preload",
+                    daemon=True
+                )
+                self._thread.start()
+            return self._thread
+
+    def _background_warmup(self):
+        try:
+            self.warmup()
+        except Exception as e:
+            self.load_error = e
+            print(f"⚠️  Background model preload failed: {e}")
+
+    def get_token_texts(self):
+        """Surface text of every vocabulary entry, built once for constrained decoding"""
+        tokenizer = self.warmup().tokenizer
+        if self.token_texts is None:
+            self.token_texts = build_token_texts(tokenizer)
+        return self.token_texts
+
+    def get_pipeline(self):
+        """Return the text-generation pipeline, loading it on first use"""
+        return self.warmup().pipeline
+
+
+provider = ModelProvider()
+
+
+def warmup() -> None:
+    """Load the local model now instead of on the first llm() call"""
+    if not USE_OPENAI_FALLBACK:
+        provider.warmup()
+
+
+def preload_in_background() -> Optional[threading.Thread]:
+    """Load the local model on a background thread; returns None when it is not needed"""
+    if USE_OPENAI_FALLBACK:
+        return None
+    return provider.preload()
+
+
+def is_ready() -> bool:
+    """True when llm() can run without waiting for a model load"""
+    return USE_OPENAI_FALLBACK or provider.is_ready
+
+
+def __getattr__(name: str):
+    # Keep `llm.tokenizer`, `llm.model` and `llm.llm_pipeline` working for older callers
+    if name == "llm_pipeline":
+        return provider.get_pipeline()
+    if name in ("tokenizer", "model"):
+        return getattr(provider.warmup(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Load tokenizer & model
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_NAME,
-    device_map="auto",
-    torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-)
 
 def format_chat_prompt(user_prompt: str, system_prompt: Optional[str] = None) -> str:
     """Format prompt for TinyLlama chat model"""
     if system_prompt is None:
-        system_prompt = "You are TripCraft, a professional travel itinerary assistant. Generate detailed, realistic travel plans in valid JSON format."
+        system_prompt = DEFAULT_SYSTEM_PROMPT
 
     return f"""<|system|>
 {system_prompt}
@@ -29,35 +179,222 @@ def format_chat_prompt(user_prompt: str, system_prompt: Optional[str] = None) ->
 <|assistant|>"""
 
 
-# Create text-generation pipeline
-llm_pipeline = pipeline(
-    "text-generation",
-    model=model,
-    tokenizer=tokenizer,
-    max_new_tokens=800,
-    temperature=0.7,
-    top_p=0.9,
-    do_sample=True,
-    pad_token_id=tokenizer.eos_token_id
-)
+# Chat-formatted text shared by every itinerary prompt, up to the user-specific request
+ITINERARY_CHAT_PREFIX = f"""<|system|>
+{DEFAULT_SYSTEM_PROMPT}
+<|user|>
+{ITINERARY_PROMPT_PREFIX}"""
+
+# One cached prefix per schema variant (see tripcraft_config.ITINERARY_PROMPT_PREFIXES)
+prefix_cache = PrefixKVCache([
+    f"<|system|>\n{DEFAULT_SYSTEM_PROMPT}\n<|user|>\n{prefix}"
+    for prefix in ITINERARY_PROMPT_PREFIXES.values()
+])
+
+
+# Output schemas that constrained decoding can enforce, by name
+OUTPUT_SCHEMAS = {"itinerary": ITINERARY_JSON_SCHEMA}
+
+
+def output_schema_for(prompt: str) -> Optional[str]:
+    """Name of the schema to enforce for a user prompt, if constrained decoding applies"""
+    if USE_CONSTRAINED_DECODING and prompt.startswith(tuple(ITINERARY_PROMPT_PREFIXES.values())):
+        return "itinerary"
+    return None
+
+
+def streams_json(prompt: str) -> bool:
+    """Whether a streamed user prompt asks for JSON (streams have no return_json; itineraries do)"""
+    return output_schema_for(prompt) is not None or prompt.startswith(tuple(ITINERARY_PROMPT_PREFIXES.values()))
+
+
+def _logits_processor(schema_name: Optional[str]):
+    if schema_name is None:
+        return None
+    from transformers import LogitsProcessorList
+
+    processor = JSONSchemaLogitsProcessor(
+        OUTPUT_SCHEMAS[schema_name],
+        provider.tokenizer,
+        token_texts=provider.get_token_texts()
+    )
+    return LogitsProcessorList([processor])
+
+
+class DeadlineStoppingCriteria:
+    """Ends generation once the deadline passes or is cancelled (e.g. a hedged call that lost)
+
+    Args:
+        deadline: One Deadline for every row, or a list with one per row (None for no limit)
+    """
 
-def llm(prompt: str, system_prompt: Optional[str] = None, return_json: bool = True) -> str:
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        if isinstance(self.deadline, list):
+            expired = [d is not None and d.expired() for d in self.deadline]
+            return torch.tensor(expired, dtype=torch.bool, device=input_ids.device)
+        return torch.full((input_ids.shape[0],), self.deadline.expired(), dtype=torch.bool, device=input_ids.device)
+
+
+class TokenLimitStoppingCriteria:
+    """Ends each row once it has generated its own token budget
+
+    Args:
+        limits: Budget per row
+        prompt_length: Padded prompt length, where generated tokens start
+    """
+
+    def __init__(self, limits: List[int], prompt_length: int):
+        self.limits = limits
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        generated = input_ids.shape[1] - self.prompt_length
+        return torch.tensor([generated >= limit for limit in self.limits], dtype=torch.bool, device=input_ids.device)
+
+
+def _stopping_criteria(deadline=None, json_output: bool = False, row_limits: Optional[TokenLimitStoppingCriteria] = None):
+    # Ends each sequence of a JSON request as soon as its top-level object
+    # closes (prose may close a brace mid-answer), each row once its
+    # caller's deadline (if any) has passed, and each row at its own budget
+    criteria = [row_limits] if row_limits is not None else []
+    if USE_JSON_STOPPING and json_output:
+        criteria.append(JSONStoppingCriteria(provider.get_token_texts()))
+    if deadline is not None and (not isinstance(deadline, list) or any(d is not None for d in deadline)):
+        criteria.append(DeadlineStoppingCriteria(deadline))
+    if not criteria:
+        return None
+    from transformers import StoppingCriteriaList
+
+    return StoppingCriteriaList(criteria)
+
+
+def _fit_max_new_tokens(model, input_length: int, max_new_tokens: Optional[int]) -> int:
+    """Requested budget, capped so prompt plus output fit the model's context window"""
+    budget = max_new_tokens or MAX_NEW_TOKENS
+    context = getattr(model.config, "max_position_embeddings", None)
+    if context:
+        budget = min(budget, context - input_length)
+    return max(1, budget)
+
+
+def _model_inputs(chat_prompts: List[str], tokenizer, model):
+    # The prefix cache holds a single sequence, so it only applies to unbatched calls
+    if USE_PREFIX_CACHE and len(chat_prompts) == 1:
+        cached = prefix_cache.prepare(model, tokenizer, chat_prompts[0])
+        if cached is not None:
+            return cached
+    return tokenizer(chat_prompts, return_tensors="pt", padding=True).to(model.device)
+
+
+def generate_batch(
+    chat_prompts: List[str],
+    max_new_tokens: Union[None, int, List[Optional[int]]] = None,
+    schema_name: Optional[str] = None,
+    deadlines: Optional[List[Optional[Deadline]]] = None,
+    json_output: bool = False
+) -> List[str]:
+    """Run several formatted chat prompts through one padded model.generate call
+
+    With schema_name set, decoding is constrained to that entry of OUTPUT_SCHEMAS.
+    max_new_tokens is one budget or a list with one per prompt (None for the default);
+    the batch runs to the largest and each row stops at its own.
+    deadlines holds one Deadline (or None) per prompt; each row stops when its own expires.
+    json_output ends each row once its JSON object closes.
+    """
+    import torch
+
+    loaded = provider.warmup()
+    tokenizer, model = loaded.tokenizer, loaded.model
+
+    inputs = _model_inputs(chat_prompts, tokenizer, model)
+    prompt_length = inputs["input_ids"].shape[1]
+    if isinstance(max_new_tokens, list):
+        limits = [_fit_max_new_tokens(model, prompt_length, m) for m in max_new_tokens]
+        row_limits = TokenLimitStoppingCriteria(limits, prompt_length)
+    else:
+        limits = [_fit_max_new_tokens(model, prompt_length, max_new_tokens)] * len(chat_prompts)
+        row_limits = None
+    with torch.inference_mode():
+        output_ids = model.generate(
+            **inputs,
+            max_new_tokens=max(limits),
+            temperature=0.7,
+            top_p=0.9,
+            do_sample=True,
+            pad_token_id=tokenizer.pad_token_id,
+            logits_processor=_logits_processor(schema_name),
+            stopping_criteria=_stopping_criteria(deadlines, json_output, row_limits)
+        )
+
+    # Rows only get padded after their stop when the model has an EOS token, so trim to each budget too
+    new_tokens = output_ids[:, prompt_length:]
+    return [
+        tokenizer.decode(row[:limit], skip_special_tokens=True)
+        for row, limit in zip(new_tokens, limits)
+    ]
+
+
+batcher = MicroBatcher(generate_batch)
+
+
+def llm(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    return_json: bool = True,
+    max_new_tokens: Optional[int] = None
+) -> str:
     """Generate response using TinyLlama or OpenAI fallback.
 
     Args:
         prompt: The user prompt
         system_prompt: Optional system prompt override
         return_json: If True, attempt to extract and validate JSON
+        max_new_tokens: Generation budget (defaults to MAX_NEW_TOKENS)
 
     Returns:
         Generated text or JSON string
     """
     if USE_OPENAI_FALLBACK:
-        return llm_with_openai(prompt, system_prompt, return_json)
+        return llm_with_openai(prompt, system_prompt, return_json, max_new_tokens)
+    return llm_local(prompt, system_prompt, return_json, max_new_tokens)
 
+
+def llm_local(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    return_json: bool = True,
+    max_new_tokens: Optional[int] = None
+) -> str:
+    """Generate a response with the local TinyLlama model, regardless of OPENAI_API_KEY"""
     chat_prompt = format_chat_prompt(prompt, system_prompt)
-    outputs = llm_pipeline(chat_prompt, return_full_text=False)
-    generated_text = outputs[0]["generated_text"].strip()
+    schema_name = output_schema_for(prompt)
+    json_output = return_json or schema_name is not None
+    if USE_MICRO_BATCHING:
+        generated_text = batcher.generate(
+            chat_prompt,
+            deadline=current_deadline(),
+            schema_name=schema_name,
+            max_new_tokens=max_new_tokens,
+            json_output=json_output
+        ).strip()
+    else:
+        pipe = provider.get_pipeline()
+        input_length = len(pipe.tokenizer(chat_prompt).input_ids)
+        outputs = pipe(
+            chat_prompt,
+            return_full_text=False,
+            max_new_tokens=_fit_max_new_tokens(pipe.model, input_length, max_new_tokens),
+            logits_processor=_logits_processor(schema_name),
+            stopping_criteria=_stopping_criteria(current_deadline(), json_output)
+        )
+        generated_text = outputs[0]["generated_text"].strip()
 
     if return_json:
         try:
@@ -69,13 +406,88 @@ def llm(prompt: str, system_prompt: Optional[str] = None, return_json: bool = Tr
     return generated_text
 
 
-def llm_with_openai(prompt: str, system_prompt: Optional[str] = None, return_json: bool = True) -> str:
-    """Fallback to OpenAI API when available"""
+def llm_stream(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    max_new_tokens: Optional[int] = None
+) -> Iterator[str]:
+    """Yield generated text chunks as the model produces them (no JSON post-processing)"""
+    if USE_OPENAI_FALLBACK:
+        yield from llm_stream_openai(prompt, system_prompt, max_new_tokens)
+        return
+    yield from llm_stream_local(prompt, system_prompt, max_new_tokens)
+
+
+def llm_stream_local(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    max_new_tokens: Optional[int] = None
+) -> Iterator[str]:
+    """Stream text chunks from the local TinyLlama model"""
+    from transformers import TextIteratorStreamer
+
+    loaded = provider.warmup()
+    tokenizer, model = loaded.tokenizer, loaded.model
+
+    chat_prompt = format_chat_prompt(prompt, system_prompt)
+    inputs = _model_inputs([chat_prompt], tokenizer, model)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    generation = threading.Thread(
+        target=model.generate,
+        kwargs=dict(
+            **inputs,
+            streamer=streamer,
+            logits_processor=_logits_processor(output_schema_for(prompt)),
+            stopping_criteria=_stopping_criteria(current_deadline(), streams_json(prompt)),
+            max_new_tokens=_fit_max_new_tokens(model, inputs["input_ids"].shape[1], max_new_tokens),
+            temperature=0.7,
+            top_p=0.9,
+            do_sample=True,
+            pad_token_id=tokenizer.pad_token_id
+        ),
+        daemon=True
+    )
+    generation.start()
     try:
-        import openai
+        for text in streamer:
+            if text:
+                yield text
+    finally:
+        generation.join()
+
+
+def llm_stream_openai(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    max_new_tokens: Optional[int] = None
+) -> Iterator[str]:
+    """Stream chat completion deltas from OpenAI"""
+    if system_prompt is None:
+        system_prompt = "You are TripCraft, a professional travel itinerary assistant."
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+    deadline = current_deadline()
+    yield from get_openai_backend().stream(
+        messages,
+        temperature=0.7,
+        max_tokens=max_new_tokens or 2000,
+        timeout=deadline.timeout(),
+        cancelled=lambda: deadline.cancelled
+    )
 
-        openai.api_key = os.getenv("OPENAI_API_KEY")
 
+def llm_with_openai(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    return_json: bool = True,
+    max_new_tokens: Optional[int] = None
+) -> str:
+    """Fallback to OpenAI API when available"""
+    try:
         if system_prompt is None:
             system_prompt = "You are TripCraft, a professional travel itinerary assistant."
 
@@ -84,15 +496,12 @@ def llm_with_openai(prompt: str, system_prompt: Optional[str] = None, return_jso
             {"role": "user", "content": prompt}
         ]
 
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=messages,
+        generated_text = get_openai_backend().complete(
+            messages,
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=max_new_tokens or 2000
         )
 
-        generated_text = response.choices[0].message.content.strip()
-
         if return_json:
             try:
                 json_data = extract_json_from_text(generated_text)
@@ -102,7 +511,5 @@ def llm_with_openai(prompt: str, system_prompt: Optional[str] = None, return_jso
 
         return generated_text
 
-    except ImportError:
-        raise Exception("OpenAI API key is set but 'openai' package is not installed. Run: pip install openai")
     except Exception as e:
         raise Exception(f"OpenAI API error: {str(e)}")
@@ -0,0 +1,674 @@
+"""
+Pluggable LLM backends with latency-aware routing
+Every backend (local transformers, OpenAI, an OpenAI-compatible local server,
+the mock) exposes the same complete/stream interface; LLMRouter picks one per
+call from rolling latency and error statistics and fails over on errors
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from importlib.util import find_spec
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from tripcraft_config import extract_json_from_text, load_env
+from metrics import observe_llm_call, HEDGE_REQUESTS, HEDGE_SECONDS
+from deadlines import current_deadline, deadline_context
+
+DEFAULT_SYSTEM_PROMPT = "You are TripCraft, a professional travel itinerary assistant. Generate detailed, realistic travel plans in valid JSON format."
+
+
+class NoBackendAvailableError(Exception):
+    """Raised when every candidate backend is unavailable or failed"""
+
+    def __init__(self, message: str, errors: Optional[Dict[str, BaseException]] = None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+def _as_json_text(text: str, return_json: bool) -> str:
+    if not return_json:
+        return text
+    try:
+        return json.dumps(extract_json_from_text(text), indent=2)
+    except Exception:
+        return text
+
+
+class LLMBackend:
+    """Common interface for text generation backends
+
+    Subclasses implement generate(); stream() defaults to a single chunk.
+    Degraded backends (e.g. the mock) are only routed to when no real
+    backend can serve the call.
+    """
+
+    name = "backend"
+    degraded = False
+
+    @property
+    def model_version(self) -> str:
+        """Identifies the model behind this backend, e.g. for result caching"""
+        return self.name
+
+    def available(self) -> bool:
+        """Cheap check that the backend can be used at all (no model loading)"""
+        return True
+
+    def preload(self) -> Optional[threading.Thread]:
+        """Start any slow initialisation in the background"""
+        return None
+
+    def generate(self, prompt: str, system_prompt: Optional[str] = None, max_new_tokens: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    def complete(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        return_json: bool = True,
+        max_new_tokens: Optional[int] = None
+    ) -> str:
+        """Generated text, reformatted as indented JSON when return_json and it parses"""
+        return _as_json_text(self.generate(prompt, system_prompt, max_new_tokens).strip(), return_json)
+
+    def stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        max_new_tokens: Optional[int] = None
+    ) -> Iterator[str]:
+        """Generated text in chunks (no JSON post-processing)"""
+        yield self.generate(prompt, system_prompt, max_new_tokens)
+
+
+class TransformersBackend(LLMBackend):
+    """Local TinyLlama via llm.py (model loads on first use)"""
+
+    name = "transformers"
+
+    def available(self) -> bool:
+        return find_spec("transformers") is not None and find_spec("torch") is not None
+
+    @property
+    def model_version(self) -> str:
+        import llm
+        return llm.LOCAL_MODEL_VERSION
+
+    def preload(self) -> Optional[threading.Thread]:
+        import llm
+        return llm.provider.preload()
+
+    def generate(self, prompt: str, system_prompt: Optional[str] = None, max_new_tokens: Optional[int] = None) -> str:
+        import llm
+        return llm.llm_local(prompt, system_prompt, return_json=False, max_new_tokens=max_new_tokens)
+
+    def complete(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        return_json: bool = True,
+        max_new_tokens: Optional[int] = None
+    ) -> str:
+        # llm_local needs return_json up front: only JSON requests stop when their object closes
+        import llm
+        return llm.llm_local(prompt, system_prompt, return_json=return_json, max_new_tokens=max_new_tokens)
+
+    def stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        max_new_tokens: Optional[int] = None
+    ) -> Iterator[str]:
+        import llm
+        yield from llm.llm_stream_local(prompt, system_prompt, max_new_tokens)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Any /chat/completions endpoint: OpenAI itself, or a local stand-in server
+
+    Args:
+        name: Registry name
+        base_url: API root; None uses OPENAI_BASE_URL or api.openai.com
+        api_key: Bearer token; None uses OPENAI_API_KEY
+        model: Model name sent with each request
+    """
+
+    def __init__(
+        self,
+        name: str = "openai",
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        model: str = "gpt-4o-mini",
+        max_tokens: int = 2000
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.max_tokens = max_tokens
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_version(self) -> str:
+        return f"{self.name}/{self.model}"
+
+    def available(self) -> bool:
+        return bool(self.api_key or (self.base_url is None and os.getenv("OPENAI_API_KEY")))
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                if self.base_url is None and self.api_key is None:
+                    from openai_backend import get_openai_backend
+                    self._client = get_openai_backend()
+                else:
+                    from openai_backend import OpenAIChatBackend
+                    self._client = OpenAIChatBackend(api_key=self.api_key, base_url=self.base_url, model=self.model)
+            return self._client
+
+    def generate(self, prompt: str, system_prompt: Optional[str] = None, max_new_tokens: Optional[int] = None) -> str:
+        messages = [
+            {"role": "system", "content": system_prompt or DEFAULT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        deadline = current_deadline()
+        return self.client().complete(
+            messages,
+            temperature=0.7,
+            max_tokens=max_new_tokens or self.max_tokens,
+            timeout=deadline.timeout(),
+            cancelled=lambda: deadline.cancelled
+        )
+
+    def stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        max_new_tokens: Optional[int] = None
+    ) -> Iterator[str]:
+        messages = [
+            {"role": "system", "content": system_prompt or DEFAULT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        deadline = current_deadline()
+        yield from self.client().stream(
+            messages,
+            temperature=0.7,
+            max_tokens=max_new_tokens or self.max_tokens,
+            timeout=deadline.timeout(),
+            cancelled=lambda: deadline.cancelled
+        )
+
+
+class MockBackend(LLMBackend):
+    """Template itineraries from llm_mock; always available, never preferred"""
+
+    name = "mock"
+    degraded = True
+
+    def __init__(self, chunk_size: int = 16):
+        self.chunk_size = chunk_size
+
+    @property
+    def model_version(self) -> str:
+        return "mock"
+
+    def generate(self, prompt: str, system_prompt: Optional[str] = None, max_new_tokens: Optional[int] = None) -> str:
+        from llm_mock import generate_mock_itinerary
+        return generate_mock_itinerary(prompt)
+
+    def stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        max_new_tokens: Optional[int] = None
+    ) -> Iterator[str]:
+        text = self.generate(prompt, system_prompt)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+
+class BackendStats:
+    """Rolling latency/error window for one backend, with a simple circuit breaker
+
+    After max_consecutive_failures errors in a row the backend is skipped for
+    cooldown_seconds; the next call after that is a trial.
+    """
+
+    def __init__(self, window: int = 50, max_consecutive_failures: int = 3, cooldown_seconds: float = 30.0):
+        self.max_consecutive_failures = max_consecutive_failures
+        self.cooldown_seconds = cooldown_seconds
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._latencies: deque = deque(maxlen=window)
+        self._outcomes: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            self._outcomes.append(ok)
+            if ok:
+                self._latencies.append(seconds)
+                self.consecutive_failures = 0
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.max_consecutive_failures:
+                    self.open_until = time.monotonic() + self.cooldown_seconds
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def latency(self, quantile: float = 0.95) -> Optional[float]:
+        """Latency quantile of recent successful calls, or None before the first one"""
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": self.error_rate,
+            "p50_seconds": self.latency(0.5),
+            "p95_seconds": self.latency(0.95),
+            "healthy": self.healthy
+        }
+
+
+class BackendRegistry:
+    """Named backends in preference order, each with its own statistics
+
+    A backend registered with max_concurrency serves at most that many
+    router calls at once; further calls wait for a slot.
+    """
+
+    def __init__(self):
+        self._backends: Dict[str, LLMBackend] = {}
+        self.stats: Dict[str, BackendStats] = {}
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+
+    def register(
+        self,
+        backend: LLMBackend,
+        stats: Optional[BackendStats] = None,
+        max_concurrency: Optional[int] = None
+    ) -> LLMBackend:
+        self._backends[backend.name] = backend
+        self.stats[backend.name] = stats or BackendStats()
+        if max_concurrency:
+            self._limits[backend.name] = threading.BoundedSemaphore(max_concurrency)
+        else:
+            self._limits.pop(backend.name, None)
+        return backend
+
+    def slot(self, name: str):
+        """Context manager holding one of the backend's concurrency slots"""
+        return self._limits.get(name) or nullcontext()
+
+    def get(self, name: str) -> LLMBackend:
+        return self._backends[name]
+
+    def names(self) -> List[str]:
+        return list(self._backends)
+
+    def __iter__(self):
+        return iter(self._backends.values())
+
+
+class LLMRouter:
+    """Chooses a backend per call and fails over to the next one on errors
+
+    Candidates are the available, healthy backends in registry order. Those
+    whose recent p95 latency exceeds the call's latency budget move behind
+    the ones that fit it; degraded backends always go last. Inside a run
+    with a deadline (see deadlines.py) the budget is at most the time left,
+    and no further backend is tried once it has passed.
+
+    With hedge_after set, complete() hedges: if the first backend has not
+    answered within that many seconds, the next non-degraded backend is
+    started alongside it, the first acceptable answer wins and the other
+    call is cancelled.
+
+    Args:
+        registry: Backends to route between
+        latency_budget: Default budget in seconds for calls that do not pass one
+        hedge_after: Default hedge delay in seconds (None disables hedging)
+    """
+
+    def __init__(
+        self,
+        registry: BackendRegistry,
+        latency_budget: Optional[float] = None,
+        hedge_after: Optional[float] = None
+    ):
+        self.registry = registry
+        self.latency_budget = latency_budget
+        self.hedge_after = hedge_after
+        self._local = threading.local()
+        # Runs both legs of hedged calls; threads start on first use
+        self._hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+    def _budget(self, latency_budget: Optional[float]) -> Optional[float]:
+        budget = latency_budget if latency_budget is not None else self.latency_budget
+        deadline = current_deadline()
+        if deadline.bounded:
+            budget = deadline.remaining() if budget is None else min(budget, deadline.remaining())
+        return budget
+
+    def candidates(self, latency_budget: Optional[float] = None) -> List[LLMBackend]:
+        budget = self._budget(latency_budget)
+        usable = [b for b in self.registry if b.available()]
+        healthy = [b for b in usable if self.registry.stats[b.name].healthy]
+
+        def rank(indexed):
+            index, backend = indexed
+            p95 = self.registry.stats[backend.name].latency()
+            over_budget = budget is not None and p95 is not None and p95 > budget
+            return (backend.degraded, over_budget, index)
+
+        ordered = [b for _, b in sorted(enumerate(healthy), key=rank)]
+        # If every breaker is open, still try the rest rather than fail outright
+        return ordered or usable
+
+    def primary(self) -> Optional[LLMBackend]:
+        """Backend the next call would try first"""
+        candidates = self.candidates()
+        return candidates[0] if candidates else None
+
+    def expected_latency(self, latency_budget: Optional[float] = None) -> Optional[float]:
+        """Recent p95 latency of the backend a call would try first, None if unknown"""
+        candidates = self.candidates(latency_budget)
+        return self.registry.stats[candidates[0].name].latency() if candidates else None
+
+    @property
+    def model_version(self) -> str:
+        primary = self.primary()
+        return primary.model_version if primary else "none"
+
+    def last_served(self) -> Optional[LLMBackend]:
+        """Backend that answered this thread's most recent successful call"""
+        return getattr(self._local, "backend", None)
+
+    def preload(self) -> Optional[threading.Thread]:
+        """Preload only the backend that will serve calls first"""
+        primary = self.primary()
+        return primary.preload() if primary else None
+
+    def _call(self, backend: LLMBackend, fn, prompt: str, system_prompt: Optional[str]):
+        stats = self.registry.stats[backend.name]
+        with self.registry.slot(backend.name):
+            # Timed once a slot is free, so queueing does not count against the backend
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception:
+                seconds = time.perf_counter() - start
+                # A cancelled call (a hedge that lost) says nothing about the backend's health
+                if not current_deadline().cancelled:
+                    stats.record(seconds, ok=False)
+                observe_llm_call(backend.name, "complete", seconds, prompt, None, system_prompt)
+                raise
+            seconds = time.perf_counter() - start
+            if not current_deadline().cancelled:
+                stats.record(seconds, ok=True)
+            observe_llm_call(backend.name, "complete", seconds, prompt, result, system_prompt)
+        self._local.backend = backend
+        return result
+
+    def complete(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        return_json: bool = True,
+        max_new_tokens: Optional[int] = None,
+        latency_budget: Optional[float] = None,
+        hedge_after: Optional[float] = None,
+        accept: Optional[Callable[[str], bool]] = None
+    ) -> str:
+        """Same contract as llm.llm(), served by the best backend that succeeds
+
+        hedge_after overrides the router's hedge delay for this call; accept
+        decides which hedged answer counts (e.g. a schema check), by default
+        the first that does not raise.
+        """
+        candidates = self.candidates(latency_budget)
+        hedge_after = hedge_after if hedge_after is not None else self.hedge_after
+        real = [b for b in candidates if not b.degraded]
+        if hedge_after is not None and len(real) >= 2:
+            return self._hedged_complete(
+                real[0], real[1], [b for b in candidates if b not in real[:2]],
+                hedge_after, accept, prompt, system_prompt, return_json, max_new_tokens
+            )
+        return self._complete_in_order(candidates, prompt, system_prompt, return_json, max_new_tokens)
+
+    def _hedged_complete(
+        self,
+        primary: LLMBackend,
+        hedge: LLMBackend,
+        rest: List[LLMBackend],
+        hedge_after: float,
+        accept: Optional[Callable[[str], bool]],
+        prompt: str,
+        system_prompt: Optional[str],
+        return_json: bool,
+        max_new_tokens: Optional[int]
+    ) -> str:
+        """primary, then hedge too if primary is slow or fails; the first acceptable answer wins"""
+        deadline = current_deadline()
+        start = time.perf_counter()
+        legs = {}
+
+        def launch(backend: LLMBackend):
+            # Each leg can be cancelled on its own, and still stops with the run's deadline
+            leg_deadline = deadline.child()
+            future = self._hedge_pool.submit(
+                deadline_context(leg_deadline).run,
+                self._call,
+                backend,
+                lambda: backend.complete(prompt, system_prompt, return_json, max_new_tokens),
+                prompt,
+                system_prompt
+            )
+            legs[future] = (backend, leg_deadline)
+
+        deadline.check("LLM generation")
+        launch(primary)
+        done, pending = wait(list(legs), timeout=hedge_after)
+        if not done:
+            launch(hedge)
+            pending = set(legs)
+
+        errors: Dict[str, BaseException] = {}
+        rejected: Optional[str] = None
+        while True:
+            for future in done:
+                backend, _ = legs[future]
+                try:
+                    output = future.result()
+                except Exception as e:
+                    errors[backend.name] = e
+                    print(f"⚠️  LLM backend '{backend.name}' failed, trying next: {e}")
+                    continue
+                if accept is None or accept(output):
+                    for loser in pending:
+                        legs[loser][1].cancel()
+                    self._local.backend = backend
+                    self._record_hedge(legs, backend, primary, start)
+                    return output
+                rejected = rejected if rejected is not None else output
+            if not pending and hedge not in [b for b, _ in legs.values()]:
+                # primary answered early but unusably: try the hedge straight away
+                launch(hedge)
+                pending = {f for f in legs if not f.done()}
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+        # Only a call that actually started its second leg counts as hedged
+        HEDGE_REQUESTS.inc(result="failed" if len(legs) > 1 else "unhedged_failed")
+        if rejected is not None:
+            # Let the caller's own validation (and fallback) deal with it
+            self._local.backend = primary
+            return rejected
+        return self._complete_in_order(rest, prompt, system_prompt, return_json, max_new_tokens, errors)
+
+    def _record_hedge(self, legs, winner: LLMBackend, primary: LLMBackend, start: float):
+        seconds = time.perf_counter() - start
+        hedged = len(legs) > 1
+        HEDGE_REQUESTS.inc(result="unhedged" if not hedged else "primary" if winner is primary else "hedge")
+        HEDGE_SECONDS.observe(seconds, path="hedged")
+        if winner is primary:
+            # A primary that lost was cancelled, so its own latency was never observed
+            HEDGE_SECONDS.observe(seconds, path="primary")
+
+    def _complete_in_order(
+        self,
+        candidates: List[LLMBackend],
+        prompt: str,
+        system_prompt: Optional[str],
+        return_json: bool,
+        max_new_tokens: Optional[int],
+        errors: Optional[Dict[str, BaseException]] = None
+    ) -> str:
+        errors = dict(errors or {})
+        deadline = current_deadline()
+        for backend in candidates:
+            deadline.check("LLM generation")
+            try:
+                return self._call(
+                    backend,
+                    lambda: backend.complete(prompt, system_prompt, return_json, max_new_tokens),
+                    prompt,
+                    system_prompt
+                )
+            except Exception as e:
+                errors[backend.name] = e
+                print(f"⚠️  LLM backend '{backend.name}' failed, trying next: {e}")
+        raise NoBackendAvailableError(f"All LLM backends failed: {errors or 'none available'}", errors)
+
+    def stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        max_new_tokens: Optional[int] = None,
+        latency_budget: Optional[float] = None
+    ) -> Iterator[str]:
+        """Same contract as llm.llm_stream(); fails over only before the first chunk"""
+        errors: Dict[str, BaseException] = {}
+        deadline = current_deadline()
+        for backend in self.candidates(latency_budget):
+            deadline.check("LLM generation")
+            stats = self.registry.stats[backend.name]
+            chunks = []
+            try:
+                with self.registry.slot(backend.name):
+                    start = time.perf_counter()
+                    for chunk in backend.stream(prompt, system_prompt, max_new_tokens):
+                        chunks.append(chunk)
+                        yield chunk
+            except Exception as e:
+                seconds = time.perf_counter() - start
+                stats.record(seconds, ok=False)
+                observe_llm_call(backend.name, "stream", seconds, prompt, None, system_prompt)
+                if chunks:
+                    raise
+                errors[backend.name] = e
+                print(f"⚠️  LLM backend '{backend.name}' failed, trying next: {e}")
+                continue
+            seconds = time.perf_counter() - start
+            stats.record(seconds, ok=True)
+            observe_llm_call(backend.name, "stream", seconds, prompt, "".join(chunks), system_prompt)
+            self._local.backend = backend
+            return
+        raise NoBackendAvailableError(f"All LLM backends failed: {errors or 'none available'}", errors)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.registry.stats[name].snapshot() for name in self.registry.names()}
+
+
+def parse_concurrency_limits(spec: str) -> Dict[str, int]:
+    """'openai=8,local_server=4' -> {"openai": 8, "local_server": 4}"""
+    limits = {}
+    for part in [p.strip() for p in spec.split(",") if p.strip()]:
+        name, _, value = part.partition("=")
+        try:
+            limits[name.strip()] = int(value)
+        except ValueError:
+            raise ValueError(f"Invalid backend concurrency '{part}', expected name=count")
+    return limits
+
+
+def default_registry() -> BackendRegistry:
+    """Backends in the order named by TRIPCRAFT_LLM_BACKENDS
+
+    Defaults to openai, local_server, transformers, mock. local_server is an
+    OpenAI-compatible endpoint at TRIPCRAFT_LOCAL_LLM_URL (e.g. llama.cpp or
+    vLLM) and is skipped when that is not set. TRIPCRAFT_BACKEND_CONCURRENCY
+    (e.g. "local_server=4,transformers=2") caps concurrent calls per backend.
+    """
+    factories = {
+        "openai": lambda: OpenAICompatibleBackend("openai"),
+        "local_server": lambda: OpenAICompatibleBackend(
+            "local_server",
+            base_url=os.getenv("TRIPCRAFT_LOCAL_LLM_URL"),
+            api_key=os.getenv("TRIPCRAFT_LOCAL_LLM_KEY", "local"),
+            model=os.getenv("TRIPCRAFT_LOCAL_LLM_MODEL", "local")
+        ) if os.getenv("TRIPCRAFT_LOCAL_LLM_URL") else None,
+        "transformers": TransformersBackend,
+        "mock": MockBackend,
+    }
+    order = os.getenv("TRIPCRAFT_LLM_BACKENDS", "openai,local_server,transformers,mock")
+    limits = parse_concurrency_limits(os.getenv("TRIPCRAFT_BACKEND_CONCURRENCY", ""))
+
+    registry = BackendRegistry()
+    for name in [n.strip() for n in order.split(",") if n.strip()]:
+        if name not in factories:
+            raise ValueError(f"Unknown LLM backend '{name}'. Choose from: {', '.join(factories)}")
+        backend = factories[name]()
+        if backend is not None:
+            registry.register(backend, max_concurrency=limits.get(name))
+    return registry
+
+
+_router: Optional[LLMRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """Process-wide router
+
+    TRIPCRAFT_LATENCY_BUDGET sets its default budget in seconds and
+    TRIPCRAFT_HEDGE_AFTER its hedge delay (unset: no hedging).
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                load_env()
+                budget = os.getenv("TRIPCRAFT_LATENCY_BUDGET")
+                hedge_after = os.getenv("TRIPCRAFT_HEDGE_AFTER")
+                _router = LLMRouter(
+                    default_registry(),
+                    latency_budget=float(budget) if budget else None,
+                    hedge_after=float(hedge_after) if hedge_after else None
+                )
+    return _router
@@ -0,0 +1,164 @@
+"""
+Dynamic micro-batching for the local text-generation model
+Concurrent llm() calls are collected for a few milliseconds and run as one padded generate call
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("TRIPCRAFT_BATCH_SIZE", "8"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("TRIPCRAFT_BATCH_WAIT_MS", "10"))
+
+BatchFn = Callable[..., List[str]]
+
+
+class _Request:
+    __slots__ = ("prompt", "options", "deadline", "future")
+
+    def __init__(self, prompt: str, options: Dict[str, Any], deadline=None):
+        self.prompt = prompt
+        self.options = options
+        # Per request, so it is not part of the key: rows with different deadlines share a batch
+        self.deadline = deadline
+        self.future: Future = Future()
+
+    @property
+    def key(self) -> Tuple:
+        # The token budget is per row too: the batch runs to the largest and each row stops at its own
+        return tuple(sorted((k, v) for k, v in self.options.items() if k != "max_new_tokens"))
+
+
+class MicroBatcher:
+    """Collects concurrent generation requests and runs them as batches
+
+    Args:
+        generate_batch: Called as generate_batch(prompts, **options) and must
+            return one completion per prompt, in order. When any request in the
+            batch has a deadline it also gets deadlines=[one per prompt, or None],
+            and should end each row once its deadline expires. Requests with
+            different max_new_tokens share a batch, which then gets
+            max_new_tokens=[one per prompt] and should end each row at its own
+        max_batch_size: Upper bound on prompts per generate call
+        max_wait_ms: How long the first request of a batch waits for company
+    """
+
+    def __init__(
+        self,
+        generate_batch: BatchFn,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches_run = 0
+        self.requests_served = 0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, prompt: str, deadline=None, **options) -> Future:
+        """Queue a prompt; the returned future resolves to its completion
+
+        deadline (a deadlines.Deadline) fails the request if it expires while
+        queued, and is passed on so generation stops when it expires later.
+        """
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        request = _Request(prompt, options, deadline)
+        self._ensure_worker()
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, deadline=None, **options) -> str:
+        """Blocking helper: submit a prompt and wait for its completion"""
+        return self.submit(prompt, deadline=deadline, **options).result(timeout=timeout)
+
+    def close(self):
+        """Stop the worker thread after the queued requests are served"""
+        with self._lock:
+            self._closed = True
+            if self._worker is not None:
+                self._queue.put(None)
+                self._worker.join()
+                self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="llm-micro-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self, first: _Request) -> Tuple[List[_Request], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stop = self._collect(first)
+
+            # Requests with different generation options (other than the budget) cannot share a generate call
+            groups: Dict[Tuple, List[_Request]] = {}
+            for request in batch:
+                groups.setdefault(request.key, []).append(request)
+
+            for group in groups.values():
+                self._run_group(group)
+
+    def _run_group(self, group: List[_Request]):
+        # Requests whose caller gave up (or lost a hedge) while queued are not generated
+        live = []
+        for request in group:
+            try:
+                if request.deadline is not None:
+                    request.deadline.check("queued generation")
+                live.append(request)
+            except Exception as e:
+                request.future.set_exception(e)
+        if not live:
+            return
+        group = live
+
+        options = dict(group[0].options)
+        limits = [r.options.get("max_new_tokens") for r in group]
+        if len(set(limits)) > 1:
+            options["max_new_tokens"] = limits
+        if any(r.deadline is not None for r in group):
+            options["deadlines"] = [r.deadline for r in group]
+        try:
+            outputs = self.generate_batch([r.prompt for r in group], **options)
+            if len(outputs) != len(group):
+                raise RuntimeError(f"generate_batch returned {len(outputs)} outputs for {len(group)} prompts")
+        except BaseException as e:
+            for request in group:
+                request.future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.requests_served += len(group)
+        for request, output in zip(group, outputs):
+            request.future.set_result(output)
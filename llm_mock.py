@@ -5,9 +5,12 @@ Can be replaced with actual LLM later
 import os
 import json
 import re
-from typing import Optional
+from typing import Iterator, Optional
 from datetime import datetime, timedelta
 
+# Identifies which model produced a result, e.g. for result caching
+MODEL_VERSION = "mock+openai/gpt-4o-mini" if os.getenv("OPENAI_API_KEY") else "mock"
+
 
 def extract_date_info(prompt: str):
     """Extract date information from prompt"""
@@ -217,7 +220,12 @@ def generate_mock_itinerary(prompt: str) -> str:
     return json.dumps(itinerary, indent=2)
 
 
-def llm(prompt: str, system_prompt: Optional[str] = None, return_json: bool = True) -> str:
+def llm(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    return_json: bool = True,
+    max_new_tokens: Optional[int] = None
+) -> str:
     """
     Mock LLM function that generates proper JSON
     In production, this would call actual LLM (TinyLlama or OpenAI)
@@ -235,6 +243,21 @@ def llm(prompt: str, system_prompt: Optional[str] = None, return_json: bool = Tr
     return generate_mock_itinerary(prompt)
 
 
+def llm_stream(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    max_new_tokens: Optional[int] = None,
+    chunk_size: int = 16
+) -> Iterator[str]:
+    """
+    Mock streaming LLM: yields the mock itinerary in small chunks
+    so streaming consumers can be exercised without a model
+    """
+    text = llm(prompt, system_prompt, return_json=True)
+    for i in range(0, len(text), chunk_size):
+        yield text[i:i + chunk_size]
+
+
 def llm_with_openai(prompt: str, system_prompt: Optional[str] = None, return_json: bool = True) -> str:
     """Use OpenAI API if available"""
     try:
@@ -0,0 +1,320 @@
+"""
+In-process metrics for planning
+Counters and histograms for node latency, LLM and Tavily calls (wall time,
+prompt/completion tokens), fallback itineraries and cache lookups, rendered
+in the Prometheus text format for /metrics or as JSON for the CLI
+"""
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._series.get(self._key(labels), 0.0)
+
+    def render(self):
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                yield f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+
+    def snapshot(self):
+        with self._lock:
+            return [{"labels": self._labels(key), "value": value} for key, value in sorted(self._series.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    cumulative += count
+                    yield f"{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}"
+                yield f"{self.name}_sum{_format_labels(labels)} {_format_value(series['sum'])}"
+                yield f"{self.name}_count{_format_labels(labels)} {series['count']}"
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimated q-quantile over the series matching labels, interpolated within buckets
+
+        Like Prometheus' histogram_quantile(); None before any observation.
+        """
+        with self._lock:
+            matching = [
+                series for key, series in self._series.items()
+                if all(self._labels(key).get(name) == str(value) for name, value in labels.items())
+            ]
+            counts = [sum(series["buckets"][i] for series in matching) for i in range(len(self.buckets))]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative, lower = 0, 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and cumulative + count >= rank:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound if bound != math.inf else lower
+        return lower
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {
+                    "labels": self._labels(key),
+                    "count": series["count"],
+                    "sum": series["sum"],
+                    "mean": series["sum"] / series["count"] if series["count"] else 0.0,
+                    "buckets": {_format_value(b): c for b, c in zip(self.buckets, series["buckets"])}
+                }
+                for key, series in sorted(self._series.items())
+            ]
+
+
+class MetricsRegistry:
+    """Named metrics; counter()/histogram() return the existing metric when re-registered"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, labelnames, buckets)
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: {"type": m.kind, "help": m.help, "series": m.snapshot()} for m in metrics}
+
+    def clear(self):
+        """Reset every series (the metrics stay registered)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+NODE_SECONDS = REGISTRY.histogram(
+    "tripcraft_node_duration_seconds", "Wall time of workflow nodes", ["node", "outcome"]
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "tripcraft_llm_request_duration_seconds", "Wall time of LLM calls", ["backend", "mode", "outcome"]
+)
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "tripcraft_llm_prompt_tokens", "Prompt tokens per LLM call", ["backend"], buckets=TOKEN_BUCKETS
+)
+LLM_COMPLETION_TOKENS = REGISTRY.histogram(
+    "tripcraft_llm_completion_tokens", "Completion tokens per successful LLM call", ["backend"], buckets=TOKEN_BUCKETS
+)
+SEARCH_SECONDS = REGISTRY.histogram(
+    "tripcraft_search_duration_seconds", "Wall time of outbound Tavily searches", ["kind", "outcome"]
+)
+SEARCH_COALESCED = REGISTRY.counter(
+    "tripcraft_search_coalesced_total", "Searches answered by an identical in-flight search", ["kind"]
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "tripcraft_cache_requests_total", "Result cache lookups", ["cache", "result"]
+)
+FALLBACK_ITINERARIES = REGISTRY.counter(
+    "tripcraft_fallback_itineraries_total", "Itineraries replaced by create_fallback_itinerary", ["workflow"]
+)
+HEDGE_REQUESTS = REGISTRY.counter(
+    "tripcraft_llm_hedge_requests_total",
+    "LLM calls in hedging mode by outcome: answered (unhedged) or failed (unhedged_failed) before the hedge "
+    "delay, or hedged and won by the primary, won by the hedge, or failed on both",
+    ["result"]
+)
+HEDGE_SECONDS = REGISTRY.histogram(
+    "tripcraft_llm_hedge_seconds",
+    "Hedging-mode latency as seen by the caller (path=hedged) and of answers the primary returned "
+    "(path=primary; a primary cancelled after losing is not observed)",
+    ["path"]
+)
+DEADLINE_DEGRADATIONS = REGISTRY.counter(
+    "tripcraft_deadline_degradations_total", "Work skipped or shortened to meet a plan's time budget", ["node", "action"]
+)
+
+
+def observe_llm_call(
+    backend: str,
+    mode: str,
+    seconds: float,
+    prompt: str,
+    completion: Optional[str] = None,
+    system_prompt: Optional[str] = None
+):
+    """Record one LLM call; completion is None when the call failed
+
+    Tokens are counted with the backend's tokenizer (see prompt_builder).
+    """
+    from prompt_builder import active_token_counter
+
+    counter = active_token_counter(backend)
+    LLM_SECONDS.observe(seconds, backend=backend, mode=mode, outcome="ok" if completion is not None else "error")
+    LLM_PROMPT_TOKENS.observe(counter.count((system_prompt or "") + prompt), backend=backend)
+    if completion is not None:
+        LLM_COMPLETION_TOKENS.observe(counter.count(completion), backend=backend)
+
+
+def instrumented_llm(llm: Callable[..., str], backend: str) -> Callable[..., str]:
+    """Wrap an llm(prompt, system_prompt, return_json, max_new_tokens) function with call metrics"""
+    def call(prompt: str, system_prompt: Optional[str] = None, return_json: bool = True, max_new_tokens: Optional[int] = None) -> str:
+        start = time.perf_counter()
+        output = None
+        try:
+            output = llm(prompt, system_prompt, return_json, max_new_tokens)
+            return output
+        finally:
+            observe_llm_call(backend, "complete", time.perf_counter() - start, prompt, output, system_prompt)
+    return call
+
+
+def instrumented_llm_stream(llm_stream: Callable[..., Iterator[str]], backend: str) -> Callable[..., Iterator[str]]:
+    """Wrap an llm_stream(prompt, system_prompt, max_new_tokens) generator with call metrics"""
+    def stream(prompt: str, system_prompt: Optional[str] = None, max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        start = time.perf_counter()
+        chunks = []
+        completed = False
+        try:
+            for chunk in llm_stream(prompt, system_prompt, max_new_tokens):
+                chunks.append(chunk)
+                yield chunk
+            completed = True
+        finally:
+            output = "".join(chunks) if completed else None
+            observe_llm_call(backend, "stream", time.perf_counter() - start, prompt, output, system_prompt)
+    return stream
+
+
+def cache_hit_ratios() -> Dict[str, float]:
+    """Hits / lookups per cache, from tripcraft_cache_requests_total"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for series in CACHE_REQUESTS.snapshot():
+        cache = totals.setdefault(series["labels"]["cache"], {"hit": 0.0, "miss": 0.0})
+        cache[series["labels"]["result"]] = cache.get(series["labels"]["result"], 0.0) + series["value"]
+    return {
+        cache: counts["hit"] / (counts["hit"] + counts["miss"]) if counts["hit"] + counts["miss"] else 0.0
+        for cache, counts in totals.items()
+    }
+
+
+def hedging_summary() -> Dict[str, Any]:
+    """Hedge rate, how often the hedge won, and observed p99 latencies
+
+    primary_p99_seconds only covers answers the primary returned; how long a
+    cancelled primary would have taken is unknown, so no improvement is claimed.
+    """
+    counts = {s["labels"]["result"]: s["value"] for s in HEDGE_REQUESTS.snapshot()}
+    calls = sum(counts.values())
+    hedged = sum(counts.get(result, 0.0) for result in ("primary", "hedge", "failed"))
+    return {
+        "calls": calls,
+        "hedged": hedged,
+        "hedge_rate": hedged / calls if calls else 0.0,
+        "hedge_win_rate": counts.get("hedge", 0.0) / hedged if hedged else 0.0,
+        "p99_seconds": HEDGE_SECONDS.quantile(0.99, path="hedged"),
+        "primary_p99_seconds": HEDGE_SECONDS.quantile(0.99, path="primary")
+    }
+
+
+def metrics_report() -> Dict[str, Any]:
+    """Every metric plus derived cache hit ratios and hedging figures, for JSON dumps"""
+    return {"metrics": REGISTRY.snapshot(), "cache_hit_ratio": cache_hit_ratios(), "hedging": hedging_summary()}
@@ -0,0 +1,320 @@
+"""
+Async, pooled OpenAI chat backend
+One long-lived httpx client (HTTP keep-alive) shared by every caller, a global
+concurrency limit, per-call timeouts and retries with jittered backoff
+"""
+import asyncio
+import json
+import os
+import queue
+import random
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-4o-mini"
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# How often a blocking complete() checks whether its caller gave up
+CANCEL_POLL_SECONDS = 0.05
+
+
+class OpenAIBackendError(Exception):
+    """Raised when a chat completion fails after all retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _stream_delta(line: str) -> Optional[str]:
+    """Content of one server-sent event line of a streamed completion (None for keep-alives and [DONE])"""
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if not data or data == "[DONE]":
+        return None
+    try:
+        choices = json.loads(data)["choices"]
+        return (choices[0].get("delta") or {}).get("content") if choices else None
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+        raise OpenAIBackendError(f"Malformed stream chunk: {e}", 200)
+
+
+class OpenAIChatBackend:
+    """Chat completions over a single pooled connection, usable from sync and async code
+
+    All requests run on a private event loop thread, so one httpx.AsyncClient
+    and one semaphore bound concurrency across threads, Streamlit reruns and
+    FastAPI routes alike. Point base_url at a local stub server for tests.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model: str = DEFAULT_MODEL,
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0
+    ):
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY")
+        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.requests_sent = 0
+        self.retries = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="openai-backend", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Only called on the backend loop, so no locking is needed
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # "Full jitter": spreads retries from many callers instead of synchronising them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _complete(self, payload: Dict[str, Any], timeout: float) -> str:
+        client = self._get_client()
+        last_error: Optional[OpenAIBackendError] = None
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self._semaphore:
+                try:
+                    self.requests_sent += 1
+                    response = await asyncio.wait_for(
+                        client.post("/chat/completions", json=payload, timeout=timeout),
+                        timeout
+                    )
+                except (asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError) as e:
+                    last_error = OpenAIBackendError(f"{type(e).__name__}: {e}")
+                else:
+                    if response.status_code == 200:
+                        try:
+                            return response.json()["choices"][0]["message"]["content"].strip()
+                        except (ValueError, KeyError, IndexError, TypeError) as e:
+                            raise OpenAIBackendError(f"Malformed completion response: {e}", 200)
+                    last_error = OpenAIBackendError(
+                        f"HTTP {response.status_code}: {response.text[:200]}",
+                        response.status_code
+                    )
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        raise last_error
+                    retry_after = response.headers.get("retry-after")
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        raise last_error
+
+    async def _stream(self, payload: Dict[str, Any], timeout: float, emit: Callable[[str], None]):
+        """Send each content delta to emit; retried like _complete until the first delta arrives
+
+        timeout bounds the wait for the response and then for each chunk, not the whole stream.
+        """
+        client = self._get_client()
+        last_error: Optional[OpenAIBackendError] = None
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            started = False
+            async with self._semaphore:
+                try:
+                    self.requests_sent += 1
+                    async with client.stream("POST", "/chat/completions", json=payload, timeout=timeout) as response:
+                        if response.status_code == 200:
+                            async for line in response.aiter_lines():
+                                text = _stream_delta(line)
+                                if text:
+                                    started = True
+                                    emit(text)
+                            return
+                        body = (await response.aread()).decode("utf-8", errors="replace")
+                        last_error = OpenAIBackendError(
+                            f"HTTP {response.status_code}: {body[:200]}",
+                            response.status_code
+                        )
+                        if response.status_code not in RETRY_STATUS_CODES:
+                            raise last_error
+                        retry_after = response.headers.get("retry-after")
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    # Text already handed out cannot be taken back, so a broken stream is not retried
+                    if started:
+                        raise OpenAIBackendError(f"Stream interrupted: {type(e).__name__}: {e}")
+                    last_error = OpenAIBackendError(f"{type(e).__name__}: {e}")
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        raise last_error
+
+    def _payload(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        if not self.api_key:
+            raise OpenAIBackendError("OPENAI_API_KEY is not set")
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+    async def acomplete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None
+    ) -> str:
+        """Async chat completion; safe to await from any event loop"""
+        payload = self._payload(messages, temperature, max_tokens)
+        future = asyncio.run_coroutine_threadsafe(
+            self._complete(payload, timeout or self.timeout),
+            self._ensure_loop()
+        )
+        return await asyncio.wrap_future(future)
+
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+        cancelled: Optional[Callable[[], bool]] = None
+    ) -> str:
+        """Blocking chat completion for synchronous callers
+
+        When cancelled() becomes true the in-flight request is aborted and
+        OpenAIBackendError is raised.
+        """
+        payload = self._payload(messages, temperature, max_tokens)
+        future = asyncio.run_coroutine_threadsafe(
+            self._complete(payload, timeout or self.timeout),
+            self._ensure_loop()
+        )
+        if cancelled is None:
+            return future.result()
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+        while not done.wait(CANCEL_POLL_SECONDS):
+            if cancelled():
+                future.cancel()
+                raise OpenAIBackendError("Request cancelled")
+        return future.result()
+
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+        cancelled: Optional[Callable[[], bool]] = None
+    ) -> Iterator[str]:
+        """Blocking iterator over a streamed chat completion's text deltas
+
+        Shares the pooled client, concurrency limit and retries with
+        complete(). Closing the iterator early, or cancelled() becoming
+        true, aborts the request.
+        """
+        payload = dict(self._payload(messages, temperature, max_tokens), stream=True)
+        chunks: "queue.Queue[Optional[str]]" = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(payload, timeout or self.timeout, chunks.put),
+            self._ensure_loop()
+        )
+        future.add_done_callback(lambda _: chunks.put(None))
+        try:
+            while True:
+                if cancelled is not None and cancelled():
+                    raise OpenAIBackendError("Request cancelled")
+                try:
+                    text = chunks.get(timeout=CANCEL_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if text is None:
+                    break
+                yield text
+            future.result()
+        finally:
+            future.cancel()
+
+    def close(self):
+        """Close the pooled client and stop the backend loop"""
+        with self._lock:
+            if self._loop is None:
+                return
+            if self._client is not None:
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+                self._client = None
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+
+_backend: Optional[OpenAIChatBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_openai_backend() -> OpenAIChatBackend:
+    """Process-wide backend configured from the environment
+
+    OPENAI_API_KEY / OPENAI_BASE_URL, plus TRIPCRAFT_OPENAI_CONCURRENCY,
+    TRIPCRAFT_OPENAI_TIMEOUT and TRIPCRAFT_OPENAI_RETRIES.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = OpenAIChatBackend(
+                    max_concurrency=int(os.getenv("TRIPCRAFT_OPENAI_CONCURRENCY", "8")),
+                    timeout=float(os.getenv("TRIPCRAFT_OPENAI_TIMEOUT", "30")),
+                    max_retries=int(os.getenv("TRIPCRAFT_OPENAI_RETRIES", "3"))
+                )
+    return _backend
@@ -0,0 +1,94 @@
+"""
+Prefix KV-cache for the local model
+The static TripCraft system prompt is encoded once per model load and its
+past_key_values reused, so each request only prefills its own suffix
+"""
+import copy
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+
+class PrefixKVCache:
+    """Caches past_key_values for a fixed set of prompt prefixes
+
+    Prompts that do not start with a registered prefix are left alone. The
+    cache is rebuilt automatically if a different model object is passed in.
+    """
+
+    def __init__(self, prefixes: Sequence[str] = ()):
+        self.prefixes = [p for p in prefixes if p]
+        self.hits = 0
+        self.misses = 0
+        # Prompts whose tokens at the prefix boundary differ from the cached prefix's
+        self.boundary_misses = 0
+        self.build_seconds = 0.0
+        self._entries: Dict[str, tuple] = {}
+        self._model_id: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def match(self, prompt: str) -> Optional[str]:
+        """Longest registered prefix that the prompt starts with"""
+        candidates = [p for p in self.prefixes if prompt.startswith(p)]
+        return max(candidates, key=len) if candidates else None
+
+    def get(self, model, tokenizer, prefix: str) -> tuple:
+        """(prefix_ids, past_key_values) for a prefix, encoding it on first use"""
+        with self._lock:
+            if self._model_id != id(model):
+                self._entries.clear()
+                self._model_id = id(model)
+
+            entry = self._entries.get(prefix)
+            if entry is None:
+                import torch
+
+                start = time.perf_counter()
+                prefix_ids = tokenizer(prefix, return_tensors="pt").input_ids.to(model.device)
+                with torch.inference_mode():
+                    past_key_values = model(input_ids=prefix_ids, use_cache=True).past_key_values
+                self.build_seconds += time.perf_counter() - start
+
+                entry = (prefix_ids, past_key_values)
+                self._entries[prefix] = entry
+            return entry
+
+    def prepare(self, model, tokenizer, prompt: str) -> Optional[Dict[str, Any]]:
+        """Build model.generate() inputs that reuse the cached prefix
+
+        Returns None when the prompt has no registered prefix; the caller
+        should then tokenize the prompt as usual. The whole prompt is
+        tokenized, and the cache is only reused when its first tokens are the
+        cached prefix ids: a sentencepiece tokenizer may add or merge a "▁" at
+        the boundary, so prefix and suffix tokenized apart can differ from the
+        prompt tokenized whole. When they differ, inputs without the cache
+        are returned.
+        """
+        import torch
+
+        prefix = self.match(prompt)
+        if prefix is None:
+            self.misses += 1
+            return None
+
+        prefix_ids, past_key_values = self.get(model, tokenizer, prefix)
+        input_ids = tokenizer(prompt, return_tensors="pt").input_ids.to(model.device)
+        length = prefix_ids.shape[-1]
+        if input_ids.shape[-1] <= length or not torch.equal(input_ids[:, :length], prefix_ids):
+            self.misses += 1
+            self.boundary_misses += 1
+            return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+        self.hits += 1
+
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            # generate() appends to the cache in place, so every call gets its own copy
+            "past_key_values": copy.deepcopy(past_key_values)
+        }
+
+    def clear(self):
+        """Drop cached entries (e.g. after swapping the model)"""
+        with self._lock:
+            self._entries.clear()
+            self._model_id = None
@@ -0,0 +1,58 @@
+"""
+Structured progress events for planning runs
+Each workflow step reports node_started and node_finished (with its duration
+and, for steps that consult a cache, whether it was a hit) so the UIs, run.py
+and the backend can show what a plan is waiting on
+"""
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import NODE_SECONDS
+
+
+def node_started(node: str) -> Dict[str, Any]:
+    return {"event": "node_started", "node": node}
+
+
+def node_finished(
+    node: str,
+    duration: float,
+    cache_hit: Optional[bool] = None,
+    error: Optional[str] = None
+) -> Dict[str, Any]:
+    """cache_hit is None for steps without a cache; error is set when the step raised
+
+    Every step reports through here, so this also feeds the node latency histogram.
+    """
+    NODE_SECONDS.observe(duration, node=node, outcome="error" if error else "ok")
+    return {
+        "event": "node_finished",
+        "node": node,
+        "duration": round(duration, 4),
+        "cache_hit": cache_hit,
+        "error": error
+    }
+
+
+def timed_call(func: Callable, *args) -> Tuple[Any, float]:
+    """func(*args) and its wall time in seconds, e.g. for a step submitted to a pool"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def is_progress_event(event: Dict[str, Any]) -> bool:
+    return event.get("event") in ("node_started", "node_finished")
+
+
+def format_progress(event: Dict[str, Any]) -> str:
+    """One status line for a progress event"""
+    node = event["node"]
+    if event["event"] == "node_started":
+        return f"▶️  {node} started"
+    if event.get("error"):
+        return f"❌ {node} failed after {event['duration']:.2f}s: {event['error']}"
+    suffix = ""
+    if event.get("cache_hit") is not None:
+        suffix = " (cache hit)" if event["cache_hit"] else " (cache miss)"
+    return f"✅ {node} finished in {event['duration']:.2f}s{suffix}"
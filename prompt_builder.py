@@ -0,0 +1,201 @@
+"""
+Token-budgeted itinerary prompts
+Counts tokens with the tokenizer of the model that will serve the request, packs
+destination context up to a token budget and reports the prompt size
+"""
+import math
+import os
+import sys
+import threading
+from importlib.util import find_spec
+from typing import Any, Callable, Dict, List, Optional
+
+from tripcraft_config import build_itinerary_prompt, prompt_version, ITINERARY_PROMPT_PREFIXES
+
+DEFAULT_SCHEMA_VARIANT = os.getenv("TRIPCRAFT_PROMPT_SCHEMA", "full")
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("TRIPCRAFT_CONTEXT_TOKENS", "192"))
+LOCAL_TOKENIZER = os.getenv("TRIPCRAFT_TOKENIZER", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+CHARS_PER_TOKEN = 4
+# A truncated snippet shorter than this is dropped rather than squeezed in
+MIN_SNIPPET_TOKENS = 16
+
+
+class TokenCounter:
+    """Counts and truncates text in tokens of one tokenizer
+
+    Without encode/decode it estimates ~4 characters per token.
+    """
+
+    def __init__(
+        self,
+        name: str = "approx",
+        encode: Optional[Callable[[str], List[int]]] = None,
+        decode: Optional[Callable[[List[int]], str]] = None
+    ):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+    def count(self, text: str) -> int:
+        if self.encode is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(self.encode(text))
+
+    __call__ = count
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest leading part of text within max_tokens, cut back to a word boundary"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encode is None:
+            cut = text[:max_tokens * CHARS_PER_TOKEN]
+        else:
+            cut = self.decode(self.encode(text)[:max_tokens])
+        space = cut.rstrip().rfind(" ")
+        return (cut[:space] if space > 0 else cut).rstrip(" ,;:")
+
+
+def hf_token_counter(tokenizer, name: str) -> TokenCounter:
+    return TokenCounter(
+        name,
+        encode=lambda text: tokenizer(text, add_special_tokens=False).input_ids,
+        decode=lambda ids: tokenizer.decode(ids, skip_special_tokens=True)
+    )
+
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+# Set once no cached tokenizer was found, so the lookup is not repeated for every prompt
+_cached_tokenizer_missing = False
+
+# Backends with canned output (the router's mock, workflow_simple's llm_mock):
+# a character estimate is all they need, without importing transformers
+ESTIMATED_BACKENDS = {"mock", "llm_mock"}
+
+
+def _loaded_tokenizer():
+    """The local model's tokenizer once llm has loaded it (never triggers a load)"""
+    return getattr(getattr(sys.modules.get("llm"), "provider", None), "tokenizer", None)
+
+
+def _local_counter() -> TokenCounter:
+    global _cached_tokenizer_missing
+    loaded = _loaded_tokenizer()
+    if loaded is not None:
+        return hf_token_counter(loaded, sys.modules["llm"].provider.model_name)
+
+    if not _cached_tokenizer_missing and find_spec("transformers") is not None:
+        try:
+            from transformers import AutoTokenizer
+
+            # Never download just to count tokens; use the cached tokenizer or estimate
+            tokenizer = AutoTokenizer.from_pretrained(LOCAL_TOKENIZER, local_files_only=True)
+            return hf_token_counter(tokenizer, LOCAL_TOKENIZER)
+        except Exception:
+            pass
+    _cached_tokenizer_missing = True
+    return TokenCounter()
+
+
+def _openai_counter() -> TokenCounter:
+    try:
+        import tiktoken
+    except ImportError:
+        return TokenCounter()
+    encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+    return TokenCounter("tiktoken/" + encoding.name, encode=encoding.encode, decode=encoding.decode)
+
+
+def active_token_counter(backend: Optional[str] = None, degraded: bool = False) -> TokenCounter:
+    """Token counter for the backend that will serve the prompt (a router backend name)
+
+    OpenAI uses tiktoken when installed; mock and other degraded backends use
+    the character estimate; everything else uses the local model's tokenizer
+    if it is loaded or in the Hugging Face cache, or the estimate until the
+    model loads.
+    """
+    if degraded or backend in ESTIMATED_BACKENDS:
+        kind = "approx"
+    else:
+        kind = "openai" if backend == "openai" else "local"
+    with _counters_lock:
+        counter = _counters.get(kind)
+        if counter is None or (kind == "local" and counter.encode is None and _loaded_tokenizer() is not None):
+            if kind == "approx":
+                counter = TokenCounter()
+            else:
+                counter = _openai_counter() if kind == "openai" else _local_counter()
+            _counters[kind] = counter
+        return counter
+
+
+def pack_context(destination_info: str, max_tokens: int, counter: TokenCounter) -> Dict[str, Any]:
+    """Whole snippets (blank-line separated) in order until max_tokens, then a truncated one"""
+    snippets = [s.strip() for s in (destination_info or "").split("\n\n") if s.strip()]
+    packed: List[str] = []
+    truncated = False
+
+    for snippet in snippets:
+        candidate = "\n\n".join(packed + [snippet])
+        if counter.count(candidate) <= max_tokens:
+            packed.append(snippet)
+            continue
+        truncated = True
+        remaining = max_tokens - counter.count("\n\n".join(packed + [""]))
+        if remaining >= MIN_SNIPPET_TOKENS:
+            cut = counter.truncate(snippet, remaining)
+            if cut:
+                packed.append(cut + "…")
+        break
+
+    text = "\n\n".join(packed)
+    # The ellipsis can tip a snippet over the budget; trim once more if so
+    if counter.count(text) > max_tokens:
+        text = counter.truncate(text, max_tokens)
+    return {"text": text, "tokens": counter.count(text), "truncated": truncated}
+
+
+def build_budgeted_itinerary_prompt(
+    preferences: Dict[str, Any],
+    destination_info: str,
+    num_days: int,
+    schema_variant: Optional[str] = None,
+    context_tokens: Optional[int] = None,
+    counter: Optional[TokenCounter] = None
+) -> Dict[str, Any]:
+    """build_itinerary_prompt with packed context and a token report
+
+    Returns a dict with the prompt, the packed context (reuse it for per-day
+    prompts), a prompt_version for cache keys and prompt_stats.
+
+    Args:
+        schema_variant: "full" or "compact" (default TRIPCRAFT_PROMPT_SCHEMA)
+        context_tokens: Budget for destination context (default TRIPCRAFT_CONTEXT_TOKENS)
+        counter: TokenCounter to measure with (default: the local model's)
+    """
+    schema_variant = schema_variant or DEFAULT_SCHEMA_VARIANT
+    if schema_variant not in ITINERARY_PROMPT_PREFIXES:
+        raise ValueError(f"Unknown schema variant '{schema_variant}'. Choose from: {', '.join(ITINERARY_PROMPT_PREFIXES)}")
+    context_tokens = DEFAULT_CONTEXT_TOKENS if context_tokens is None else context_tokens
+    counter = counter or active_token_counter()
+
+    context = pack_context(destination_info, context_tokens, counter)
+    prompt = build_itinerary_prompt(preferences, context["text"], num_days, schema_variant=schema_variant)
+
+    return {
+        "prompt": prompt,
+        "context": context["text"],
+        # The packed context depends on the budget, so it is part of the version
+        "prompt_version": f"{prompt_version(schema_variant)}-ctx{context_tokens}",
+        "prompt_stats": {
+            "prompt_tokens": counter.count(prompt),
+            "system_tokens": counter.count(ITINERARY_PROMPT_PREFIXES[schema_variant]),
+            "context_tokens": context["tokens"],
+            "context_budget": context_tokens,
+            "context_truncated": context["truncated"],
+            "schema_variant": schema_variant,
+            "tokenizer": counter.name
+        }
+    }
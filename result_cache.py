@@ -0,0 +1,211 @@
+"""
+Two-tier result cache: in-memory LRU with TTL in front of a SQLite file
+Used to skip LLM generations for itinerary requests that were already answered
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from metrics import CACHE_REQUESTS
+from tripcraft_config import load_env
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "tripcraft", "results.sqlite3")
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 256
+
+
+class ResultCache:
+    """JSON-serialisable values keyed by string, with hit/miss counters
+
+    Args:
+        path: SQLite file for the persistent tier, or None for memory only
+        table: Table name, so several caches can share one file
+        ttl_seconds: Entries older than this are treated as missing in both tiers
+        max_entries: Size of the in-memory LRU tier
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        table: str = "results",
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table}")
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️  Persistent cache unavailable ({path}): {e}")
+                self._conn = None
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value, or None on a miss"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    CACHE_REQUESTS.inc(cache=self.table, result="hit")
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.disk_hits += 1
+                    CACHE_REQUESTS.inc(cache=self.table, result="hit")
+                    return value
+
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache=self.table, result="miss")
+            return None
+
+    def set(self, key: str, value: Any):
+        """Store a value in both tiers"""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, value, created_at)
+            self.writes += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), created_at)
+                )
+                self._conn.commit()
+
+    def _remember(self, key: str, value: Any, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """Delete expired rows from the persistent tier; returns how many"""
+        with self._lock:
+            for key in [k for k, (_, created) in self._memory.items() if self._expired(created)]:
+                del self._memory[key]
+            if self._conn is None:
+                return 0
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute(f"DELETE FROM {self.table}")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "entries_in_memory": len(self._memory),
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+
+def _normalise_text(value: Any) -> str:
+    return " ".join(str(value).split()).lower()
+
+
+def normalise_preferences(preferences: Dict[str, Any]) -> Dict[str, Any]:
+    """Canonical form of the preferences that affect generation"""
+    interests = preferences.get("interests", [])
+    if isinstance(interests, str):
+        interests = interests.split(",")
+    budget = preferences.get("budget")
+    try:
+        budget = round(float(budget), 2)
+    except (TypeError, ValueError):
+        budget = _normalise_text(budget) if budget is not None else None
+
+    return {
+        "destination": _normalise_text(preferences.get("destination", "")),
+        "dates": _normalise_text(preferences.get("dates", "")),
+        "budget": budget,
+        "interests": sorted({_normalise_text(i) for i in interests if str(i).strip()})
+    }
+
+
+def itinerary_cache_key(
+    preferences: Dict[str, Any],
+    destination_info: str,
+    model_version: str,
+    prompt_version: str
+) -> str:
+    """Content hash identifying one itinerary generation"""
+    payload = {
+        "preferences": normalise_preferences(preferences),
+        "destination_info": " ".join((destination_info or "").split()),
+        "model": model_version,
+        "prompt": prompt_version
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+_itinerary_cache: Optional[ResultCache] = None
+_itinerary_cache_lock = threading.Lock()
+
+
+def itinerary_cache() -> ResultCache:
+    """Process-wide cache for generated itineraries, configured from the environment
+
+    TRIPCRAFT_CACHE_PATH: SQLite file (empty string keeps the cache in memory only)
+    TRIPCRAFT_CACHE_TTL: Entry lifetime in seconds
+    TRIPCRAFT_CACHE_SIZE: In-memory LRU capacity
+    """
+    global _itinerary_cache
+    if _itinerary_cache is None:
+        with _itinerary_cache_lock:
+            if _itinerary_cache is None:
+                load_env()
+                _itinerary_cache = ResultCache(
+                    path=os.getenv("TRIPCRAFT_CACHE_PATH", DEFAULT_CACHE_PATH) or None,
+                    table="itineraries",
+                    ttl_seconds=float(os.getenv("TRIPCRAFT_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                    max_entries=int(os.getenv("TRIPCRAFT_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+                )
+    return _itinerary_cache
@@ -1,6 +1,36 @@
 # run.py
-from workflow import app
+"""
+Plan the demo trip, or a batch of trips from JSONL
+
+    python run.py [--run-id ID] [--sla SECONDS] [--metrics metrics.json]
+    python run.py --input prefs.jsonl --output out.jsonl [--workers 8] [--bypass-cache] [--sla SECONDS] [--metrics -]
+
+With --run-id the demo plan is checkpointed under that id; running the same
+command again after a failure resumes after the last completed step.
+
+Batch mode reads one preferences object per line ("-" for stdin/stdout) and
+writes one record per line as each plan finishes, in completion order; use
+"index" (or the input's "id") to match records to inputs. Lines that cannot
+be planned produce records with "status": "error".
+
+--sla gives each plan a time budget: optional steps are skipped or
+shortened when it runs short, and generation falls back to a basic
+itinerary rather than overrun it.
+
+--metrics writes node/LLM/search latencies, token counts, fallback counts
+and cache hit ratios as JSON when planning is done ("-" for stderr).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import time
+
 from helper_func import clean_itinerary, clean_weather
+from progress_events import format_progress
+from metrics import metrics_report
+from tripcraft_config import load_env
 
 preferences = {
     "destination": "Paris",
@@ -8,8 +38,107 @@ preferences = {
     "interests": ["art", "food"],
     "dates": "2025-10-01 to 2025-10-03"
 }
-result = app.invoke({"preferences": preferences})
-result["itinerary"] = clean_itinerary(result["itinerary"])
-result["weather"] = clean_weather(result["weather"])
-print("Itinerary:\n", result["itinerary"])
-print("Weather:\n", result["weather"])
\ No newline at end of file
+
+
+async def plan(preferences, sla_seconds=None):
+    """Plan on the event loop, printing each step as it starts and finishes"""
+    from workflow import astream_progress
+
+    async for event in astream_progress(preferences, sla_seconds=sla_seconds):
+        if event["event"] == "done":
+            return event["result"]
+        print(format_progress(event))
+
+
+def read_jsonl(lines):
+    """Parsed JSON per non-blank line; unparseable lines are passed on as text"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield line
+
+
+def run_batch(args):
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    counts = {"ok": 0, "fallback": 0, "error": 0}
+    start = time.perf_counter()
+    # Status messages from the workflow go to stderr so stdout stays valid JSONL
+    with contextlib.redirect_stdout(sys.stderr):
+        from batch_planner import plan_many
+
+        try:
+            for record in plan_many(
+                read_jsonl(source),
+                workers=args.workers,
+                bypass_cache=args.bypass_cache,
+                sla_seconds=args.sla
+            ):
+                sink.write(json.dumps(record) + "\n")
+                sink.flush()
+                counts[record["status"]] += 1
+        finally:
+            if args.input != "-":
+                source.close()
+            if args.output != "-":
+                sink.close()
+
+    print(
+        f"✅ Planned {sum(counts.values())} trips in {time.perf_counter() - start:.1f}s: "
+        f"{counts['ok']} ok, {counts['fallback']} fallback, {counts['error']} failed",
+        file=sys.stderr
+    )
+    return 1 if counts["error"] else 0
+
+
+def dump_metrics(path):
+    if not path:
+        return
+    report = json.dumps(metrics_report(), indent=2)
+    if path == "-":
+        print(report, file=sys.stderr)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+def main():
+    load_env()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="JSONL file of preferences, or - for stdin")
+    parser.add_argument("--output", default="-", help="JSONL file for results (default stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="plans in flight at once (default TRIPCRAFT_BATCH_WORKERS or 8)")
+    parser.add_argument("--bypass-cache", action="store_true", help="regenerate cached itineraries")
+    parser.add_argument("--run-id", help="checkpoint the demo plan under this id so a rerun resumes it")
+    parser.add_argument("--sla", type=float, default=None, help="time budget per plan in seconds (default TRIPCRAFT_PLAN_SLA, 0 for none)")
+    parser.add_argument("--metrics", help="write planning metrics as JSON to this file, or - for stderr")
+    args = parser.parse_args()
+
+    if args.input:
+        status = run_batch(args)
+        dump_metrics(args.metrics)
+        sys.exit(status)
+
+    if args.run_id:
+        from workflow import aplan_run
+        result = asyncio.run(aplan_run(
+            preferences,
+            run_id=args.run_id,
+            bypass_cache=args.bypass_cache,
+            sla_seconds=args.sla
+        ))
+    else:
+        result = asyncio.run(plan(preferences, args.sla))
+    result["itinerary"] = clean_itinerary(result["itinerary"])
+    result["weather"] = clean_weather(result["weather"])
+    print("Itinerary:\n", result["itinerary"])
+    print("Weather:\n", result["weather"])
+    dump_metrics(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Persistent checkpoints for LangGraph workflow runs
+Each run id is a LangGraph thread whose checkpoints live in a local SQLite
+file, so a run that failed or was killed resumes from its last completed node.
+Runs untouched for longer than the TTL are garbage-collected.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "tripcraft", "checkpoints.sqlite3")
+DEFAULT_CHECKPOINT_TTL_SECONDS = 7 * 24 * 60 * 60
+# At most one garbage collection per interval from maybe_gc()
+GC_INTERVAL_SECONDS = 60 * 60
+
+
+class RunCheckpointer(SqliteSaver):
+    """SqliteSaver that also serves ainvoke/astream and tracks runs for GC
+
+    SqliteSaver is sync-only; the async methods here run its sync
+    counterparts in a worker thread (the connection is shared under its lock).
+
+    Args:
+        path: SQLite file, or ":memory:"
+        ttl_seconds: Runs not updated for this long are removed by gc()
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, ttl_seconds: float = DEFAULT_CHECKPOINT_TTL_SECONDS):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        super().__init__(sqlite3.connect(path, check_same_thread=False))
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._last_gc = 0.0
+        with self.cursor() as cur:
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS runs "
+                "(run_id TEXT PRIMARY KEY, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        now = time.time()
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO runs (run_id, created_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (str(config["configurable"]["thread_id"]), now, now)
+            )
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM runs WHERE run_id = ?", (str(thread_id),))
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator[Any]:
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def run_ids(self) -> List[str]:
+        """Known runs, most recently updated first"""
+        with self.cursor(transaction=False) as cur:
+            return [row[0] for row in cur.execute("SELECT run_id FROM runs ORDER BY updated_at DESC")]
+
+    def gc(self, max_age_seconds: Optional[float] = None) -> int:
+        """Delete runs not updated within max_age_seconds (default: the TTL); returns how many"""
+        max_age = self.ttl_seconds if max_age_seconds is None else max_age_seconds
+        with self.cursor(transaction=False) as cur:
+            stale = [row[0] for row in cur.execute(
+                "SELECT run_id FROM runs WHERE updated_at < ?", (time.time() - max_age,)
+            )]
+        for run_id in stale:
+            self.delete_thread(run_id)
+        self._last_gc = time.time()
+        return len(stale)
+
+    def maybe_gc(self) -> int:
+        """gc() unless one ran within the last GC_INTERVAL_SECONDS"""
+        if time.time() - self._last_gc < GC_INTERVAL_SECONDS:
+            return 0
+        return self.gc()
+
+
+_checkpointer: Optional[RunCheckpointer] = None
+_checkpointer_lock = threading.Lock()
+
+
+def run_checkpointer() -> RunCheckpointer:
+    """Process-wide checkpointer, configured from the environment
+
+    TRIPCRAFT_CHECKPOINT_PATH: SQLite file (empty string keeps checkpoints in memory)
+    TRIPCRAFT_CHECKPOINT_TTL: Seconds an unfinished or finished run is kept
+    """
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = RunCheckpointer(
+                    path=os.getenv("TRIPCRAFT_CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH) or ":memory:",
+                    ttl_seconds=float(os.getenv("TRIPCRAFT_CHECKPOINT_TTL", DEFAULT_CHECKPOINT_TTL_SECONDS))
+                )
+    return _checkpointer
@@ -0,0 +1,197 @@
+"""
+Compiled JSON schema validation for TripCraft documents
+compile_schema turns a schema into nested checks once, so validating an
+itinerary walks the data without interpreting the schema again. Supports the
+keywords TripCraft's schemas use: type, required, properties, items, enum and
+format "date" (YYYY-MM-DD).
+"""
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}\Z")
+_MISSING = object()
+_PYTHON_TYPES = {
+    "string": (str,),
+    "object": (dict,),
+    "array": (list,),
+    "boolean": (bool,),
+    "null": (type(None),),
+    "integer": (int,),
+    "number": (int, float),
+}
+_JSON_NAMES = {str: "string", dict: "object", list: "array", bool: "boolean", type(None): "null", int: "integer", float: "number"}
+
+# A compiled check returns None for a valid value, else (path, message)
+# pairs with paths relative to the value. Paths are only built on failure.
+Problems = Optional[List[Tuple[tuple, str]]]
+Check = Callable[[Any], Problems]
+
+
+class SchemaError:
+    """One validation failure: where in the document and what is wrong"""
+    __slots__ = ("path", "message")
+
+    def __init__(self, path: Tuple[Any, ...], message: str):
+        self.path = path
+        self.message = message
+
+    @property
+    def location(self) -> str:
+        """The path as text, e.g. itinerary.daily_plans[0].activities[2].start_time"""
+        text = ""
+        for part in self.path:
+            text += f"[{part}]" if isinstance(part, int) else (f".{part}" if text else part)
+        return text or "(root)"
+
+    def __str__(self) -> str:
+        return f"{self.location}: {self.message}"
+
+    def __repr__(self) -> str:
+        return f"SchemaError({self.path!r}, {self.message!r})"
+
+
+class SchemaValidationError(ValueError):
+    """Raised by CompiledSchema.validate with every failure found"""
+
+    def __init__(self, errors: List[SchemaError]):
+        self.errors = errors
+        super().__init__(f"Schema validation failed: {summarize_errors(errors, limit=5)}")
+
+
+def summarize_errors(errors: List[SchemaError], limit: int = 3) -> str:
+    """The first few errors on one line, for state errors and logs"""
+    shown = "; ".join(str(error) for error in errors[:limit])
+    return shown + (f" (+{len(errors) - limit} more)" if len(errors) > limit else "")
+
+
+def _json_type(value: Any) -> str:
+    return _JSON_NAMES.get(type(value), type(value).__name__)
+
+
+def _type_test(kinds: List[str]) -> Callable[[Any], bool]:
+    accepted = tuple(t for kind in kinds for t in _PYTHON_TYPES[kind])
+    allow_bool = "boolean" in kinds
+    integer_only = "integer" in kinds and "number" not in kinds
+
+    def test(value):
+        if value.__class__ is bool:
+            return allow_bool
+        if isinstance(value, accepted):
+            return True
+        # 1.0 is an integer in JSON schema
+        return integer_only and isinstance(value, float) and value.is_integer()
+    return test
+
+
+def _fast_types(schema: Dict[str, Any]) -> Optional[tuple]:
+    """Python types that settle a plain {"type": ...} leaf with one isinstance call"""
+    kinds = schema.get("type")
+    if not isinstance(kinds, str) or kinds == "boolean" or set(schema) - {"type"}:
+        return None
+    return _PYTHON_TYPES[kinds]
+
+
+def _object_check(schema: Dict[str, Any]) -> Check:
+    required = tuple(schema.get("required", ()))
+    properties = tuple(
+        (key, _fast_types(sub), _compile(sub)) for key, sub in schema.get("properties", {}).items()
+    )
+
+    def check(value):
+        problems = None
+        for key in required:
+            if key not in value:
+                problems = problems or []
+                problems.append(((key,), "is required"))
+        for key, fast, child in properties:
+            item = value.get(key, _MISSING)
+            if item is _MISSING or (fast is not None and item.__class__ is not bool and isinstance(item, fast)):
+                continue
+            found = child(item)
+            if found:
+                problems = problems or []
+                problems.extend(((key,) + path, message) for path, message in found)
+        return problems
+    return check
+
+
+def _array_check(items: Dict[str, Any]) -> Check:
+    fast = _fast_types(items)
+    child = _compile(items)
+
+    def check(value):
+        problems = None
+        for index, item in enumerate(value):
+            if fast is not None and item.__class__ is not bool and isinstance(item, fast):
+                continue
+            found = child(item)
+            if found:
+                problems = problems or []
+                problems.extend(((index,) + path, message) for path, message in found)
+        return problems
+    return check
+
+
+def _compile(schema: Dict[str, Any]) -> Check:
+    kinds = schema.get("type")
+    if isinstance(kinds, str):
+        kinds = [kinds]
+    type_ok = _type_test(kinds) if kinds else None
+    expected = " or ".join(kinds) if kinds else ""
+
+    # Keyword checks that apply to a value of the right type
+    checks = []
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+        listing = ", ".join(str(option) for option in allowed)
+        checks.append(lambda value: None if value in allowed else [((), f"must be one of {listing}, got {value!r}")])
+    if schema.get("format") == "date":
+        checks.append(
+            lambda value: None if not isinstance(value, str) or _DATE.match(value)
+            else [((), f"expected a YYYY-MM-DD date, got {value!r}")]
+        )
+    if "properties" in schema or "required" in schema:
+        object_check = _object_check(schema)
+        checks.append(lambda value: object_check(value) if isinstance(value, dict) else None)
+    if "items" in schema:
+        array_check = _array_check(schema["items"])
+        checks.append(lambda value: array_check(value) if isinstance(value, list) else None)
+    checks = tuple(checks)
+
+    def check(value):
+        if type_ok is not None and not type_ok(value):
+            return [((), f"expected {expected}, got {_json_type(value)}")]
+        problems = None
+        for keyword_check in checks:
+            found = keyword_check(value)
+            if found:
+                problems = found if problems is None else problems + found
+        return problems
+    return check
+
+
+class CompiledSchema:
+    """A JSON schema compiled to a validator; build once and reuse"""
+    __slots__ = ("schema", "_check")
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.schema = schema
+        self._check = _compile(schema)
+
+    def is_valid(self, data: Any) -> bool:
+        return not self._check(data)
+
+    def errors(self, data: Any) -> List[SchemaError]:
+        """Every failure in data, in document order; empty when valid"""
+        return [SchemaError(path, message) for path, message in self._check(data) or ()]
+
+    def validate(self, data: Any) -> Any:
+        """Return data unchanged, or raise SchemaValidationError listing every failure"""
+        errors = self.errors(data)
+        if errors:
+            raise SchemaValidationError(errors)
+        return data
+
+
+def compile_schema(schema: Dict[str, Any]) -> CompiledSchema:
+    return CompiledSchema(schema)
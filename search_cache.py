@@ -0,0 +1,235 @@
+"""
+Cache for Tavily searches
+Results are keyed on the normalised query parameters and kept per kind of
+search (attractions change slowly, forecasts do not), in memory and in the
+SQLite file of the result cache. Concurrent identical searches share one
+outbound call.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from result_cache import ResultCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from metrics import SEARCH_SECONDS, SEARCH_COALESCED
+from tripcraft_config import load_env
+
+DEFAULT_SEARCH_TTLS = {
+    "attractions": 7 * 24 * 60 * 60,
+    "weather": 3 * 60 * 60,
+}
+
+
+def attractions_query(destination: str, interests) -> str:
+    """Destination search query; interests are sorted so equivalent requests share cache entries"""
+    if isinstance(interests, str):
+        interests = interests.split(",")
+    interests = sorted({str(i).strip().lower() for i in interests if str(i).strip()})
+    query = f"Top attractions and activities in {destination}"
+    return f"{query} for {', '.join(interests)}" if interests else query
+
+
+def weather_query(destination: str, dates: str) -> str:
+    return f"Weather forecast for {destination} on {dates}"
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers arriving meanwhile get its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """(result, shared); shared is True when another caller's call produced it
+
+        An exception from fn is raised in every caller waiting on it. A caller
+        waiting on another's call waits at most timeout seconds, then raises
+        TimeoutError; the call itself carries on for the others.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            try:
+                return future.result(timeout=timeout), True
+            except FuturesTimeoutError:
+                raise TimeoutError(f"Gave up after {timeout:g}s waiting for the same call in flight") from None
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def search_cache_key(kind: str, query: str, params: Dict[str, Any]) -> str:
+    """Hash of the search kind, the query (case and whitespace folded) and its parameters"""
+    payload = {
+        "kind": kind,
+        "query": " ".join(query.split()).lower(),
+        "params": params
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """Caching, coalescing front for any client with a Tavily-style search(query=..., **params)
+
+    Args:
+        path: SQLite file for the persistent tier, or None for memory only
+        ttls: Seconds to keep results per kind; 0 disables caching for a kind
+            (identical in-flight searches are still coalesced)
+        max_entries: In-memory LRU capacity per kind
+        max_concurrency: Outbound searches allowed at once (None for no limit)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_concurrency: Optional[int] = None
+    ):
+        self.ttls = dict(DEFAULT_SEARCH_TTLS, **(ttls or {}))
+        self._caches = {
+            kind: ResultCache(path=path, table=f"search_{kind}", ttl_seconds=ttl, max_entries=max_entries)
+            for kind, ttl in self.ttls.items()
+            if ttl > 0
+        }
+        self._flight = SingleFlight()
+        self._limit = threading.BoundedSemaphore(max_concurrency) if max_concurrency else nullcontext()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.searches = 0
+        self.coalesced = 0
+
+    def search(self, client, query: str, kind: str = "attractions", timeout: Optional[float] = None, **params) -> Dict[str, Any]:
+        """client.search(query=query, **params), answered from the cache when possible
+
+        timeout is passed on to the client, and bounds the wait when an
+        identical search is already in flight; it is not part of the cache key.
+        """
+        if kind not in self.ttls:
+            raise ValueError(f"Unknown search kind '{kind}'. Choose from: {', '.join(self.ttls)}")
+        key = search_cache_key(kind, query, params)
+        cache = self._caches.get(kind)
+
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            self._local.hit = True
+            return cached
+
+        timeouts = {} if timeout is None else {"timeout": timeout}
+
+        def fetch() -> Dict[str, Any]:
+            with self._stats_lock:
+                self.searches += 1
+            with self._limit:
+                start = time.perf_counter()
+                try:
+                    result = client.search(query=query, **params, **timeouts)
+                except Exception:
+                    SEARCH_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="error")
+                    raise
+                SEARCH_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="ok")
+            # Empty answers are often transient; only keep useful ones
+            if cache and result.get("results"):
+                cache.set(key, result)
+            return result
+
+        result, shared = self._flight.do(key, fetch, timeout=timeout)
+        if shared:
+            with self._stats_lock:
+                self.coalesced += 1
+            SEARCH_COALESCED.inc(kind=kind)
+        self._local.hit = shared
+        return result
+
+    def last_hit(self) -> Optional[bool]:
+        """Whether this thread's last search was answered without its own outbound call"""
+        return getattr(self._local, "hit", None)
+
+    def clear(self):
+        for cache in self._caches.values():
+            cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Outbound searches, coalesced waits and per-kind cache counters"""
+        return {
+            "searches": self.searches,
+            "coalesced": self.coalesced,
+            "caches": {kind: cache.stats() for kind, cache in self._caches.items()}
+        }
+
+
+_search_cache: Optional[SearchCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def search_cache() -> SearchCache:
+    """Process-wide search cache, configured from the environment
+
+    TRIPCRAFT_CACHE_PATH: SQLite file shared with the itinerary cache (empty for memory only)
+    TRIPCRAFT_SEARCH_TTL_ATTRACTIONS: Lifetime of destination searches in seconds
+    TRIPCRAFT_SEARCH_TTL_WEATHER: Lifetime of weather searches in seconds
+    TRIPCRAFT_SEARCH_CONCURRENCY: Outbound Tavily searches allowed at once (0 for no limit)
+    """
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                load_env()
+                _search_cache = SearchCache(
+                    path=os.getenv("TRIPCRAFT_CACHE_PATH", DEFAULT_CACHE_PATH) or None,
+                    ttls={
+                        "attractions": float(os.getenv("TRIPCRAFT_SEARCH_TTL_ATTRACTIONS", DEFAULT_SEARCH_TTLS["attractions"])),
+                        "weather": float(os.getenv("TRIPCRAFT_SEARCH_TTL_WEATHER", DEFAULT_SEARCH_TTLS["weather"]))
+                    },
+                    max_entries=int(os.getenv("TRIPCRAFT_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                    max_concurrency=int(os.getenv("TRIPCRAFT_SEARCH_CONCURRENCY", "8")) or None
+                )
+    return _search_cache
+
+
+_tavily = None
+_tavily_resolved = False
+_tavily_lock = threading.Lock()
+
+
+def tavily_client():
+    """Process-wide Tavily client, or None when search is unavailable
+
+    Built on first use from TAVILY_API_KEY, so importing a workflow does not
+    import tavily (and its HTTP stack) or touch the network.
+    """
+    global _tavily, _tavily_resolved
+    if not _tavily_resolved:
+        with _tavily_lock:
+            if not _tavily_resolved:
+                load_env()
+                key = os.getenv("TAVILY_API_KEY")
+                if not key:
+                    print("⚠️  Tavily API key not set (search disabled)")
+                else:
+                    try:
+                        from tavily import TavilyClient
+                        _tavily = TavilyClient(api_key=key)
+                        print("✅ Tavily search enabled")
+                    except Exception as e:
+                        print(f"⚠️  Tavily unavailable: {e}")
+                _tavily_resolved = True
+    return _tavily
@@ -2,10 +2,14 @@ import pytest
 from fastapi.testclient import TestClient
 import sys
 import os
+import json
+from types import SimpleNamespace
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from backend.api_server import app
+from llm_mock import generate_mock_itinerary
+from tripcraft_config import build_itinerary_prompt
 
 client = TestClient(app)
 
@@ -95,6 +99,81 @@ class TestApplyEdit:
             assert "diff" in data
 
 
+class FakeSupabase:
+    """Async stand-in for the Supabase client holding one stored itinerary"""
+
+    def __init__(self, itinerary_id, content):
+        self.rows = {"itineraries": {itinerary_id: {"id": itinerary_id, "content": content}}}
+        self.writes = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db, self.table, self.row_id, self.write = db, table, None, None
+
+    def select(self, *args):
+        return self
+
+    def maybeSingle(self):
+        return self
+
+    def eq(self, column, value):
+        self.row_id = value
+        return self
+
+    def update(self, data):
+        self.write = ("update", data)
+        return self
+
+    def insert(self, data):
+        self.write = ("insert", data)
+        return self
+
+    async def execute(self):
+        if self.write is not None:
+            self.db.writes.append((self.table,) + self.write)
+            return SimpleNamespace(data=[self.write[1]])
+        return SimpleNamespace(data=self.db.rows.get(self.table, {}).get(self.row_id))
+
+
+class TestApplyEditValidation:
+    @pytest.fixture
+    def db(self, monkeypatch):
+        import backend.routes.chat as chat
+
+        preferences = {"destination": "Paris", "budget": 900, "interests": ["art"], "dates": "2025-05-01 to 2025-05-03"}
+        content = json.loads(generate_mock_itinerary(build_itinerary_prompt(preferences, "info", 3)))["itinerary"]
+        db = FakeSupabase("trip-1", content)
+        monkeypatch.setattr(chat, "supabase", db)
+        return db
+
+    def apply(self, command):
+        return client.post("/api/chat/apply-edit", json={"itinerary_id": "trip-1", "edit_command": command})
+
+    def test_valid_edit_is_applied(self, db):
+        response = self.apply({"action": "add", "target": "activity", "poi": "Eiffel Tower", "day": 2, "time_slot": "morning"})
+
+        assert response.status_code == 200
+        added = response.json()["updated_itinerary"]["daily_plans"][1]["activities"][-1]
+        assert (added["title"], added["start_time"], added["end_time"]) == ("Eiffel Tower", "09:00", "11:00")
+        assert [write[:2] for write in db.writes] == [("itineraries", "update"), ("itinerary_edits", "insert")]
+
+    @pytest.mark.parametrize("command", [
+        {"action": "update", "target": "budget", "amount": "a lot"},
+        # Day 9 does not exist, so the edit would add a day without a date
+        {"action": "add", "target": "activity", "poi": "Louvre", "day": 9}
+    ])
+    def test_schema_breaking_edit_is_rejected(self, db, command):
+        response = self.apply(command)
+
+        assert response.status_code == 422
+        assert response.json()["detail"]["errors"]
+        assert db.writes == []
+
+
 class TestUndoEdit:
     def test_undo_nonexistent_change(self):
         response = client.post(
@@ -0,0 +1,158 @@
+import pytest
+import sys
+import os
+import asyncio
+import json
+import subprocess
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_planner import aplan_many, plan_many, batch_preferences
+
+
+class FakePlanner:
+    """Async stand-in for app.ainvoke that records how many plans overlap"""
+
+    def __init__(self, delay: float = 0.05, fail_for=()):
+        self.delay = delay
+        self.fail_for = set(fail_for)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, state, config=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            destination = state["preferences"]["destination"]
+            # Later destinations finish first, so completion order differs from input order
+            await asyncio.sleep(self.delay / (1 + len(destination)))
+            if destination in self.fail_for:
+                raise RuntimeError(f"cannot plan {destination}")
+            errors = ["fallback used"] if destination == "Fallbackville" else []
+            return {"itinerary_json": {"destination": destination}, "weather": "sunny", "errors": errors, "prompt_stats": {}}
+        finally:
+            self.in_flight -= 1
+
+
+def trips(count: int):
+    return [{"id": f"trip-{i}", "destination": "X" * (i + 1)} for i in range(count)]
+
+
+class TestBatchPreferences:
+    def test_requires_a_destination(self):
+        with pytest.raises(ValueError):
+            batch_preferences({"destination": "  "})
+        with pytest.raises(ValueError):
+            batch_preferences("Lisbon")
+        assert batch_preferences({"destination": "Lisbon"}) == {"destination": "Lisbon"}
+
+
+class TestPlanMany:
+    def test_every_input_gets_a_record(self):
+        planner = FakePlanner()
+        records = list(plan_many(trips(10), workers=3, ainvoke=planner))
+
+        assert sorted(r["index"] for r in records) == list(range(10))
+        assert all(r["status"] == "ok" for r in records)
+        assert {r["id"] for r in records} == {f"trip-{i}" for i in range(10)}
+        assert records[0]["itinerary_json"] == {"destination": "X" * (records[0]["index"] + 1)}
+
+    def test_concurrency_is_bounded(self):
+        planner = FakePlanner()
+        list(plan_many(trips(12), workers=4, ainvoke=planner))
+
+        assert planner.max_in_flight == 4
+
+    def test_records_arrive_in_completion_order(self):
+        records = list(plan_many(trips(4), workers=4, ainvoke=FakePlanner(delay=0.2)))
+
+        assert [r["index"] for r in records] == [3, 2, 1, 0]
+
+    def test_inputs_are_read_lazily(self):
+        consumed = []
+
+        def source():
+            for i, trip in enumerate(trips(100)):
+                consumed.append(i)
+                yield trip
+
+        async def first_record():
+            async for record in aplan_many(source(), workers=5, ainvoke=FakePlanner()):
+                return record
+
+        asyncio.run(first_record())
+        assert len(consumed) <= 6
+
+    def test_failures_become_error_records(self):
+        planner = FakePlanner(fail_for={"Nowhere"})
+        items = [{"destination": "Lisbon"}, {"destination": "Nowhere"}, "not json", {"destination": "Fallbackville"}]
+        records = {r["index"]: r for r in plan_many(items, workers=2, ainvoke=planner)}
+
+        assert records[0]["status"] == "ok"
+        assert records[1]["status"] == "error"
+        assert records[1]["error"] == "RuntimeError: cannot plan Nowhere"
+        assert records[2]["status"] == "error"
+        assert records[2]["input"] == "not json"
+        assert records[3]["status"] == "fallback"
+        assert records[3]["errors"] == ["fallback used"]
+
+    def test_errors_from_the_input_propagate(self):
+        def broken():
+            yield {"destination": "Lisbon"}
+            raise OSError("disk gone")
+
+        with pytest.raises(OSError):
+            list(plan_many(broken(), workers=2, ainvoke=FakePlanner()))
+
+    def test_stopping_early_cancels_the_rest(self):
+        class CountingPlanner(FakePlanner):
+            started = 0
+
+            async def __call__(self, state, config=None):
+                self.started += 1
+                return await super().__call__(state, config)
+
+        planner = CountingPlanner(delay=0.5)
+        for record in plan_many(trips(50), workers=2, ainvoke=planner):
+            break
+
+        deadline = time.monotonic() + 5
+        while any(t.name == "plan-many" for t in threading.enumerate()) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not any(t.name == "plan-many" for t in threading.enumerate())
+        assert planner.in_flight == 0
+        assert planner.started < 50
+
+
+class TestRunBatchMode:
+    def test_jsonl_in_jsonl_out(self, tmp_path):
+        pytest.importorskip("langgraph")
+        pytest.importorskip("tavily")
+        source, output = tmp_path / "prefs.jsonl", tmp_path / "out.jsonl"
+        source.write_text("\n".join([
+            json.dumps({"id": "lisbon", "destination": "Lisbon", "dates": "2025-05-01 to 2025-05-02"}),
+            "{broken",
+            ""
+        ]))
+        env = dict(
+            os.environ,
+            TRIPCRAFT_LLM_BACKENDS="mock",
+            TRIPCRAFT_CACHE_PATH="",
+            TAVILY_API_KEY="",
+            HF_HUB_OFFLINE="1"
+        )
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+        completed = subprocess.run(
+            [sys.executable, "run.py", "--input", str(source), "--output", str(output), "--workers", "2"],
+            cwd=root, env=env, capture_output=True, text=True, timeout=300
+        )
+        records = {r["index"]: r for r in map(json.loads, output.read_text().splitlines())}
+
+        assert completed.returncode == 1
+        assert "Planned 2 trips" in completed.stderr
+        assert records[0]["id"] == "lisbon"
+        assert records[0]["itinerary_json"]["itinerary"]["daily_plans"]
+        assert records[1]["status"] == "error"
@@ -0,0 +1,59 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cpu_profiles import CPU_PROFILES, get_cpu_profile, apply_cpu_profile, physical_cores, profile_model_suffix
+
+
+class TestCPUProfiles:
+    def test_lookup_by_name(self):
+        profile = get_cpu_profile("int8")
+
+        assert profile["name"] == "int8"
+        assert profile["quantize"] is True
+
+    def test_unknown_profile(self):
+        with pytest.raises(ValueError):
+            get_cpu_profile("turbo")
+
+    def test_env_selects_profile(self, monkeypatch):
+        monkeypatch.setenv("TRIPCRAFT_CPU_PROFILE", "tuned")
+        monkeypatch.setenv("TRIPCRAFT_CPU_THREADS", "3")
+
+        profile = get_cpu_profile()
+
+        assert profile["name"] == "tuned"
+        assert profile["threads"] == 3
+
+    def test_every_profile_has_all_settings(self):
+        for profile in CPU_PROFILES.values():
+            assert set(profile) == {"quantize", "compile", "threads", "interop_threads"}
+
+    def test_physical_cores(self):
+        assert 1 <= physical_cores() <= (os.cpu_count() or 1)
+
+    def test_only_quantisation_changes_model_version(self):
+        assert profile_model_suffix(get_cpu_profile("int8")) == "+int8"
+        assert profile_model_suffix(get_cpu_profile("compiled")) == ""
+
+
+class TestApplyProfile:
+    def test_quantises_linear_layers(self):
+        torch = pytest.importorskip("torch")
+        model = torch.nn.Sequential(torch.nn.Linear(8, 8), torch.nn.ReLU(), torch.nn.Linear(8, 2))
+        x = torch.randn(4, 8)
+        expected = model(x)
+
+        model = apply_cpu_profile(model, {"quantize": True, "compile": False, "threads": 1, "interop_threads": None})
+
+        assert type(model[0]) is torch.ao.nn.quantized.dynamic.Linear
+        assert torch.allclose(model(x), expected, atol=0.1)
+
+    def test_default_profile_leaves_model_alone(self):
+        torch = pytest.importorskip("torch")
+        model = torch.nn.Linear(8, 8)
+
+        assert apply_cpu_profile(model, get_cpu_profile("default")) is model
+        assert type(model) is torch.nn.Linear
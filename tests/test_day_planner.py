@@ -0,0 +1,209 @@
+import pytest
+import sys
+import os
+import time
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from day_planner import (
+    build_skeleton,
+    diff_preferences,
+    plan_itinerary_by_day,
+    rebase_skeleton,
+    replan_itinerary_by_day,
+    use_per_day_generation
+)
+from llm_mock import generate_mock_itinerary
+from tripcraft_config import build_itinerary_prompt, validate_itinerary_json, activities_per_day, day_token_budget, itinerary_token_budget
+
+
+PREFERENCES = {
+    "destination": "Paris",
+    "budget": 1000,
+    "interests": ["art", "food"],
+    "dates": "2025-10-01 to 2025-10-05"
+}
+
+
+class TestSkeleton:
+    def test_dates_and_budget(self):
+        skeleton = build_skeleton(PREFERENCES, 5)
+
+        assert [s["date"] for s in skeleton] == [f"2025-10-0{i}" for i in range(1, 6)]
+        assert all(s["daily_budget"] == 200 for s in skeleton)
+
+    def test_mode_selection(self):
+        assert use_per_day_generation(2, "per_day") is True
+        assert use_per_day_generation(10, "single") is False
+
+
+class TestPlanItineraryByDay:
+    def test_merged_itinerary_is_consistent(self):
+        itinerary = plan_itinerary_by_day(PREFERENCES, "info", 5, generate_mock_itinerary)
+
+        assert validate_itinerary_json(itinerary)
+        plans = itinerary["itinerary"]["daily_plans"]
+        assert [p["day"] for p in plans] == [1, 2, 3, 4, 5]
+        assert plans[-1]["date"] == itinerary["itinerary"]["end_date"] == "2025-10-05"
+        assert itinerary["itinerary"]["total_estimated_cost"] == sum(p["estimated_daily_cost"] for p in plans)
+
+    def test_days_run_concurrently(self):
+        def slow(prompt):
+            time.sleep(0.2)
+            return generate_mock_itinerary(prompt)
+
+        start = time.perf_counter()
+        plan_itinerary_by_day(PREFERENCES, "info", 5, slow, max_workers=5)
+
+        assert time.perf_counter() - start < 0.6
+
+    def test_failed_day_uses_fallback(self):
+        def flaky(prompt):
+            if "Plan day 2 " in prompt:
+                return "not json"
+            return generate_mock_itinerary(prompt)
+
+        itinerary = plan_itinerary_by_day(PREFERENCES, "info", 3, flaky)
+
+        plans = itinerary["itinerary"]["daily_plans"]
+        assert len(plans) == 3
+        assert plans[1]["date"] == "2025-10-02"
+        assert any("Day 2" in a for a in itinerary["itinerary"]["assumptions"])
+
+    def test_day_breaking_the_schema_uses_fallback(self):
+        def no_start_time(prompt):
+            day = json.loads(generate_mock_itinerary(prompt))
+            if "Plan day 3 " in prompt:
+                del day["itinerary"]["daily_plans"][0]["activities"][0]["start_time"]
+            return json.dumps(day)
+
+        itinerary = plan_itinerary_by_day(PREFERENCES, "info", 3, no_start_time)
+
+        assert validate_itinerary_json(itinerary)
+        assert any("Day 3" in a and "activities[0].start_time: is required" in a for a in itinerary["itinerary"]["assumptions"])
+
+
+class TestTokenBudget:
+    def test_budget_grows_with_days_and_density(self):
+        assert itinerary_token_budget(2) < itinerary_token_budget(7)
+        assert itinerary_token_budget(3, activities=3) < itinerary_token_budget(3, activities=6)
+        assert day_token_budget(4) < itinerary_token_budget(1, 4)
+
+    def test_long_trip_gets_more_than_the_old_fixed_budget(self):
+        assert itinerary_token_budget(7) > 800
+
+    def test_activity_density(self):
+        assert activities_per_day({"interests": ["food"]}) == 3
+        assert activities_per_day({"interests": ["a", "b", "c", "d", "e", "f"]}) == 6
+        assert activities_per_day({"pace": "Relaxed", "interests": ["a", "b", "c"]}) == 3
+        assert activities_per_day({"activities_per_day": 5}) == 5
+
+
+class TestIncrementalRegeneration:
+    BASE = dict(PREFERENCES, interests=["art", "food", "history"])
+
+    @pytest.fixture
+    def previous(self):
+        return plan_itinerary_by_day(self.BASE, "info", 5, generate_mock_itinerary)
+
+    def replan(self, previous, preferences, num_days=5):
+        prompts = []
+
+        def generate(prompt):
+            prompts.append(prompt)
+            return generate_mock_itinerary(prompt)
+
+        return replan_itinerary_by_day(previous, self.BASE, preferences, "info", num_days, generate), prompts
+
+    def test_diff_ignores_interest_order(self):
+        diff = diff_preferences(self.BASE, dict(self.BASE, interests=["history", "art", "food", "nature"]))
+
+        assert diff == {"changed": ["interests"], "interests_added": ["nature"], "interests_removed": [], "incremental": True}
+        assert not diff_preferences(self.BASE, dict(self.BASE, pace="packed"))["incremental"]
+
+    def test_budget_change_rescales_costs_without_generation(self, previous):
+        updated, prompts = self.replan(previous, dict(self.BASE, budget=1500))
+
+        assert prompts == []
+        assert validate_itinerary_json(updated)
+        old_plans, plans = previous["itinerary"]["daily_plans"], updated["itinerary"]["daily_plans"]
+        assert [p["estimated_daily_cost"] for p in plans] == [300] * 5
+        assert plans[0]["meals"][0]["est_cost"] == round(old_plans[0]["meals"][0]["est_cost"] * 1.5)
+        assert [a["title"] for a in plans[0]["activities"]] == [a["title"] for a in old_plans[0]["activities"]]
+        assert updated["itinerary"]["total_estimated_cost"] == 1500
+
+    def test_added_interest_replans_one_day(self, previous):
+        updated, prompts = self.replan(previous, dict(self.BASE, interests=["art", "food", "history", "nature"]))
+
+        assert len(prompts) == 1 and "nature" in prompts[0]
+        assert updated["itinerary"]["daily_plans"][:4] == previous["itinerary"]["daily_plans"][:4]
+
+    def test_removed_interest_replans_only_its_days(self, previous):
+        skeleton, replan = rebase_skeleton(self.BASE, PREFERENCES, 5, 5)
+        updated, prompts = self.replan(previous, PREFERENCES)
+
+        assert replan == [1, 2, 4]
+        assert all("history" not in slot["theme"] for slot in skeleton)
+        assert len(prompts) == 3
+        assert updated["itinerary"]["daily_plans"][0] == previous["itinerary"]["daily_plans"][0]
+
+    def test_new_dates_move_kept_days(self, previous):
+        updated, prompts = self.replan(previous, dict(self.BASE, dates="2025-11-01 to 2025-11-06"), num_days=6)
+
+        assert len(prompts) == 1 and "Plan day 6 " in prompts[0]
+        plans = updated["itinerary"]["daily_plans"]
+        assert [p["date"] for p in plans] == [f"2025-11-0{i}" for i in range(1, 7)]
+        assert updated["itinerary"]["end_date"] == "2025-11-06"
+
+    def test_other_changes_need_a_full_regeneration(self, previous):
+        assert self.replan(previous, dict(self.BASE, destination="Rome")) == (None, [])
+        assert self.replan({}, dict(self.BASE, budget=1500)) == (None, [])
+
+    def test_single_prompt_trip_budget_change_is_applied_in_place(self):
+        # Trips under PER_DAY_MIN_DAYS come from one prompt, so their days have no skeleton themes
+        base = dict(self.BASE, dates="2025-10-01 to 2025-10-03")
+        previous = json.loads(generate_mock_itinerary(build_itinerary_prompt(base, "info", 3)))
+        prompts = []
+
+        def generate(prompt):
+            prompts.append(prompt)
+            return generate_mock_itinerary(prompt)
+
+        assert not use_per_day_generation(3)
+        updated = replan_itinerary_by_day(previous, base, dict(base, budget=2000), "info", 3, generate)
+
+        assert prompts == []
+        assert validate_itinerary_json(updated)
+        old_plans, plans = previous["itinerary"]["daily_plans"], updated["itinerary"]["daily_plans"]
+        assert [a["title"] for a in plans[0]["activities"]] == [a["title"] for a in old_plans[0]["activities"]]
+        assert plans[0]["estimated_daily_cost"] == round(old_plans[0]["estimated_daily_cost"] * 2)
+        assert "skeleton" not in updated["itinerary"]
+        # Without stored themes an interest change cannot keep days, so the trip is regenerated
+        assert replan_itinerary_by_day(
+            previous, base, dict(base, interests=["art"]), "info", 3, generate
+        ) is None
+
+    def test_two_updates_in_a_row(self, previous):
+        added = dict(self.BASE, interests=["art", "food", "history", "nature"])
+        updated, prompts = self.replan(previous, added)
+        assert len(prompts) == 1
+
+        richer = dict(added, budget=2000)
+        again = replan_itinerary_by_day(updated, added, richer, "info", 5, generate_mock_itinerary)
+
+        assert again["itinerary"]["total_estimated_cost"] == 2000
+        assert again["itinerary"]["skeleton"] == updated["itinerary"]["skeleton"]
+        assert [[a["title"] for a in p["activities"]] for p in again["itinerary"]["daily_plans"]] == \
+            [[a["title"] for a in p["activities"]] for p in updated["itinerary"]["daily_plans"]]
+
+        # Removing the added interest again re-plans only the day that was themed on it
+        prompts = []
+
+        def generate(prompt):
+            prompts.append(prompt)
+            return generate_mock_itinerary(prompt)
+
+        third = replan_itinerary_by_day(again, richer, dict(self.BASE, budget=2000), "info", 5, generate)
+        assert len(prompts) == 1 and "nature" not in prompts[0]
+        assert all("nature" not in day["interests"] for day in third["itinerary"]["skeleton"])
@@ -0,0 +1,153 @@
+import pytest
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from deadlines import (
+    Deadline,
+    DeadlineExceeded,
+    config_deadline,
+    current_deadline,
+    deadline_context,
+    deadline_for,
+    deadline_scope,
+    plan_config
+)
+from llm_backends import BackendRegistry, BackendStats, LLMRouter, LLMBackend
+
+
+class FakeBackend(LLMBackend):
+    def __init__(self, name, delay=0.0):
+        self.name = name
+        self.delay = delay
+        self.calls = 0
+
+    def generate(self, prompt, system_prompt=None, max_new_tokens=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.name
+
+
+class TestDeadline:
+    def test_unbounded_deadline_never_expires(self):
+        deadline = Deadline()
+
+        assert not deadline.bounded
+        assert deadline.allows(1e9)
+        assert deadline.timeout() is None
+        assert deadline.timeout(30) == 30
+
+    def test_bounded_deadline_counts_down(self):
+        deadline = Deadline(0.05)
+
+        assert deadline.allows(0.01) and not deadline.allows(1)
+        assert deadline.timeout(30) <= 0.05
+        time.sleep(0.06)
+        assert deadline.expired()
+        assert deadline.remaining() == 0
+        with pytest.raises(DeadlineExceeded, match="0.05s"):
+            deadline.check()
+
+    def test_sla_defaults_to_the_environment(self, monkeypatch):
+        monkeypatch.setenv("TRIPCRAFT_PLAN_SLA", "20")
+        assert 19 < deadline_for().remaining() <= 20
+        assert not deadline_for(0).bounded
+
+        monkeypatch.delenv("TRIPCRAFT_PLAN_SLA")
+        assert not deadline_for().bounded
+
+    def test_plan_config_carries_the_deadline(self):
+        config = plan_config(5, thread_id="trip-1")
+
+        assert config["configurable"]["thread_id"] == "trip-1"
+        assert config_deadline(config).bounded
+        assert config_deadline(None) is None
+
+
+class TestDeadlineScope:
+    def test_scope_sets_and_restores_the_current_deadline(self):
+        deadline = Deadline(10)
+
+        with deadline_scope(deadline):
+            assert current_deadline() is deadline
+            with deadline_scope(None):
+                assert current_deadline() is deadline
+        assert not current_deadline().bounded
+
+    def test_context_follows_work_into_a_pool(self):
+        deadline = Deadline(10)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            assert pool.submit(deadline_context(deadline).run, current_deadline).result() is deadline
+            assert not pool.submit(current_deadline).result().bounded
+
+
+class TestRouterDeadlines:
+    def test_no_backend_is_tried_after_the_deadline(self):
+        registry = BackendRegistry()
+        backend = registry.register(FakeBackend("first"))
+        router = LLMRouter(registry)
+
+        with deadline_scope(Deadline(0)):
+            with pytest.raises(DeadlineExceeded):
+                router.complete("hi", return_json=False)
+            with pytest.raises(DeadlineExceeded):
+                list(router.stream("hi"))
+        assert backend.calls == 0
+
+    def test_time_left_is_the_latency_budget(self):
+        registry = BackendRegistry()
+        slow, fast = FakeBackend("slow"), FakeBackend("fast")
+        registry.register(slow, BackendStats())
+        registry.register(fast, BackendStats())
+        registry.stats["slow"].record(5.0, ok=True)
+        registry.stats["fast"].record(0.1, ok=True)
+        router = LLMRouter(registry)
+
+        assert router.complete("hi", return_json=False) == "slow"
+        with deadline_scope(Deadline(1)):
+            assert router.complete("hi", return_json=False) == "fast"
+            assert router.expected_latency() == pytest.approx(0.1, abs=0.05)
+        assert router.expected_latency() == pytest.approx(5.0)
+
+    def test_scope_is_per_thread(self):
+        registry = BackendRegistry()
+        backend = registry.register(FakeBackend("only"))
+        router = LLMRouter(registry)
+        results = []
+
+        def other_thread():
+            results.append(router.complete("hi", return_json=False))
+
+        with deadline_scope(Deadline(0)):
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            thread.join()
+
+        assert results == ["only"]
+        assert backend.calls == 1
+
+
+class TestCancellation:
+    def test_cancelled_deadline_is_expired(self):
+        deadline = Deadline()
+        deadline.cancel()
+
+        assert deadline.expired() and deadline.remaining() == 0
+        with pytest.raises(DeadlineExceeded, match="Cancelled"):
+            deadline.check("generation")
+
+    def test_child_cancels_alone_but_follows_its_parent(self):
+        parent = Deadline(10)
+        first, second = parent.child(), parent.child()
+
+        first.cancel()
+        assert first.expired() and not second.expired() and not parent.expired()
+        assert second.remaining() == pytest.approx(parent.remaining(), abs=0.01)
+
+        parent.cancel()
+        assert second.expired()
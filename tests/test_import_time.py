@@ -0,0 +1,57 @@
+import pytest
+import sys
+import os
+import json
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BUDGET_SECONDS = float(os.getenv("TRIPCRAFT_IMPORT_BUDGET_MS", "150")) / 1000
+HEAVY_MODULES = ("langgraph", "tavily", "transformers", "torch", "dotenv")
+
+PROBE = """
+import io, json, sys, time
+from contextlib import redirect_stdout
+out = io.StringIO()
+start = time.perf_counter()
+with redirect_stdout(out):
+    import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules), "output": out.getvalue()}}))
+"""
+
+
+def cold_import(module):
+    env = dict(os.environ, TRIPCRAFT_LLM_BACKENDS="mock")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestColdStart:
+    @pytest.mark.parametrize("module", ["workflow_simple", "workflow"])
+    def test_import_has_no_side_effects(self, module):
+        probe = cold_import(module)
+
+        assert probe["output"] == ""
+        loaded = {name.split(".")[0] for name in probe["modules"]}
+        assert not loaded & set(HEAVY_MODULES)
+
+    def test_simple_workflow_imports_within_budget(self):
+        # Fastest of three, so a busy machine does not fail the budget
+        seconds = min(cold_import("workflow_simple")["seconds"] for _ in range(3))
+
+        assert seconds < BUDGET_SECONDS
+
+    def test_graph_is_compiled_on_first_access(self):
+        pytest.importorskip("langgraph")
+        import workflow
+
+        assert workflow.app is workflow.compiled_app()
+        from workflow import app
+        assert app is workflow.app
+        with pytest.raises(AttributeError):
+            workflow.not_a_workflow_attribute
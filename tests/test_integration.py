@@ -26,13 +26,13 @@ class TestEndToEndFlow:
         from backend.routes.chat import _apply_edit_command
 
         sample_itinerary = {
-            "days": [
+            "daily_plans": [
                 {
-                    "day_number": 1,
+                    "day": 1,
                     "activities": []
                 },
                 {
-                    "day_number": 2,
+                    "day": 2,
                     "activities": []
                 }
             ]
@@ -40,15 +40,15 @@ class TestEndToEndFlow:
 
         updated = _apply_edit_command(sample_itinerary, edit_command)
 
-        assert "days" in updated
+        assert "daily_plans" in updated
 
     def test_add_then_remove_activity(self):
         from backend.routes.chat import _apply_edit_command
 
         itinerary = {
-            "days": [
+            "daily_plans": [
                 {
-                    "day_number": 1,
+                    "day": 1,
                     "activities": []
                 }
             ]
@@ -63,7 +63,7 @@ class TestEndToEndFlow:
 
         itinerary = _apply_edit_command(itinerary, add_command)
 
-        assert len(itinerary["days"][0]["activities"]) == 1
+        assert len(itinerary["daily_plans"][0]["activities"]) == 1
 
         remove_command = {
             "action": "remove",
@@ -74,14 +74,14 @@ class TestEndToEndFlow:
 
         itinerary = _apply_edit_command(itinerary, remove_command)
 
-        assert len(itinerary["days"][0]["activities"]) == 0
+        assert len(itinerary["daily_plans"][0]["activities"]) == 0
 
     def test_update_budget(self):
         from backend.routes.chat import _apply_edit_command
 
         itinerary = {
-            "total_budget": 1000,
-            "days": []
+            "total_estimated_cost": 1000,
+            "daily_plans": []
         }
 
         budget_command = {
@@ -92,7 +92,7 @@ class TestEndToEndFlow:
 
         updated = _apply_edit_command(itinerary, budget_command)
 
-        assert updated["total_budget"] == 2000
+        assert updated["total_estimated_cost"] == 2000
 
 
 class TestUndoFlow:
@@ -100,11 +100,11 @@ class TestUndoFlow:
         from backend.routes.chat import _apply_edit_command
 
         original = {
-            "days": [
+            "daily_plans": [
                 {
-                    "day_number": 1,
+                    "day": 1,
                     "activities": [
-                        {"name": "Original Activity"}
+                        {"title": "Original Activity"}
                     ]
                 }
             ]
@@ -121,11 +121,11 @@ class TestUndoFlow:
 
         modified = _apply_edit_command(original, add_command)
 
-        assert len(modified["days"][0]["activities"]) == 2
+        assert len(modified["daily_plans"][0]["activities"]) == 2
 
         reverted = before_snapshot
 
-        assert len(reverted["days"][0]["activities"]) == 1
+        assert len(reverted["daily_plans"][0]["activities"]) == 1
 
 
 class TestDiffComputation:
@@ -178,8 +178,8 @@ class TestEdgeCases:
         from backend.routes.chat import _apply_edit_command
 
         itinerary = {
-            "days": [
-                {"day_number": 1, "activities": []}
+            "daily_plans": [
+                {"day": 1, "activities": []}
             ]
         }
 
@@ -192,17 +192,17 @@ class TestEdgeCases:
 
         updated = _apply_edit_command(itinerary, add_command)
 
-        assert "days" in updated
+        assert "daily_plans" in updated
 
     def test_remove_nonexistent_activity(self):
         from backend.routes.chat import _apply_edit_command
 
         itinerary = {
-            "days": [
+            "daily_plans": [
                 {
-                    "day_number": 1,
+                    "day": 1,
                     "activities": [
-                        {"name": "Activity 1"}
+                        {"title": "Activity 1"}
                     ]
                 }
             ]
@@ -217,7 +217,7 @@ class TestEdgeCases:
 
         updated = _apply_edit_command(itinerary, remove_command)
 
-        assert len(updated["days"][0]["activities"]) == 1
+        assert len(updated["daily_plans"][0]["activities"]) == 1
 
     def test_empty_itinerary(self):
         from backend.routes.chat import _apply_edit_command
@@ -0,0 +1,113 @@
+import pytest
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from itinerary_model import Activity, DailyPlan, Itinerary, Meal, Transportation, decode, encode
+from llm_mock import generate_mock_itinerary
+from tripcraft_config import build_itinerary_prompt, validate_itinerary_json
+
+
+def mock_itinerary(num_days=3):
+    preferences = {
+        "destination": "Lisbon",
+        "budget": 900,
+        "interests": ["food", "art"],
+        "dates": f"2025-05-01 to 2025-05-{num_days:02d}"
+    }
+    return json.loads(generate_mock_itinerary(build_itinerary_prompt(preferences, "info", num_days)))
+
+
+class TestItineraryModel:
+    def test_typed_access(self):
+        itinerary = Itinerary.from_json(mock_itinerary())
+
+        assert itinerary.destination == "Lisbon"
+        day = itinerary.daily_plans[0]
+        assert isinstance(day, DailyPlan) and day.date == "2025-05-01"
+        assert isinstance(day.activities[0], Activity)
+        assert isinstance(day.activities[0].transportation, Transportation)
+        assert day.activities[0].transportation.from_ == "hotel"
+        assert not hasattr(day, "__dict__")
+
+    def test_round_trip_is_lossless(self):
+        document = mock_itinerary()
+        document["trace_id"] = "abc"
+        document["itinerary"]["timezone"] = None
+        plans = document["itinerary"]["daily_plans"]
+        plans[0]["activities"][0]["rating"] = 4.5
+        plans[0]["meals"].append("Street food")
+        plans[1]["activities"][0]["transportation"] = "walk"
+
+        itinerary = Itinerary.from_json(document)
+
+        assert itinerary.to_json() == document
+        assert itinerary.timezone is None and itinerary.extra == {"timezone": None}
+        assert itinerary.daily_plans[0].activities[0].extra == {"rating": 4.5}
+
+    def test_stored_content_form(self):
+        document = mock_itinerary()
+        content = document["itinerary"]
+
+        itinerary = Itinerary.from_content(content)
+
+        assert itinerary.human_readable is None
+        assert itinerary.to_content() == content
+        with pytest.raises(ValueError):
+            Itinerary.from_json(content)
+
+    def test_built_in_code_is_valid_tripcraft_json(self):
+        itinerary = Itinerary(
+            destination="Porto",
+            start_date="2025-06-01",
+            end_date="2025-06-01",
+            total_estimated_cost=80,
+            human_readable="A day in Porto",
+            daily_plans=[DailyPlan(day=1, date="2025-06-01", activities=[
+                Activity(start_time="10:00", end_time="12:00", title="Livraria Lello",
+                         transportation=Transportation(from_="hotel", mode="walking", est_cost=0))
+            ])]
+        )
+
+        assert validate_itinerary_json(itinerary.to_json())
+        assert itinerary.to_json()["itinerary"]["daily_plans"][0]["activities"][0]["transportation"]["from"] == "hotel"
+        with pytest.raises(TypeError):
+            Activity(name="Livraria Lello")
+
+
+class TestCodec:
+    @pytest.mark.parametrize("binary", [False, True])
+    def test_encode_decode(self, binary):
+        if binary:
+            pytest.importorskip("msgpack")
+        document = mock_itinerary(5)
+        document["itinerary"]["daily_plans"][2]["meals"].append({"time": None})
+
+        data = encode(Itinerary.from_json(document), binary=binary)
+
+        assert data[:1] == (b"M" if binary else b"J")
+        assert decode(data).to_json() == document
+        assert decode(data) == Itinerary.from_json(document)
+        assert len(data) < len(json.dumps(document, separators=(",", ":")))
+
+    def test_short_rows_decode_missing_fields_as_none(self):
+        # A row written before fields were appended to Meal.FIELDS
+        meal = Meal.from_row([None, "12:00", "Bifana"])
+
+        assert meal.to_json() == {"time": "12:00", "suggestion": "Bifana"}
+        assert meal.est_cost is None and meal.dietary_notes is None and meal.extra is None
+        assert Meal.from_row([]).to_json() == {}
+
+    def test_extra_keeps_its_place(self):
+        meal = Meal.from_json({"time": "12:00", "suggestion": "Bifana", "rating": 5})
+
+        assert meal.to_row() == [{"rating": 5}, "12:00", "Bifana", None, None]
+        assert Meal.from_row(meal.to_row()[:3]).to_json() == {"time": "12:00", "suggestion": "Bifana", "rating": 5}
+
+    def test_rejects_unknown_data(self):
+        with pytest.raises(ValueError):
+            decode(b"{}")
+        with pytest.raises(ValueError):
+            decode(b"J" + json.dumps([99, [], None, None]).encode())
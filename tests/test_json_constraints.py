@@ -0,0 +1,68 @@
+import pytest
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from json_constraints import SchemaJSONAutomaton
+from llm_mock import generate_mock_itinerary
+from tripcraft_config import ITINERARY_JSON_SCHEMA
+
+
+def mock_itinerary():
+    return json.loads(generate_mock_itinerary("Destination: Paris\n2025-10-01 to 2025-10-03\nBudget: $900"))
+
+
+def accepts(text, schema=ITINERARY_JSON_SCHEMA):
+    automaton = SchemaJSONAutomaton(schema)
+    return automaton.feed(text) and automaton.complete
+
+
+class TestSchemaJSONAutomaton:
+    def test_accepts_valid_itinerary(self):
+        data = mock_itinerary()
+
+        assert accepts(json.dumps(data, indent=2))
+        assert accepts(json.dumps(data))
+
+    def test_rejects_missing_required_key(self):
+        data = mock_itinerary()
+        del data["itinerary"]["daily_plans"][0]["date"]
+
+        assert not accepts(json.dumps(data))
+
+    def test_rejects_wrong_types(self):
+        data = mock_itinerary()
+        data["itinerary"]["daily_plans"][0]["day"] = "one"
+        assert not accepts(json.dumps(data))
+
+        data = mock_itinerary()
+        data["itinerary"]["total_estimated_cost"] = "900 USD"
+        assert not accepts(json.dumps(data))
+
+    def test_prefix_stays_valid_while_incomplete(self):
+        text = json.dumps(mock_itinerary())
+        automaton = SchemaJSONAutomaton(ITINERARY_JSON_SCHEMA)
+
+        assert automaton.feed(text[:len(text) // 2])
+        assert automaton.complete is False
+
+    def test_rejects_text_outside_json(self):
+        assert not SchemaJSONAutomaton(ITINERARY_JSON_SCHEMA).feed("```json\n{")
+        assert not SchemaJSONAutomaton({}).feed('{"a": 1} extra')
+
+    def test_json_syntax_rules(self):
+        assert accepts('{"a": [1, -2.5e3, true, null, "x\\u00e9\\n"], "b": {}}', {})
+        assert not SchemaJSONAutomaton({}).feed('{"a": 01')
+        assert not SchemaJSONAutomaton({}).feed('{"a": "raw\nnewline"')
+        assert not SchemaJSONAutomaton({}).feed('{"a": 1, "a"')
+
+    def test_copy_is_independent(self):
+        automaton = SchemaJSONAutomaton({})
+        automaton.feed('{"a": ')
+        probe = automaton.copy()
+
+        assert probe.feed("1}")
+        assert automaton.complete is False
+        assert automaton.feed('"x"}')
@@ -0,0 +1,189 @@
+import pytest
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from json_stream import DailyPlanStreamParser, JSONObjectTracker, JSONStoppingCriteria, extract_json
+from tripcraft_config import extract_json_from_text
+
+
+def sample_itinerary(num_days=3):
+    return {
+        "itinerary": {
+            "destination": "Paris {France}",
+            "start_date": "2025-10-01",
+            "end_date": "2025-10-03",
+            "daily_plans": [
+                {
+                    "day": day,
+                    "date": f"2025-10-0{day}",
+                    "summary": 'Quotes \\" and } braces { inside "strings"',
+                    "activities": [
+                        {
+                            "start_time": "09:00",
+                            "end_time": "12:00",
+                            "title": "Louvre",
+                            "transportation": {"mode": "metro", "est_cost": 2}
+                        }
+                    ],
+                    "meals": []
+                }
+                for day in range(1, num_days + 1)
+            ],
+            "total_estimated_cost": 900
+        },
+        "human_readable": "Three days in Paris"
+    }
+
+
+class TestDailyPlanStreamParser:
+    def test_emits_each_day_when_closed(self):
+        data = sample_itinerary(3)
+        text = json.dumps(data, indent=2)
+        parser = DailyPlanStreamParser()
+
+        emitted_at = []
+        for i in range(0, len(text), 5):
+            for day in parser.feed(text[i:i + 5]):
+                emitted_at.append((i, day["day"]))
+
+        assert [day for _, day in emitted_at] == [1, 2, 3]
+        assert emitted_at[0][0] < len(text) // 2
+        assert parser.days == data["itinerary"]["daily_plans"]
+        assert parser.root_closed is True
+
+    def test_ignores_code_fence_and_preamble(self):
+        text = "Sure! Here is your plan:\n```json\n" + json.dumps(sample_itinerary(2)) + "\n```"
+        parser = DailyPlanStreamParser()
+
+        days = parser.feed(text)
+
+        assert [d["day"] for d in days] == [1, 2]
+        assert parser.text == text
+
+    def test_single_character_chunks(self):
+        text = json.dumps(sample_itinerary(2))
+        parser = DailyPlanStreamParser()
+
+        for ch in text:
+            parser.feed(ch)
+
+        assert len(parser.days) == 2
+
+    def test_truncated_stream_keeps_completed_days(self):
+        text = json.dumps(sample_itinerary(3))
+        cut = text.index('"day": 3')
+        parser = DailyPlanStreamParser()
+
+        parser.feed(text[:cut])
+
+        assert [d["day"] for d in parser.days] == [1, 2]
+        assert parser.root_closed is False
+
+
+class TestJSONObjectTracker:
+    def test_completes_when_root_closes(self):
+        text = "Here you go:\n```json\n" + json.dumps(sample_itinerary(2)) + "\n```"
+        tracker = JSONObjectTracker()
+
+        closed_at = next(i for i, ch in enumerate(text) if tracker.feed(ch))
+
+        assert text[closed_at] == "}"
+        assert json.loads(text[text.index("{"):closed_at + 1]) == sample_itinerary(2)
+
+    def test_braces_in_strings_are_ignored(self):
+        tracker = JSONObjectTracker()
+
+        assert tracker.feed('{"note": "use } and \\" carefully", "x": [1, {"y": "{"}]') is False
+        assert tracker.feed("}") is True
+
+    def test_unfinished_object(self):
+        tracker = JSONObjectTracker()
+
+        assert tracker.feed(json.dumps(sample_itinerary(1))[:-1]) is False
+
+
+class TestJSONStoppingCriteria:
+    def test_stops_each_row_independently(self):
+        torch = pytest.importorskip("torch")
+        token_texts = ["{", "}", '"a"', ":", "1", " "]
+        criteria = JSONStoppingCriteria(token_texts)
+        # Row 0 generates {"a":1} and stops; row 1 is still inside its object
+        steps = [[0, 0], [2, 2], [3, 3], [4, 4], [1, 0]]
+        input_ids = torch.tensor([[5, 5], [5, 5]])
+
+        results = []
+        for step in steps:
+            input_ids = torch.cat([input_ids, torch.tensor(step).unsqueeze(1)], dim=1)
+            results.append(criteria(input_ids, None).tolist())
+
+        assert results[:4] == [[False, False]] * 4
+        assert results[4] == [True, False]
+
+
+class TestExtractJSON:
+    def test_first_object_amid_chatter_and_fences(self):
+        data = sample_itinerary(2)
+        text = "Sure! Here it is:\n```json\n" + json.dumps(data, indent=2) + "\n```\nAnything else? {maybe}"
+
+        extraction = extract_json(text)
+
+        assert extraction.value == data
+        assert not extraction.repaired
+        assert text[extraction.start] == "{" and text[extraction.end - 1] == "}"
+
+    def test_top_level_array_only_at_the_start(self):
+        assert extract_json("```json\n[1, 2]\n```").value == [1, 2]
+        assert extract_json('See [1] for details: {"a": 1}').value == {"a": 1}
+
+    def test_cut_off_output_drops_the_partial_element(self):
+        data = sample_itinerary(3)
+        text = json.dumps(data)
+        cut = text.index('"title": "Louvre"', text.index('"day": 3')) + len('"title": "Lou')
+
+        extraction = extract_json(text[:cut])
+
+        # Days 1 and 2 are whole; day 3 was still being written, so it is dropped
+        assert extraction.value["itinerary"]["daily_plans"] == data["itinerary"]["daily_plans"][:2]
+        assert extraction.value["itinerary"]["destination"] == "Paris {France}"
+        dropped, closed = extraction.repairs
+        assert dropped.startswith('dropped partial element \'{"day": 3,')
+        assert closed == "closed ]}}"
+
+    def test_cut_off_day_keeps_its_complete_activities(self):
+        day = sample_itinerary(1)["itinerary"]["daily_plans"][0]
+        day["activities"].append(dict(day["activities"][0], title="Orsay"))
+        text = json.dumps(day)
+
+        extraction = extract_json(text[:text.index("Orsay")])
+
+        assert [a["title"] for a in extraction.value["activities"]] == ["Louvre"]
+        assert extraction.repaired
+
+    def test_every_prefix_can_be_repaired(self):
+        text = json.dumps(sample_itinerary(2), indent=1)
+
+        for cut in range(1, len(text)):
+            assert isinstance(extract_json(text[:cut]).value, dict)
+
+    def test_escaped_quotes_and_braces_in_strings(self):
+        text = '{"a": "x \\" } ] {", "b": [1, 2'
+
+        extraction = extract_json(text)
+
+        assert extraction.value == {"a": 'x " } ] {', "b": [1]}
+
+    def test_errors(self):
+        with pytest.raises(ValueError, match="No JSON"):
+            extract_json("no json here")
+        with pytest.raises(ValueError, match="Invalid"):
+            extract_json("{\'single\': \'quotes\'}")
+        with pytest.raises(ValueError, match="cut off"):
+            extract_json('{"a": [1, 2', repair=False)
+
+    def test_extract_json_from_text_repairs_on_request(self):
+        with pytest.raises(ValueError):
+            extract_json_from_text('{"a": [1, 2')
+        assert extract_json_from_text('{"a": [1, 2', repair=True) == {"a": [1]}
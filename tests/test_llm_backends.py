@@ -0,0 +1,317 @@
+import pytest
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm_backends import (
+    LLMBackend,
+    MockBackend,
+    BackendStats,
+    BackendRegistry,
+    LLMRouter,
+    NoBackendAvailableError,
+    default_registry
+)
+
+
+class FakeBackend(LLMBackend):
+    def __init__(self, name, reply='{"ok": true}', delay=0.0, fail=False, is_available=True):
+        self.name = name
+        self.reply = reply
+        self.delay = delay
+        self.fail = fail
+        self.is_available = is_available
+        self.calls = 0
+
+    def available(self):
+        return self.is_available
+
+    def generate(self, prompt, system_prompt=None, max_new_tokens=None):
+        self.calls += 1
+        self.max_new_tokens = max_new_tokens
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return self.reply
+
+
+def make_router(*backends, **kwargs):
+    registry = BackendRegistry()
+    for backend in backends:
+        registry.register(backend, BackendStats(max_consecutive_failures=2, cooldown_seconds=60))
+    return LLMRouter(registry, **kwargs)
+
+
+class TestLLMRouter:
+    def test_uses_first_backend(self):
+        first, second = FakeBackend("first", "one"), FakeBackend("second", "two")
+        router = make_router(first, second)
+
+        assert router.complete("hi", return_json=False) == "one"
+        assert second.calls == 0
+        assert router.model_version == "first"
+
+    def test_fails_over_and_records_errors(self):
+        broken, backup = FakeBackend("broken", fail=True), FakeBackend("backup", "two")
+        router = make_router(broken, backup)
+
+        assert router.complete("hi", return_json=False) == "two"
+        stats = router.stats()
+        assert stats["broken"]["failures"] == 1
+        assert stats["backup"]["calls"] == 1
+
+    def test_json_reformatting(self):
+        router = make_router(FakeBackend("json", 'Here you go: {"a": 1}'))
+
+        assert router.complete("hi") == '{\n  "a": 1\n}'
+
+    def test_skips_unavailable_backends(self):
+        missing, present = FakeBackend("missing", is_available=False), FakeBackend("present", "ok")
+        router = make_router(missing, present)
+
+        assert router.complete("hi", return_json=False) == "ok"
+        assert missing.calls == 0
+
+    def test_circuit_opens_after_repeated_failures(self):
+        broken, backup = FakeBackend("broken", fail=True), FakeBackend("backup", "ok")
+        router = make_router(broken, backup)
+
+        for _ in range(3):
+            router.complete("hi", return_json=False)
+
+        assert broken.calls == 2
+        assert router.stats()["broken"]["healthy"] is False
+        assert router.primary() is backup
+
+    def test_latency_budget_prefers_fast_backend(self):
+        slow, fast = FakeBackend("slow", "slow", delay=0.05), FakeBackend("fast", "fast")
+        router = make_router(slow, fast)
+        router.complete("warm up", return_json=False)
+        router.registry.stats["fast"].record(0.001, ok=True)
+
+        assert router.complete("hi", return_json=False, latency_budget=0.01) == "fast"
+        assert router.complete("hi", return_json=False) == "slow"
+
+    def test_degraded_backends_go_last(self):
+        mock, real = MockBackend(), FakeBackend("real", "real")
+        router = make_router(mock, real)
+
+        assert router.primary() is real
+
+    def test_all_backends_failing(self):
+        router = make_router(FakeBackend("a", fail=True), FakeBackend("b", fail=True))
+
+        with pytest.raises(NoBackendAvailableError) as error:
+            router.complete("hi")
+        assert set(error.value.errors) == {"a", "b"}
+
+    def test_stream_fails_over_before_first_chunk(self):
+        router = make_router(FakeBackend("broken", fail=True), MockBackend(chunk_size=8))
+
+        chunks = list(router.stream("Destination: Lisbon"))
+
+        assert len(chunks) > 1
+        assert "Lisbon" in "".join(chunks)
+
+    def test_stream_error_after_first_chunk_propagates(self):
+        class Flaky(FakeBackend):
+            def stream(self, prompt, system_prompt=None, max_new_tokens=None):
+                yield "partial"
+                raise RuntimeError("connection dropped")
+
+        router = make_router(Flaky("flaky"), FakeBackend("backup"))
+        chunks = []
+
+        with pytest.raises(RuntimeError):
+            for chunk in router.stream("hi"):
+                chunks.append(chunk)
+        assert chunks == ["partial"]
+
+
+class TestConcurrencyLimits:
+    def test_backend_limit_queues_calls(self):
+        import threading
+
+        class CountingBackend(FakeBackend):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.active = 0
+                self.max_active = 0
+                self.lock = threading.Lock()
+
+            def generate(self, prompt, system_prompt=None, max_new_tokens=None):
+                with self.lock:
+                    self.active += 1
+                    self.max_active = max(self.max_active, self.active)
+                try:
+                    return super().generate(prompt, system_prompt, max_new_tokens)
+                finally:
+                    with self.lock:
+                        self.active -= 1
+
+        backend = CountingBackend("slow", delay=0.05)
+        registry = BackendRegistry()
+        registry.register(backend, max_concurrency=2)
+        router = LLMRouter(registry)
+
+        threads = [threading.Thread(target=router.complete, args=("hi",)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert backend.calls == 6
+        assert backend.max_active == 2
+        # Waiting for a slot is not counted as backend latency
+        assert registry.stats["slow"].latency() < 0.1
+
+    def test_env_limits(self, monkeypatch):
+        monkeypatch.setenv("TRIPCRAFT_LLM_BACKENDS", "mock")
+        monkeypatch.setenv("TRIPCRAFT_BACKEND_CONCURRENCY", "mock=3")
+        registry = default_registry()
+
+        assert registry.slot("mock")._value == 3
+
+    def test_invalid_env_limits(self, monkeypatch):
+        monkeypatch.setenv("TRIPCRAFT_LLM_BACKENDS", "mock")
+        monkeypatch.setenv("TRIPCRAFT_BACKEND_CONCURRENCY", "mock=lots")
+        with pytest.raises(ValueError):
+            default_registry()
+
+
+class TestDefaultRegistry:
+    def test_env_order(self, monkeypatch):
+        monkeypatch.setenv("TRIPCRAFT_LLM_BACKENDS", "mock, openai")
+        monkeypatch.delenv("TRIPCRAFT_LOCAL_LLM_URL", raising=False)
+
+        assert default_registry().names() == ["mock", "openai"]
+
+    def test_local_server_needs_url(self, monkeypatch):
+        monkeypatch.delenv("TRIPCRAFT_LLM_BACKENDS", raising=False)
+        monkeypatch.delenv("TRIPCRAFT_LOCAL_LLM_URL", raising=False)
+        assert "local_server" not in default_registry().names()
+
+        monkeypatch.setenv("TRIPCRAFT_LOCAL_LLM_URL", "http://127.0.0.1:8080/v1")
+        registry = default_registry()
+        assert registry.names() == ["openai", "local_server", "transformers", "mock"]
+        assert registry.get("local_server").available() is True
+
+    def test_unknown_backend(self, monkeypatch):
+        monkeypatch.setenv("TRIPCRAFT_LLM_BACKENDS", "mock,gpt5")
+
+        with pytest.raises(ValueError):
+            default_registry()
+
+
+class TestLastServed:
+    def test_reports_backend_after_failover(self):
+        broken, backup = FakeBackend("broken", fail=True), FakeBackend("backup")
+        router = make_router(broken, backup)
+
+        assert router.last_served() is None
+        router.complete("hi")
+        assert router.last_served() is backup
+
+        list(router.stream("hi"))
+        assert router.last_served() is backup
+
+
+class SlowBackend(FakeBackend):
+    """Sleeps in small steps so a cancelled (losing) hedge stops early"""
+
+    def generate(self, prompt, system_prompt=None, max_new_tokens=None):
+        from deadlines import current_deadline
+
+        self.calls += 1
+        self.cancelled = False
+        deadline = current_deadline()
+        end = time.monotonic() + self.delay
+        while time.monotonic() < end:
+            if deadline.cancelled:
+                self.cancelled = True
+                raise RuntimeError("cancelled")
+            time.sleep(0.01)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return self.reply
+
+
+class TestHedging:
+    def test_fast_primary_is_not_hedged(self):
+        primary, hedge = SlowBackend("primary", "one", delay=0.01), SlowBackend("hedge", "two")
+        router = make_router(primary, hedge, hedge_after=0.5)
+
+        assert router.complete("hi", return_json=False) == "one"
+        assert hedge.calls == 0
+
+    def test_slow_primary_loses_to_the_hedge_and_is_cancelled(self):
+        primary = SlowBackend("primary", "one", delay=2.0)
+        hedge = SlowBackend("hedge", "two", delay=0.05)
+        router = make_router(primary, hedge, hedge_after=0.1)
+
+        start = time.perf_counter()
+        assert router.complete("hi", return_json=False) == "two"
+        assert time.perf_counter() - start < 0.5
+        assert router.last_served() is hedge
+
+        time.sleep(0.1)
+        assert primary.cancelled
+        # Losing a race is not a failure of the backend
+        assert router.stats()["primary"]["failures"] == 0
+
+    def test_only_acceptable_answers_win(self):
+        primary = SlowBackend("primary", '{"valid": true}', delay=0.3)
+        hedge = SlowBackend("hedge", '{"valid": false}', delay=0.01)
+        router = make_router(primary, hedge, hedge_after=0.05)
+
+        output = router.complete("hi", accept=lambda text: '"valid": true' in text)
+
+        assert '"valid": true' in output
+        assert hedge.calls == 1
+
+    def test_failed_primary_starts_the_hedge_immediately(self):
+        primary = SlowBackend("primary", fail=True, delay=0.01)
+        hedge = SlowBackend("hedge", "two", delay=0.01)
+        router = make_router(primary, hedge, hedge_after=5)
+
+        start = time.perf_counter()
+        assert router.complete("hi", return_json=False) == "two"
+        assert time.perf_counter() - start < 1
+
+    def test_falls_back_to_remaining_backends(self):
+        primary, hedge = SlowBackend("primary", fail=True), SlowBackend("hedge", fail=True)
+        router = make_router(primary, hedge, MockBackend(), hedge_after=0.05)
+
+        assert "itinerary" in router.complete("3-day trip to Rome")
+
+    def test_degraded_backends_are_not_used_as_hedges(self):
+        primary = SlowBackend("primary", "one", delay=0.2)
+        router = make_router(primary, MockBackend(), hedge_after=0.01)
+
+        assert router.complete("hi", return_json=False) == "one"
+
+    def test_hedge_rate_is_reported(self):
+        from metrics import hedging_summary
+
+        before = hedging_summary()
+        router = make_router(SlowBackend("primary", "one", delay=0.3), SlowBackend("hedge", "two"), hedge_after=0.05)
+        router.complete("hi", return_json=False)
+        after = hedging_summary()
+
+        assert after["hedged"] == before["hedged"] + 1
+        assert after["calls"] == before["calls"] + 1
+        assert after["p99_seconds"] is not None
+
+    def test_a_cancelled_primary_records_no_latency(self):
+        from metrics import HEDGE_SECONDS
+
+        def observed(path):
+            return sum(s["count"] for s in HEDGE_SECONDS.snapshot() if s["labels"]["path"] == path)
+
+        before = observed("primary"), observed("hedged")
+        router = make_router(SlowBackend("primary", "one", delay=5), SlowBackend("hedge", "two"), hedge_after=0.05)
+        assert router.complete("hi", return_json=False) == "two"
+
+        assert (observed("primary"), observed("hedged")) == (before[0], before[1] + 1)
@@ -0,0 +1,313 @@
+import pytest
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from deadlines import Deadline, DeadlineExceeded, deadline_scope
+from llm_batching import MicroBatcher
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, prompts, **options):
+        with self.lock:
+            self.batches.append((list(prompts), options))
+        return [f"out:{p}" for p in prompts]
+
+
+class TestMicroBatcher:
+    def test_results_routed_to_callers(self):
+        backend = RecordingBackend()
+        batcher = MicroBatcher(backend, max_batch_size=4, max_wait_ms=20)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(batcher.generate, [f"p{i}" for i in range(8)]))
+        batcher.close()
+
+        assert results == [f"out:p{i}" for i in range(8)]
+        assert all(len(prompts) <= 4 for prompts, _ in backend.batches)
+        assert batcher.requests_served == 8
+
+    def test_concurrent_calls_share_a_batch(self):
+        backend = RecordingBackend()
+        batcher = MicroBatcher(backend, max_batch_size=16, max_wait_ms=200)
+
+        futures = [batcher.submit(f"p{i}") for i in range(5)]
+        assert [f.result(timeout=5) for f in futures] == [f"out:p{i}" for i in range(5)]
+        batcher.close()
+
+        assert len(backend.batches) == 1
+
+    def test_different_options_not_mixed(self):
+        backend = RecordingBackend()
+        batcher = MicroBatcher(backend, max_batch_size=16, max_wait_ms=200)
+
+        plain = batcher.submit("a", schema_name=None)
+        constrained = batcher.submit("b", schema_name="day_plan")
+        plain.result(timeout=5)
+        constrained.result(timeout=5)
+        batcher.close()
+
+        assert sorted(opts["schema_name"] for _, opts in backend.batches if opts["schema_name"]) == ["day_plan"]
+        assert len(backend.batches) == 2
+
+    def test_different_budgets_share_a_batch(self):
+        backend = RecordingBackend()
+        batcher = MicroBatcher(backend, max_batch_size=16, max_wait_ms=200)
+
+        futures = [batcher.submit("a", max_new_tokens=10), batcher.submit("b", max_new_tokens=500)]
+        [f.result(timeout=5) for f in futures]
+        batcher.submit("c", max_new_tokens=10).result(timeout=5)
+        batcher.close()
+
+        assert backend.batches[0] == (["a", "b"], {"max_new_tokens": [10, 500]})
+        assert backend.batches[1] == (["c"], {"max_new_tokens": 10})
+
+    def test_errors_propagate_to_every_caller(self):
+        def failing(prompts, **options):
+            raise RuntimeError("generation failed")
+
+        batcher = MicroBatcher(failing, max_batch_size=4, max_wait_ms=50)
+        futures = [batcher.submit("a"), batcher.submit("b")]
+
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=5)
+        batcher.close()
+
+    def test_submit_after_close(self):
+        batcher = MicroBatcher(RecordingBackend())
+        batcher.close()
+
+        with pytest.raises(RuntimeError):
+            batcher.submit("late")
+
+    def test_deadlines_reach_generate_batch_per_row(self):
+        backend = RecordingBackend()
+        batcher = MicroBatcher(backend, max_batch_size=16, max_wait_ms=200)
+        deadline = Deadline(30)
+
+        futures = [batcher.submit("a", deadline=deadline), batcher.submit("b")]
+        [f.result(timeout=5) for f in futures]
+        batcher.submit("c").result(timeout=5)
+        batcher.close()
+
+        assert backend.batches[0] == (["a", "b"], {"deadlines": [deadline, None]})
+        assert backend.batches[1] == (["c"], {})
+
+    def test_expired_requests_are_not_generated(self):
+        backend = RecordingBackend()
+        batcher = MicroBatcher(backend, max_batch_size=16, max_wait_ms=200)
+        cancelled = Deadline()
+        cancelled.cancel()
+
+        gone, kept = batcher.submit("gone", deadline=cancelled), batcher.submit("kept")
+        with pytest.raises(DeadlineExceeded):
+            gone.result(timeout=5)
+        assert kept.result(timeout=5) == "out:kept"
+        batcher.close()
+
+        assert [prompts for prompts, _ in backend.batches] == [["kept"]]
+
+
+@pytest.fixture(scope="module")
+def tiny_model():
+    """Tiny random Llama and BPE tokenizer, built offline"""
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+    torch = pytest.importorskip("torch")
+    from tokenizers import models, pre_tokenizers, trainers
+
+    tokenizer = tokenizers.Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Metaspace()
+    tokenizer.train_from_iterator(
+        ["Plan a day in Lisbon with trams, fado and pastries.", "Plan a day in Porto by the river.", "{ } { }"] * 10,
+        trainers.BpeTrainer(vocab_size=120, special_tokens=["<unk>", "<s>", "</s>"])
+    )
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>", unk_token="<unk>", pad_token="</s>",
+        padding_side="left"
+    )
+    torch.manual_seed(0)
+    model = transformers.LlamaForCausalLM(transformers.LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=32, intermediate_size=64, num_hidden_layers=1,
+        num_attention_heads=2, num_key_value_heads=2, max_position_embeddings=512
+    )).eval()
+    # Never sample the end-of-sequence token, so only deadlines end rows early
+    def no_eos(module, args, output):
+        output.logits[..., tokenizer.eos_token_id] = -1e9
+
+    model.register_forward_hook(no_eos)
+    return SimpleNamespace(tokenizer=tokenizer, model=model)
+
+
+def generate_two_batched(monkeypatch, tiny_model, deadline, on_step):
+    """Run an unbounded llm_local call and one under deadline as one micro-batch
+
+    on_step(step) is called after each decoding step. Returns the number of
+    tokens generated for the (unbounded, deadline) rows.
+    """
+    import llm
+
+    steps, rows = [], {}
+
+    def after_step(*args):
+        steps.append(1)
+        on_step(len(steps))
+
+    hook = tiny_model.model.register_forward_hook(after_step)
+    generate = tiny_model.model.generate
+
+    def recording_generate(**kwargs):
+        output_ids = generate(**kwargs)
+        new_tokens = output_ids[:, kwargs["input_ids"].shape[1]:].tolist()
+        rows["lengths"] = [
+            len(row) - next((i for i, t in enumerate(reversed(row)) if t != tiny_model.tokenizer.pad_token_id), len(row))
+            for row in new_tokens
+        ]
+        return output_ids
+
+    def recording_batch(prompts, **options):
+        rows["deadlines"] = options.get("deadlines")
+        return llm.generate_batch(prompts, **options)
+
+    monkeypatch.setattr(llm, "USE_MICRO_BATCHING", True)
+    monkeypatch.setattr(llm, "USE_JSON_STOPPING", False)
+    monkeypatch.setattr(llm.provider, "warmup", lambda: tiny_model)
+    monkeypatch.setattr(tiny_model.model, "generate", recording_generate)
+    monkeypatch.setattr(llm, "batcher", MicroBatcher(recording_batch, max_batch_size=4, max_wait_ms=300))
+
+    def bounded():
+        with deadline_scope(deadline):
+            return llm.llm_local("Plan a day in Porto", return_json=False, max_new_tokens=30)
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            calls = [pool.submit(llm.llm_local, "Plan a day in Lisbon", None, False, 30), pool.submit(bounded)]
+            [call.result(timeout=60) for call in calls]
+    finally:
+        hook.remove()
+        llm.batcher.close()
+
+    assert len(rows["deadlines"]) == 2
+    bounded_row = rows["deadlines"].index(deadline)
+    return rows["lengths"][1 - bounded_row], rows["lengths"][bounded_row]
+
+
+class TestDeadlinesInBatches:
+    def test_sla_deadline_ends_its_row_early(self, monkeypatch, tiny_model):
+        deadline = Deadline(3)
+
+        def on_step(step):
+            if step == 5:
+                # A slow step: the SLA runs out while the batch is mid-generation
+                time.sleep(deadline.remaining() + 0.01)
+
+        unbounded, bounded = generate_two_batched(monkeypatch, tiny_model, deadline, on_step)
+
+        assert unbounded == 30
+        assert bounded <= 5
+
+    def test_cancelled_hedge_leg_stops_early(self, monkeypatch, tiny_model):
+        # Each hedged leg runs under a child deadline that is cancelled when the other leg wins
+        leg = Deadline(60).child()
+
+        def on_step(step):
+            if step == 5:
+                leg.cancel()
+
+        unbounded, cancelled = generate_two_batched(monkeypatch, tiny_model, leg, on_step)
+
+        assert unbounded == 30
+        assert cancelled <= 5
+        assert not leg.parent.cancelled
+
+
+class TestJSONStopping:
+    def generate(self, monkeypatch, tiny_model, return_json):
+        """Tokens generated for a model forced to write "{ }" and then keep talking"""
+        import llm
+        from json_constraints import build_token_texts
+
+        texts = build_token_texts(tiny_model.tokenizer)
+        brace = {texts[i].strip(): i for i in range(len(texts)) if texts[i] and texts[i].strip() in "{}"}
+        script = [brace["{"], brace["}"]]
+        steps, lengths = [], []
+
+        def forced(module, args, output):
+            step = len(steps)
+            steps.append(1)
+            if step < len(script):
+                output.logits[..., :] = -1e9
+                output.logits[..., script[step]] = 0
+
+        hook = tiny_model.model.register_forward_hook(forced)
+        generate = tiny_model.model.generate
+
+        def recording_generate(**kwargs):
+            output_ids = generate(**kwargs)
+            row = output_ids[0, kwargs["input_ids"].shape[1]:].tolist()
+            lengths.append(len([t for t in row if t != tiny_model.tokenizer.pad_token_id]))
+            return output_ids
+
+        monkeypatch.setattr(llm, "USE_MICRO_BATCHING", True)
+        monkeypatch.setattr(llm, "USE_JSON_STOPPING", True)
+        monkeypatch.setattr(llm.provider, "warmup", lambda: tiny_model)
+        monkeypatch.setattr(llm.provider, "get_token_texts", lambda: texts)
+        monkeypatch.setattr(tiny_model.model, "generate", recording_generate)
+        monkeypatch.setattr(llm, "batcher", MicroBatcher(llm.generate_batch, max_wait_ms=1))
+        try:
+            llm.llm_local("Plan a day in Lisbon", return_json=return_json, max_new_tokens=12)
+        finally:
+            hook.remove()
+            llm.batcher.close()
+        return lengths[0]
+
+    def test_json_request_stops_when_its_object_closes(self, monkeypatch, tiny_model):
+        assert self.generate(monkeypatch, tiny_model, return_json=True) == 2
+
+    def test_text_request_keeps_going_past_a_closing_brace(self, monkeypatch, tiny_model):
+        assert self.generate(monkeypatch, tiny_model, return_json=False) == 12
+
+
+class TestTokenBudgetsInBatches:
+    def test_each_row_stops_at_its_own_budget(self, monkeypatch, tiny_model):
+        import llm
+
+        batches = []
+        generate = tiny_model.model.generate
+
+        def recording_generate(**kwargs):
+            output_ids = generate(**kwargs)
+            batches.append(output_ids[:, kwargs["input_ids"].shape[1]:])
+            return output_ids
+
+        monkeypatch.setattr(llm, "USE_MICRO_BATCHING", True)
+        monkeypatch.setattr(llm, "USE_JSON_STOPPING", False)
+        monkeypatch.setattr(llm.provider, "warmup", lambda: tiny_model)
+        monkeypatch.setattr(tiny_model.model, "generate", recording_generate)
+        monkeypatch.setattr(llm, "batcher", MicroBatcher(llm.generate_batch, max_wait_ms=200))
+        try:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                short = pool.submit(llm.llm_local, "Plan a day in Lisbon", return_json=False, max_new_tokens=4)
+                long = pool.submit(llm.llm_local, "Plan a day in Porto", return_json=False, max_new_tokens=20)
+                short, long = short.result(timeout=60), long.result(timeout=60)
+        finally:
+            llm.batcher.close()
+
+        assert len(batches) == 1
+        assert batches[0].shape[1] == 20
+        pad = tiny_model.tokenizer.pad_token_id
+        generated = sorted(sum(1 for t in row.tolist() if t != pad) for row in batches[0])
+        assert generated == [4, 20]
+        assert len(tiny_model.tokenizer(short, add_special_tokens=False)["input_ids"]) < len(
+            tiny_model.tokenizer(long, add_special_tokens=False)["input_ids"]
+        )
@@ -0,0 +1,46 @@
+import pytest
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("transformers")
+pytest.importorskip("torch")
+
+from llm import ModelProvider
+
+
+class CountingProvider(ModelProvider):
+    def _load(self):
+        self.pipeline = lambda prompt, **kwargs: [{"generated_text": "{}"}]
+        self.load_count += 1
+
+
+class TestModelProvider:
+    def test_not_loaded_until_requested(self):
+        provider = CountingProvider()
+
+        assert provider.is_ready is False
+        assert provider.load_count == 0
+
+    def test_concurrent_warmup_loads_once(self):
+        provider = CountingProvider()
+
+        threads = [threading.Thread(target=provider.warmup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert provider.is_ready is True
+        assert provider.load_count == 1
+
+    def test_background_preload(self):
+        provider = CountingProvider()
+
+        provider.preload().join(timeout=5)
+
+        assert provider.is_ready is True
+        assert provider.get_pipeline() is provider.pipeline
+        assert provider.load_count == 1
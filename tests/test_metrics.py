@@ -0,0 +1,134 @@
+import pytest
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metrics import (
+    MetricsRegistry,
+    CACHE_REQUESTS,
+    LLM_SECONDS,
+    LLM_COMPLETION_TOKENS,
+    cache_hit_ratios,
+    instrumented_llm,
+    instrumented_llm_stream,
+    metrics_report
+)
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+class TestRegistry:
+    def test_counter_renders_labelled_series(self, registry):
+        requests = registry.counter("requests_total", "Requests", ["route"])
+        requests.inc(route="/plan")
+        requests.inc(2, route="/plan")
+        requests.inc(route="/chat")
+
+        text = registry.render_prometheus()
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{route="/plan"} 3' in text
+        assert 'requests_total{route="/chat"} 1' in text
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        latency = registry.histogram("latency_seconds", "Latency", ["node"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, node="generate")
+
+        text = registry.render_prometheus()
+        assert 'latency_seconds_bucket{node="generate",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{node="generate",le="1"} 2' in text
+        assert 'latency_seconds_bucket{node="generate",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{node="generate"} 3' in text
+        assert registry.snapshot()["latency_seconds"]["series"][0]["sum"] == pytest.approx(5.55)
+
+    def test_labels_must_match(self, registry):
+        counter = registry.counter("labelled_total", "Labelled", ["cache"])
+        with pytest.raises(ValueError):
+            counter.inc(kind="weather")
+
+    def test_reregistering_returns_the_same_metric(self, registry):
+        assert registry.counter("a_total", "A") is registry.counter("a_total", "A")
+        with pytest.raises(ValueError):
+            registry.histogram("a_total", "A")
+
+    def test_label_values_are_escaped(self, registry):
+        registry.counter("errors_total", "Errors", ["message"]).inc(message='bad "json"\n')
+
+        assert 'errors_total{message="bad \\"json\\"\\n"} 1' in registry.render_prometheus()
+
+
+class TestInstrumentation:
+    def test_cache_lookups_feed_hit_ratio(self):
+        cache = ResultCache(path=None, table="metrics_test")
+        before = CACHE_REQUESTS.value(cache="metrics_test", result="hit")
+        cache.get("missing")
+        cache.set("key", {"value": 1})
+        cache.get("key")
+
+        assert CACHE_REQUESTS.value(cache="metrics_test", result="hit") == before + 1
+        assert 0.0 < cache_hit_ratios()["metrics_test"] < 1.0
+
+    def test_instrumented_llm_records_latency_and_tokens(self):
+        llm = instrumented_llm(lambda prompt, system_prompt, return_json, max_new_tokens: "four words of output", "metrics_fake")
+
+        assert llm("plan a trip", return_json=False) == "four words of output"
+        series = LLM_SECONDS.snapshot()
+        assert any(s["labels"] == {"backend": "metrics_fake", "mode": "complete", "outcome": "ok"} for s in series)
+        tokens = [s for s in LLM_COMPLETION_TOKENS.snapshot() if s["labels"] == {"backend": "metrics_fake"}]
+        assert tokens[0]["count"] >= 1 and tokens[0]["sum"] > 0
+
+    def test_failed_stream_is_recorded_as_error(self):
+        def broken_stream(prompt, system_prompt, max_new_tokens):
+            yield "{"
+            raise RuntimeError("connection reset")
+
+        stream = instrumented_llm_stream(broken_stream, "metrics_broken")
+        with pytest.raises(RuntimeError):
+            list(stream("plan a trip"))
+
+        labels = [s["labels"] for s in LLM_SECONDS.snapshot()]
+        assert {"backend": "metrics_broken", "mode": "stream", "outcome": "error"} in labels
+
+    def test_report_is_json_serialisable(self):
+        report = json.loads(json.dumps(metrics_report()))
+
+        assert "tripcraft_node_duration_seconds" in report["metrics"]
+        assert "cache_hit_ratio" in report
+
+
+class TestMetricsEndpoint:
+    def test_metrics_endpoint_serves_prometheus_text(self):
+        pytest.importorskip("fastapi")
+        from fastapi.testclient import TestClient
+        from backend.api_server import app
+
+        response = TestClient(app).get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE tripcraft_llm_request_duration_seconds histogram" in response.text
+
+
+class TestQuantiles:
+    def test_quantile_interpolates_within_buckets(self, registry):
+        latency = registry.histogram("q_seconds", "Latency", ["path"], buckets=(1.0, 2.0, 4.0))
+        assert latency.quantile(0.99) is None
+
+        for value in [0.5] * 50 + [1.5] * 49 + [3.0]:
+            latency.observe(value, path="hedged")
+        latency.observe(10.0, path="primary")
+
+        assert latency.quantile(0.5, path="hedged") == pytest.approx(1.0)
+        assert latency.quantile(0.99, path="hedged") == pytest.approx(2.0)
+        assert latency.quantile(0.999, path="hedged") == pytest.approx(3.8)
+        # Past the last finite bucket the best estimate is its upper bound
+        assert latency.quantile(0.99, path="primary") == pytest.approx(4.0)
+
+    def test_report_includes_hedging(self):
+        assert set(metrics_report()["hedging"]) >= {"hedge_rate", "hedge_win_rate", "p99_seconds"}
@@ -0,0 +1,248 @@
+import pytest
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from openai_backend import OpenAIChatBackend, OpenAIBackendError
+
+
+class StubOpenAI:
+    """Local stand-in for /v1/chat/completions with scripted failures"""
+
+    def __init__(self, statuses=None, delay=0.0):
+        self.statuses = list(statuses or [])
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.requests.append(body)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status = stub.statuses.pop(0) if stub.statuses else 200
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.in_flight -= 1
+
+                content_type = "application/json"
+                if status == 200 and body.get("stream"):
+                    # One server-sent event per word, then [DONE]
+                    words = body["messages"][-1]["content"].upper().split()
+                    events = [{"choices": [{"delta": {"role": "assistant"}}]}]
+                    events += [{"choices": [{"delta": {"content": f"{word} "}}]} for word in words]
+                    data = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+                    data, content_type = data.encode(), "text/event-stream"
+                elif status == 200:
+                    reply = body["messages"][-1]["content"].upper()
+                    data = json.dumps({"choices": [{"message": {"role": "assistant", "content": f" {reply} "}}]}).encode()
+                else:
+                    data = json.dumps({"error": {"message": "scripted failure"}}).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the request
+                    pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_backend(stub, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return OpenAIChatBackend(api_key="test-key", base_url=stub.url, **kwargs)
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class TestOpenAIChatBackend:
+    def test_sync_completion(self):
+        stub = StubOpenAI()
+        backend = make_backend(stub)
+        try:
+            assert backend.complete(MESSAGES) == "HELLO"
+            assert stub.requests[0]["model"] == "gpt-4o-mini"
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_async_completion(self):
+        stub = StubOpenAI()
+        backend = make_backend(stub)
+        try:
+            assert asyncio.run(backend.acomplete(MESSAGES, max_tokens=10)) == "HELLO"
+            assert stub.requests[0]["max_tokens"] == 10
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_retries_transient_errors(self):
+        stub = StubOpenAI(statuses=[503, 429])
+        backend = make_backend(stub, max_retries=3)
+        try:
+            assert backend.complete(MESSAGES) == "HELLO"
+            assert backend.retries == 2
+            assert len(stub.requests) == 3
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_gives_up_after_max_retries(self):
+        stub = StubOpenAI(statuses=[500, 500, 500])
+        backend = make_backend(stub, max_retries=2)
+        try:
+            with pytest.raises(OpenAIBackendError):
+                backend.complete(MESSAGES)
+            assert len(stub.requests) == 3
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_client_errors_are_not_retried(self):
+        stub = StubOpenAI(statuses=[401])
+        backend = make_backend(stub, max_retries=3)
+        try:
+            with pytest.raises(OpenAIBackendError) as error:
+                backend.complete(MESSAGES)
+            assert error.value.status_code == 401
+            assert len(stub.requests) == 1
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_per_call_timeout(self):
+        stub = StubOpenAI(delay=0.5)
+        backend = make_backend(stub, max_retries=0)
+        try:
+            with pytest.raises(OpenAIBackendError):
+                backend.complete(MESSAGES, timeout=0.1)
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_concurrency_limit(self):
+        stub = StubOpenAI(delay=0.1)
+        backend = make_backend(stub, max_concurrency=2)
+
+        async def many():
+            return await asyncio.gather(*[backend.acomplete(MESSAGES) for _ in range(6)])
+
+        try:
+            assert asyncio.run(many()) == ["HELLO"] * 6
+            assert stub.max_in_flight <= 2
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_cancelled_call_returns_early(self):
+        stub = StubOpenAI(delay=1.0)
+        backend = make_backend(stub, max_retries=0)
+        cancel = threading.Event()
+        threading.Timer(0.1, cancel.set).start()
+        try:
+            start = time.perf_counter()
+            with pytest.raises(OpenAIBackendError, match="cancelled"):
+                backend.complete(MESSAGES, cancelled=cancel.is_set)
+            assert time.perf_counter() - start < 0.5
+            # The loop is still usable afterwards
+            stub.delay = 0
+            assert backend.complete(MESSAGES) == "HELLO"
+        finally:
+            backend.close()
+            stub.close()
+
+
+STREAM_MESSAGES = [{"role": "user", "content": "plan a day in lisbon"}]
+
+
+class TestOpenAIStreaming:
+    def test_stream_yields_deltas(self):
+        stub = StubOpenAI()
+        backend = make_backend(stub)
+        try:
+            chunks = list(backend.stream(STREAM_MESSAGES, max_tokens=50))
+
+            assert chunks == ["PLAN ", "A ", "DAY ", "IN ", "LISBON "]
+            assert stub.requests[0]["stream"] is True
+            assert stub.requests[0]["max_tokens"] == 50
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_stream_retries_before_the_first_chunk(self):
+        stub = StubOpenAI(statuses=[503])
+        backend = make_backend(stub, max_retries=2)
+        try:
+            assert "".join(backend.stream(STREAM_MESSAGES)) == "PLAN A DAY IN LISBON "
+            assert backend.retries == 1
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_stream_errors_reach_the_caller(self):
+        stub = StubOpenAI(statuses=[401])
+        backend = make_backend(stub)
+        try:
+            with pytest.raises(OpenAIBackendError) as error:
+                list(backend.stream(STREAM_MESSAGES))
+            assert error.value.status_code == 401
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_cancelled_stream_stops(self):
+        stub = StubOpenAI(delay=1.0)
+        backend = make_backend(stub, max_retries=0)
+        try:
+            start = time.perf_counter()
+            with pytest.raises(OpenAIBackendError, match="cancelled"):
+                list(backend.stream(STREAM_MESSAGES, cancelled=lambda: time.perf_counter() - start > 0.1))
+            assert time.perf_counter() - start < 0.5
+        finally:
+            backend.close()
+            stub.close()
+
+    def test_llm_stream_openai_uses_the_pooled_backend(self, monkeypatch):
+        import llm
+        import openai_backend
+
+        stub = StubOpenAI()
+        backend = make_backend(stub)
+        monkeypatch.setattr(openai_backend, "_backend", backend)
+        try:
+            assert "".join(llm.llm_stream_openai("plan a day in lisbon", max_new_tokens=20)) == "PLAN A DAY IN LISBON "
+            assert stub.requests[0]["messages"][0]["role"] == "system"
+            assert stub.requests[0]["max_tokens"] == 20
+        finally:
+            backend.close()
+            stub.close()
@@ -0,0 +1,118 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from prefix_cache import PrefixKVCache
+from tripcraft_config import ITINERARY_PROMPT_PREFIXES, build_itinerary_prompt
+
+PREFERENCES = {"destination": "Lisbon", "budget": 900, "interests": ["food", "art"], "dates": "2025-05-01 to 2025-05-03"}
+SYSTEM_PROMPT = "You are TripCraft, a professional travel itinerary assistant."
+
+
+def chat_prompt(user_prompt):
+    return f"<|system|>\n{SYSTEM_PROMPT}\n<|user|>\n{user_prompt}\n<|assistant|>"
+
+
+def chat_prefix(variant):
+    return f"<|system|>\n{SYSTEM_PROMPT}\n<|user|>\n{ITINERARY_PROMPT_PREFIXES[variant]}"
+
+
+def itinerary_prompts():
+    return [
+        chat_prompt(build_itinerary_prompt(PREFERENCES, "Lisbon: trams, fado, pastéis de nata", 3, schema_variant=variant))
+        for variant in ITINERARY_PROMPT_PREFIXES
+    ]
+
+
+@pytest.fixture(scope="module")
+def llama_like_tokenizer():
+    """A small BPE tokenizer with Llama's "▁" metaspace handling, trained offline on itinerary prompts"""
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+    from tokenizers import decoders, models, pre_tokenizers, processors, trainers
+
+    tokenizer = tokenizers.Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Metaspace(replacement="▁", prepend_scheme="always")
+    tokenizer.decoder = decoders.Metaspace(replacement="▁", prepend_scheme="always")
+    tokenizer.train_from_iterator(
+        itinerary_prompts(),
+        trainers.BpeTrainer(vocab_size=400, special_tokens=["<unk>", "<s>", "</s>"])
+    )
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A", special_tokens=[("<s>", tokenizer.token_to_id("<s>"))]
+    )
+    return transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>", unk_token="<unk>", pad_token="</s>"
+    )
+
+
+@pytest.fixture(scope="module")
+def tiny_llama(llama_like_tokenizer):
+    torch = pytest.importorskip("torch")
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(0)
+    config = LlamaConfig(
+        vocab_size=len(llama_like_tokenizer), hidden_size=32, intermediate_size=64,
+        num_hidden_layers=2, num_attention_heads=2, num_key_value_heads=2, max_position_embeddings=4096
+    )
+    return LlamaForCausalLM(config).eval()
+
+
+class TestPrefixBoundary:
+    def test_prepared_ids_match_the_whole_prompt(self, llama_like_tokenizer, tiny_llama):
+        cache = PrefixKVCache([chat_prefix(variant) for variant in ITINERARY_PROMPT_PREFIXES])
+
+        for prompt in itinerary_prompts():
+            prepared = cache.prepare(tiny_llama, llama_like_tokenizer, prompt)
+
+            assert prepared["input_ids"][0].tolist() == llama_like_tokenizer(prompt).input_ids
+            assert "past_key_values" in prepared
+        assert cache.hits == len(ITINERARY_PROMPT_PREFIXES) and cache.boundary_misses == 0
+
+    def test_prefix_and_suffix_tokenized_apart_would_differ(self, llama_like_tokenizer):
+        # Why prepare tokenizes the whole prompt: the suffix alone gets a leading "▁"
+        prompt = itinerary_prompts()[0]
+        prefix = chat_prefix("full")
+        apart = llama_like_tokenizer(prefix).input_ids + llama_like_tokenizer(
+            prompt[len(prefix):], add_special_tokens=False
+        ).input_ids
+
+        assert apart != llama_like_tokenizer(prompt).input_ids
+
+    def test_cached_generation_matches_uncached(self, llama_like_tokenizer, tiny_llama):
+        torch = pytest.importorskip("torch")
+        cache = PrefixKVCache([chat_prefix("full")])
+        prompt = itinerary_prompts()[0]
+        options = dict(max_new_tokens=5, do_sample=False, pad_token_id=llama_like_tokenizer.pad_token_id)
+
+        with torch.inference_mode():
+            cached = tiny_llama.generate(**cache.prepare(tiny_llama, llama_like_tokenizer, prompt), **options)
+            plain = tiny_llama.generate(**llama_like_tokenizer(prompt, return_tensors="pt"), **options)
+
+        assert cached.tolist() == plain.tolist()
+
+    def test_boundary_mismatch_skips_the_cache(self, llama_like_tokenizer, tiny_llama):
+        # A prefix ending mid-word tokenizes differently on its own than inside the prompt
+        prompt = itinerary_prompts()[0]
+        cache = PrefixKVCache([chat_prefix("full") + "Generate a 3-day itin"])
+
+        prepared = cache.prepare(tiny_llama, llama_like_tokenizer, prompt)
+
+        assert "past_key_values" not in prepared
+        assert prepared["input_ids"][0].tolist() == llama_like_tokenizer(prompt).input_ids
+        assert cache.boundary_misses == 1 and cache.hits == 0
+
+    def test_real_tokenizer_when_available(self):
+        transformers = pytest.importorskip("transformers")
+        from llm import MODEL_NAME
+
+        try:
+            tokenizer = transformers.AutoTokenizer.from_pretrained(MODEL_NAME, local_files_only=True)
+        except OSError:
+            pytest.skip(f"{MODEL_NAME} tokenizer is not cached locally")
+        for variant, prompt in zip(ITINERARY_PROMPT_PREFIXES, itinerary_prompts()):
+            prefix_ids = tokenizer(chat_prefix(variant)).input_ids
+            assert tokenizer(prompt).input_ids[:len(prefix_ids)] == prefix_ids
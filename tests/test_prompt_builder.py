@@ -0,0 +1,149 @@
+import pytest
+import sys
+import os
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from prompt_builder import TokenCounter, active_token_counter, pack_context, build_budgeted_itinerary_prompt
+
+
+def word_counter():
+    """One token per whitespace-separated word, so budgets are easy to reason about"""
+    vocab = {}
+
+    def encode(text):
+        return [vocab.setdefault(word, len(vocab)) for word in text.split()]
+
+    def decode(ids):
+        words = {v: k for k, v in vocab.items()}
+        return " ".join(words[i] for i in ids)
+
+    return TokenCounter("words", encode=encode, decode=decode)
+
+
+PREFERENCES = {"destination": "Lisbon", "budget": 1200, "interests": ["history", "food"], "dates": "2025-05-01 to 2025-05-03"}
+SNIPPETS = [
+    "Belém Tower guards the Tagus estuary and opens at ten.",
+    "Alfama is the oldest district, with fado houses on every corner.",
+    "Pastel de nata bakeries cluster around the Jerónimos Monastery in the west of the city."
+]
+
+
+class TestTokenCounter:
+    def test_approx_counts_characters(self):
+        assert TokenCounter().count("x" * 40) == 10
+
+    def test_truncate_at_word_boundary(self):
+        counter = word_counter()
+
+        cut = counter.truncate("one two three four five", 3)
+
+        assert counter.count(cut) <= 3
+        assert cut.startswith("one two")
+
+    def test_active_counter_never_fails(self):
+        counter = active_token_counter()
+
+        assert counter.count("hello world") > 0
+        assert counter.name
+
+    def test_mock_backends_never_import_transformers(self):
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        code = (
+            "import sys, prompt_builder\n"
+            "for name in ('mock', 'llm_mock'):\n"
+            "    assert prompt_builder.active_token_counter(name).encode is None\n"
+            "assert prompt_builder.active_token_counter('transformers', degraded=True).encode is None\n"
+            "print('transformers' in sys.modules)"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, timeout=120)
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == "False"
+
+    def test_missing_tokenizer_is_looked_up_once(self, monkeypatch):
+        transformers = pytest.importorskip("transformers")
+        import prompt_builder
+
+        lookups = []
+
+        def missing(*args, **kwargs):
+            lookups.append(args)
+            raise OSError("not cached")
+
+        monkeypatch.setattr(transformers.AutoTokenizer, "from_pretrained", missing)
+        monkeypatch.setattr(prompt_builder, "_counters", {})
+        monkeypatch.setattr(prompt_builder, "_cached_tokenizer_missing", False)
+        monkeypatch.delitem(sys.modules, "llm", raising=False)
+
+        for _ in range(3):
+            assert active_token_counter("transformers").encode is None
+
+        assert len(lookups) == 1
+
+
+class TestPackContext:
+    def test_everything_fits(self):
+        packed = pack_context("\n\n".join(SNIPPETS), 500, word_counter())
+
+        assert packed["text"] == "\n\n".join(SNIPPETS)
+        assert packed["truncated"] is False
+
+    def test_whole_snippets_first(self):
+        packed = pack_context("\n\n".join(SNIPPETS), 30, word_counter())
+
+        assert packed["text"] == SNIPPETS[0] + "\n\n" + SNIPPETS[1]
+        assert packed["truncated"] is True
+
+    def test_long_snippet_is_truncated(self):
+        counter = word_counter()
+
+        packed = pack_context(" ".join(f"w{i}" for i in range(100)), 20, counter)
+
+        assert packed["tokens"] <= 20
+        assert packed["text"].startswith("w0 w1 w2")
+        assert packed["text"].endswith("…")
+
+    def test_tiny_remainder_is_dropped(self):
+        packed = pack_context("\n\n".join(SNIPPETS[:2]), 12, word_counter())
+
+        assert packed["text"] == SNIPPETS[0]
+
+    def test_empty_context(self):
+        assert pack_context("", 100, word_counter())["text"] == ""
+
+
+class TestBudgetedPrompt:
+    def test_compact_schema_is_much_shorter(self):
+        counter = word_counter()
+        full = build_budgeted_itinerary_prompt(PREFERENCES, SNIPPETS[0], 3, "full", counter=counter)
+        compact = build_budgeted_itinerary_prompt(PREFERENCES, SNIPPETS[0], 3, "compact", counter=counter)
+
+        assert compact["prompt_stats"]["prompt_tokens"] < full["prompt_stats"]["prompt_tokens"] / 2
+        assert "Lisbon" in compact["prompt"] and SNIPPETS[0] in compact["prompt"]
+
+    def test_stats_and_version(self):
+        request = build_budgeted_itinerary_prompt(
+            PREFERENCES, "\n\n".join(SNIPPETS), 3, "compact", context_tokens=20, counter=word_counter()
+        )
+        stats = request["prompt_stats"]
+
+        assert stats["context_tokens"] <= 20
+        assert stats["context_truncated"] is True
+        assert stats["tokenizer"] == "words"
+        assert request["context"] in request["prompt"]
+        assert request["prompt_version"].endswith("-ctx20")
+
+    def test_version_depends_on_variant_and_budget(self):
+        versions = {
+            build_budgeted_itinerary_prompt(PREFERENCES, "", 2, variant, context_tokens=budget)["prompt_version"]
+            for variant in ("full", "compact")
+            for budget in (64, 128)
+        }
+
+        assert len(versions) == 4
+
+    def test_unknown_variant(self):
+        with pytest.raises(ValueError):
+            build_budgeted_itinerary_prompt(PREFERENCES, "", 2, "tiny")
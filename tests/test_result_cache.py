@@ -0,0 +1,85 @@
+import pytest
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from result_cache import ResultCache, itinerary_cache_key
+
+
+PREFERENCES = {
+    "destination": "Paris",
+    "budget": 1000,
+    "interests": ["art", "food"],
+    "dates": "2025-10-01 to 2025-10-03"
+}
+
+
+class TestResultCache:
+    def test_memory_hit_and_miss(self):
+        cache = ResultCache(path=None)
+
+        assert cache.get("k") is None
+        cache.set("k", {"itinerary": {"destination": "Paris"}})
+
+        assert cache.get("k") == {"itinerary": {"destination": "Paris"}}
+        stats = cache.stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_lru_eviction(self):
+        cache = ResultCache(path=None, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_ttl_expiry(self):
+        cache = ResultCache(path=None, ttl_seconds=0.05)
+        cache.set("k", "value")
+        time.sleep(0.1)
+
+        assert cache.get("k") is None
+
+    def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        ResultCache(path=path, table="itineraries").set("k", "raw output")
+
+        reopened = ResultCache(path=path, table="itineraries")
+
+        assert reopened.get("k") == "raw output"
+        assert reopened.stats()["disk_hits"] == 1
+        assert reopened.get("k") == "raw output"
+        assert reopened.stats()["memory_hits"] == 1
+
+    def test_purge_expired(self, tmp_path):
+        cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=0.05)
+        cache.set("k", "value")
+        time.sleep(0.1)
+
+        assert cache.purge_expired() == 1
+
+
+class TestItineraryCacheKey:
+    def test_equivalent_preferences_share_a_key(self):
+        variant = {
+            "destination": "  paris ",
+            "budget": "1000",
+            "interests": ["Food", "art", "food"],
+            "dates": "2025-10-01  to 2025-10-03"
+        }
+
+        assert itinerary_cache_key(PREFERENCES, "info", "mock", "v1") == \
+            itinerary_cache_key(variant, "info", "mock", "v1")
+
+    def test_model_and_prompt_version_change_key(self):
+        base = itinerary_cache_key(PREFERENCES, "info", "mock", "v1")
+
+        assert base != itinerary_cache_key(PREFERENCES, "info", "tinyllama", "v1")
+        assert base != itinerary_cache_key(PREFERENCES, "info", "mock", "v2")
+        assert base != itinerary_cache_key(dict(PREFERENCES, budget=1200), "info", "mock", "v1")
@@ -0,0 +1,77 @@
+import pytest
+import sys
+import os
+import asyncio
+import time
+from typing import TypedDict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("langgraph.checkpoint.sqlite")
+
+from langgraph.graph import StateGraph, END
+from run_checkpoints import RunCheckpointer
+
+
+class CounterState(TypedDict):
+    count: int
+
+
+def counting_graph(checkpointer):
+    graph = StateGraph(CounterState)
+    graph.add_node("first", lambda state: {"count": state["count"] + 1})
+    graph.add_node("second", lambda state: {"count": state["count"] * 10})
+    graph.set_entry_point("first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def config(run_id):
+    return {"configurable": {"thread_id": run_id}}
+
+
+class TestRunCheckpointer:
+    def test_runs_are_tracked(self):
+        saver = RunCheckpointer(":memory:")
+        counting_graph(saver).invoke({"count": 1}, config("a"))
+        counting_graph(saver).invoke({"count": 2}, config("b"))
+
+        assert saver.run_ids() == ["b", "a"]
+
+    def test_checkpoints_persist_across_instances(self, tmp_path):
+        path = str(tmp_path / "checkpoints.sqlite3")
+        assert counting_graph(RunCheckpointer(path)).invoke({"count": 1}, config("a")) == {"count": 20}
+
+        state = counting_graph(RunCheckpointer(path)).get_state(config("a"))
+        assert state.values == {"count": 20}
+        assert state.next == ()
+
+    def test_async_invoke(self):
+        saver = RunCheckpointer(":memory:")
+        result = asyncio.run(counting_graph(saver).ainvoke({"count": 4}, config("async")))
+
+        assert result == {"count": 50}
+        assert asyncio.run(counting_graph(saver).aget_state(config("async"))).values == {"count": 50}
+
+    def test_gc_removes_only_stale_runs(self):
+        saver = RunCheckpointer(":memory:", ttl_seconds=60)
+        graph = counting_graph(saver)
+        graph.invoke({"count": 1}, config("old"))
+        time.sleep(0.05)
+        graph.invoke({"count": 1}, config("new"))
+
+        assert saver.gc(max_age_seconds=0.03) == 1
+        assert saver.run_ids() == ["new"]
+        assert graph.get_state(config("old")).values == {}
+        assert graph.get_state(config("new")).values == {"count": 20}
+
+    def test_maybe_gc_is_rate_limited(self):
+        saver = RunCheckpointer(":memory:", ttl_seconds=0)
+        graph = counting_graph(saver)
+        graph.invoke({"count": 1}, config("a"))
+
+        assert saver.maybe_gc() == 1
+        graph.invoke({"count": 1}, config("b"))
+        assert saver.maybe_gc() == 0
+        assert saver.run_ids() == ["b"]
@@ -0,0 +1,124 @@
+import pytest
+import sys
+import os
+import copy
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from schema_validator import SchemaValidationError, compile_schema
+from llm_mock import generate_mock_itinerary
+from tripcraft_config import (
+    ITINERARY_JSON_SCHEMA,
+    EDIT_DELTA_SCHEMA,
+    build_itinerary_prompt,
+    validate_itinerary_json,
+    itinerary_schema_errors,
+    edit_schema_errors,
+)
+
+
+def mock_itinerary(num_days=3):
+    preferences = {
+        "destination": "Lisbon",
+        "budget": 900,
+        "interests": ["food", "art"],
+        "dates": f"2025-05-01 to 2025-05-{num_days:02d}"
+    }
+    return json.loads(generate_mock_itinerary(build_itinerary_prompt(preferences, "info", num_days)))
+
+
+def locations(data):
+    return [error.location for error in itinerary_schema_errors(data)]
+
+
+class TestItineraryValidation:
+    def test_mock_itinerary_is_valid(self):
+        itinerary = mock_itinerary()
+
+        assert validate_itinerary_json(itinerary)
+        assert itinerary_schema_errors(itinerary) == []
+
+    def test_reports_deep_problems_with_paths(self):
+        itinerary = mock_itinerary()
+        plans = itinerary["itinerary"]["daily_plans"]
+        del plans[1]["activities"][0]["start_time"]
+        plans[2]["activities"][1]["transportation"]["est_cost"] = "about 5 euros"
+        plans[0]["meals"][0]["est_cost"] = None
+
+        assert not validate_itinerary_json(itinerary)
+        assert locations(itinerary) == [
+            "itinerary.daily_plans[0].meals[0].est_cost",
+            "itinerary.daily_plans[1].activities[0].start_time",
+            "itinerary.daily_plans[2].activities[1].transportation.est_cost",
+        ]
+        messages = [error.message for error in itinerary_schema_errors(itinerary)]
+        assert messages == ["expected number, got null", "is required", "expected number, got string"]
+
+    def test_top_level_and_type_errors(self):
+        assert locations([]) == ["(root)"]
+        assert locations({"itinerary": {}}) == [
+            "human_readable",
+            "itinerary.destination",
+            "itinerary.start_date",
+            "itinerary.end_date",
+            "itinerary.daily_plans",
+            "itinerary.total_estimated_cost",
+        ]
+
+    def test_booleans_are_not_numbers_and_dates_are_checked(self):
+        itinerary = mock_itinerary(1)
+        itinerary["itinerary"]["total_estimated_cost"] = True
+        itinerary["itinerary"]["daily_plans"][0]["date"] = "May 1st"
+        itinerary["itinerary"]["daily_plans"][0]["day"] = 1.0
+
+        assert [str(e) for e in itinerary_schema_errors(itinerary)] == [
+            "itinerary.daily_plans[0].date: expected a YYYY-MM-DD date, got 'May 1st'",
+            "itinerary.total_estimated_cost: expected number, got boolean",
+        ]
+
+    def test_validate_raises_with_every_error(self):
+        validator = compile_schema(EDIT_DELTA_SCHEMA)
+        delta = {"delta": {"changes": [{"type": "rename", "target": "day 1"}]}}
+
+        with pytest.raises(SchemaValidationError) as excinfo:
+            validator.validate(delta)
+
+        assert [str(e) for e in excinfo.value.errors] == [
+            "delta.changes[0].reason: is required",
+            "delta.changes[0].type: must be one of add, remove, modify, move, got 'rename'",
+        ]
+        assert validator.validate({"delta": {"changes": []}}) == {"delta": {"changes": []}}
+
+    def test_agrees_with_jsonschema(self):
+        jsonschema = pytest.importorskip("jsonschema")
+        reference = jsonschema.Draft202012Validator(ITINERARY_JSON_SCHEMA)
+        documents = [mock_itinerary(), {}, [], {"itinerary": None, "human_readable": 1}]
+        for mutate in ("start_time", "title", "date"):
+            document = mock_itinerary()
+            for plan in document["itinerary"]["daily_plans"]:
+                plan["activities"][-1].pop(mutate, None)
+            documents.append(document)
+        broken = mock_itinerary()
+        broken["itinerary"]["daily_plans"][0]["estimated_daily_cost"] = "450"
+        documents.append(broken)
+
+        for document in documents:
+            expected = sorted(tuple(e.absolute_path) for e in reference.iter_errors(document))
+            found = sorted(e.path[:-1] if e.message == "is required" else e.path for e in itinerary_schema_errors(document))
+            assert found == expected
+
+
+class TestEditValidation:
+    def test_only_errors_the_edit_introduced_count(self):
+        before = mock_itinerary()["itinerary"]
+        before["daily_plans"][0]["activities"][0]["title"] = 7
+        after = copy.deepcopy(before)
+        after["day_2"] = {"activities": [{"name": "Eiffel Tower"}]}
+
+        assert edit_schema_errors(before, after) == []
+
+        del after["daily_plans"][1]["activities"][0]["end_time"]
+        assert [str(e) for e in edit_schema_errors(before, after)] == [
+            "daily_plans[1].activities[0].end_time: is required"
+        ]
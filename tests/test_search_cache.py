@@ -0,0 +1,204 @@
+import pytest
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search_cache import SearchCache, SingleFlight, attractions_query, search_cache_key
+
+
+class FakeTavily:
+    """Counts searches; optionally slow or failing"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def search(self, query, **kwargs):
+        with self._lock:
+            self.calls.append((query, kwargs))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("search quota exceeded")
+        return {"results": [{"content": f"Result for {query}"}]}
+
+
+def run_concurrently(fn, count: int):
+    barrier = threading.Barrier(count)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+class TestCacheKeys:
+    def test_query_case_and_whitespace_are_folded(self):
+        assert search_cache_key("weather", "Weather  in Lisbon ", {"max_results": 1}) == \
+            search_cache_key("weather", "weather in lisbon", {"max_results": 1})
+
+    def test_params_and_kind_are_part_of_the_key(self):
+        key = search_cache_key("attractions", "lisbon", {"max_results": 3})
+        assert key != search_cache_key("attractions", "lisbon", {"max_results": 5})
+        assert key != search_cache_key("weather", "lisbon", {"max_results": 3})
+
+    def test_attractions_query_ignores_interest_order(self):
+        assert attractions_query("Lisbon", ["Food", "art"]) == attractions_query("Lisbon", "art, food")
+        assert attractions_query("Lisbon", []) == "Top attractions and activities in Lisbon"
+
+
+class TestSearchCache:
+    def test_repeated_search_is_served_from_cache(self):
+        client, searches = FakeTavily(), SearchCache(path=None)
+
+        first = searches.search(client, "Top attractions in Lisbon", max_results=3)
+        assert searches.last_hit() is False
+        second = searches.search(client, "top attractions in  lisbon", max_results=3)
+
+        assert second == first
+        assert searches.last_hit() is True
+        assert len(client.calls) == 1
+
+    def test_each_kind_has_its_own_ttl(self):
+        client = FakeTavily()
+        searches = SearchCache(path=None, ttls={"attractions": 60, "weather": 0.05})
+
+        searches.search(client, "Lisbon", kind="attractions")
+        searches.search(client, "Lisbon", kind="weather")
+        time.sleep(0.1)
+        searches.search(client, "Lisbon", kind="attractions")
+        searches.search(client, "Lisbon", kind="weather")
+
+        assert [kwargs for _, kwargs in client.calls] == [{}, {}, {}]
+        assert searches.stats()["caches"]["attractions"]["memory_hits"] == 1
+
+    def test_zero_ttl_disables_caching(self):
+        client = FakeTavily()
+        searches = SearchCache(path=None, ttls={"weather": 0})
+
+        searches.search(client, "Lisbon", kind="weather")
+        searches.search(client, "Lisbon", kind="weather")
+
+        assert len(client.calls) == 2
+
+    def test_unknown_kind_raises(self):
+        with pytest.raises(ValueError):
+            SearchCache(path=None).search(FakeTavily(), "Lisbon", kind="flights")
+
+    def test_empty_results_are_not_cached(self):
+        class EmptyTavily(FakeTavily):
+            def search(self, query, **kwargs):
+                super().search(query, **kwargs)
+                return {"results": []}
+
+        client, searches = EmptyTavily(), SearchCache(path=None)
+        searches.search(client, "Atlantis")
+        searches.search(client, "Atlantis")
+
+        assert len(client.calls) == 2
+
+    def test_results_persist_across_instances(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        SearchCache(path=path).search(FakeTavily(), "Lisbon", kind="weather", max_results=1)
+
+        client = FakeTavily()
+        result = SearchCache(path=path).search(client, "Lisbon", kind="weather", max_results=1)
+
+        assert result["results"][0]["content"] == "Result for Lisbon"
+        assert client.calls == []
+
+
+class TestCoalescing:
+    def test_concurrent_identical_searches_share_one_call(self):
+        client, searches = FakeTavily(delay=0.2), SearchCache(path=None)
+
+        results, errors = run_concurrently(lambda: searches.search(client, "Lisbon", max_results=3), 8)
+
+        assert errors == []
+        assert len(results) == 8
+        assert len(client.calls) == 1
+        assert searches.stats()["coalesced"] == 7
+
+    def test_coalescing_applies_without_caching(self):
+        client = FakeTavily(delay=0.2)
+        searches = SearchCache(path=None, ttls={"weather": 0})
+
+        run_concurrently(lambda: searches.search(client, "Lisbon", kind="weather"), 4)
+
+        assert len(client.calls) == 1
+
+    def test_failure_reaches_every_waiter_and_is_not_cached(self):
+        client, searches = FakeTavily(delay=0.2, fail=True), SearchCache(path=None)
+
+        results, errors = run_concurrently(lambda: searches.search(client, "Lisbon"), 4)
+
+        assert results == []
+        assert len(errors) == 4
+        assert all("quota" in str(e) for e in errors)
+        client.fail = False
+        searches.search(client, "Lisbon")
+        assert len(client.calls) == 2
+
+    def test_outbound_searches_are_bounded(self):
+        class CountingTavily(FakeTavily):
+            active = max_active = 0
+
+            def search(self, query, **kwargs):
+                with self._lock:
+                    self.active += 1
+                    self.max_active = max(self.max_active, self.active)
+                try:
+                    return super().search(query, **kwargs)
+                finally:
+                    with self._lock:
+                        self.active -= 1
+
+        client, searches = CountingTavily(delay=0.05), SearchCache(path=None, max_concurrency=2)
+        queries = iter(f"city {i}" for i in range(6))
+        lock = threading.Lock()
+
+        def next_search():
+            with lock:
+                query = next(queries)
+            return searches.search(client, query)
+
+        run_concurrently(next_search, 6)
+
+        assert len(client.calls) == 6
+        assert client.max_active == 2
+
+    def test_single_flight_releases_keys(self):
+        flight = SingleFlight()
+
+        assert flight.do("a", lambda: 1) == (1, False)
+        assert flight.do("a", lambda: 2) == (2, False)
+
+    def test_waiter_gives_up_at_its_own_timeout(self):
+        client, searches = FakeTavily(delay=0.5), SearchCache(path=None)
+        leader = threading.Thread(target=lambda: searches.search(client, "Lisbon", timeout=5))
+        leader.start()
+        time.sleep(0.05)
+
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            searches.search(client, "Lisbon", timeout=0.1)
+        waited = time.perf_counter() - start
+        leader.join()
+
+        assert waited < 0.3
+        assert len(client.calls) == 1
+        assert searches.search(client, "Lisbon")["results"]
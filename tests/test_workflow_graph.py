@@ -0,0 +1,450 @@
+import pytest
+import sys
+import os
+import time
+import asyncio
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("langgraph")
+
+import workflow
+import workflow_simple
+import deadlines
+from llm_backends import BackendRegistry, LLMRouter, MockBackend
+from result_cache import ResultCache
+from search_cache import SearchCache
+
+
+PREFERENCES = {"destination": "Lisbon", "budget": 900, "interests": ["food"], "dates": "2025-05-01 to 2025-05-02"}
+LATENCY = 0.3
+
+
+class StubTavily:
+    def search(self, query, **kwargs):
+        time.sleep(LATENCY)
+        return {"results": [{"content": f"Stub result for: {query}"}]}
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    registry = BackendRegistry()
+    registry.register(MockBackend())
+    router = LLMRouter(registry)
+    monkeypatch.setattr(workflow, "get_router", lambda: router)
+    monkeypatch.setattr(workflow, "tavily_client", StubTavily)
+    monkeypatch.setattr(workflow_simple, "tavily_client", StubTavily)
+    cache = ResultCache(path=None)
+    monkeypatch.setattr(workflow, "itinerary_cache", lambda: cache)
+    monkeypatch.setattr(workflow_simple, "itinerary_cache", lambda: cache)
+    # Searches are not cached here, so every plan pays the stubbed latency
+    searches = SearchCache(path=None, ttls={"attractions": 0, "weather": 0})
+    monkeypatch.setattr(workflow, "search_cache", lambda: searches)
+    monkeypatch.setattr(workflow_simple, "search_cache", lambda: searches)
+    # Load the token counter up front so it is not timed
+    workflow.build_prompt_request(PREFERENCES, "", 2)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+class TestParallelGraph:
+    def test_search_and_weather_overlap(self, stubbed):
+        sequential = workflow.build_workflow(parallel=False).compile()
+        parallel = workflow.build_workflow(parallel=True).compile()
+        state = {"preferences": PREFERENCES, "bypass_cache": True}
+
+        seq_result, seq_seconds = timed(lambda: sequential.invoke(state))
+        par_result, par_seconds = timed(lambda: parallel.invoke(state))
+
+        assert seq_seconds >= 2 * LATENCY
+        assert par_seconds < seq_seconds - LATENCY / 2
+        for result in (seq_result, par_result):
+            assert result["weather"].startswith("Stub result for: Weather")
+            assert result["destination_info"].startswith("Stub result for: Top attractions")
+            assert result["itinerary_json"]["itinerary"]["daily_plans"]
+
+    def test_stream_plan_looks_up_weather_concurrently(self, stubbed):
+        events, seconds = timed(lambda: list(workflow.stream_plan(PREFERENCES, bypass_cache=True)))
+
+        assert events[-1]["event"] == "done"
+        assert events[-1]["result"]["weather"].startswith("Stub result for: Weather")
+        assert seconds < 2 * LATENCY
+
+    def test_simple_workflow_matches(self, stubbed):
+        result, seconds = timed(lambda: workflow_simple.app.invoke({"preferences": PREFERENCES, "bypass_cache": True}))
+
+        assert result["weather"].startswith("Stub result for: Weather")
+        assert seconds < 2 * LATENCY
+
+
+def node_events(events):
+    """{node: [event, ...]} for the progress events in a stream"""
+    by_node = {}
+    for event in events:
+        if event["event"] in ("node_started", "node_finished"):
+            by_node.setdefault(event["node"], []).append(event)
+    return by_node
+
+
+class TestAsyncGraph:
+    def test_ainvoke_plans_concurrently(self, stubbed):
+        async def plan_all():
+            return await asyncio.gather(*[
+                workflow.app.ainvoke({"preferences": dict(PREFERENCES, destination=city), "bypass_cache": True})
+                for city in ("Lisbon", "Porto", "Madrid", "Seville")
+            ])
+
+        results, seconds = timed(lambda: asyncio.run(plan_all()))
+
+        # Four plans, each waiting 2 x LATENCY on search, overlap on one loop
+        assert seconds < 4 * LATENCY
+        assert [r["itinerary_json"]["itinerary"]["destination"] for r in results] == ["Lisbon", "Porto", "Madrid", "Seville"]
+        assert all(r["weather"].startswith("Stub result for: Weather") for r in results)
+
+    def test_astream_progress_reports_every_node(self, stubbed):
+        async def collect():
+            return [event async for event in workflow.astream_progress(PREFERENCES, bypass_cache=True)]
+
+        events = asyncio.run(collect())
+        by_node = node_events(events)
+
+        assert set(by_node) == {"gather_preferences", "fetch_info", "generate_itinerary", "check_weather"}
+        for pair in by_node.values():
+            assert [e["event"] for e in pair] == ["node_started", "node_finished"]
+            assert pair[1]["error"] is None
+        assert by_node["fetch_info"][1]["duration"] >= LATENCY
+        assert by_node["generate_itinerary"][1]["cache_hit"] is False
+        assert events[-1]["event"] == "done"
+        assert "cache_hit" not in events[-1]["result"]
+        assert events[-1]["result"]["itinerary_json"]["itinerary"]["daily_plans"]
+
+    def test_stream_progress_reports_cache_hit(self, stubbed):
+        list(workflow.stream_progress(PREFERENCES))
+        events = list(workflow.stream_progress(PREFERENCES))
+
+        assert node_events(events)["generate_itinerary"][1]["cache_hit"] is True
+
+    def test_repeat_plans_reuse_searches(self, stubbed, monkeypatch):
+        searches = SearchCache(path=None)
+        monkeypatch.setattr(workflow, "search_cache", lambda: searches)
+
+        first = node_events(workflow.stream_progress(PREFERENCES, bypass_cache=True))
+        second, seconds = timed(lambda: node_events(workflow.stream_progress(PREFERENCES, bypass_cache=True)))
+
+        assert first["fetch_info"][1]["cache_hit"] is False
+        assert second["fetch_info"][1]["cache_hit"] is True
+        assert second["check_weather"][1]["cache_hit"] is True
+        assert seconds < LATENCY
+
+    def test_stream_plan_interleaves_progress_and_days(self, stubbed):
+        events = list(workflow.stream_plan(PREFERENCES, bypass_cache=True))
+        kinds = [e["event"] for e in events]
+
+        assert kinds.index("node_finished") < kinds.index("day")
+        assert set(node_events(events)) == {"fetch_info", "generate_itinerary", "check_weather"}
+        assert kinds[-1] == "done"
+
+    def test_simple_workflow_streams_progress(self, stubbed):
+        async def collect():
+            return [event async for event in workflow_simple.astream_progress(PREFERENCES, bypass_cache=True)]
+
+        events = asyncio.run(collect())
+
+        assert node_events(events)["generate_itinerary"][1]["cache_hit"] is False
+        assert events[-1]["result"]["itinerary_json"]
+        assert asyncio.run(workflow_simple.app.ainvoke({"preferences": PREFERENCES}))["itinerary_json"]
+
+    def test_backend_streams_ndjson_events(self, stubbed):
+        from fastapi.testclient import TestClient
+        from backend.api_server import app as api
+
+        response = TestClient(api).post("/api/plan/stream", json={"preferences": PREFERENCES, "bypass_cache": True})
+        events = [json.loads(line) for line in response.text.splitlines()]
+
+        assert response.status_code == 200
+        assert events[0] == {"event": "node_started", "node": "gather_preferences"}
+        assert events[-1]["event"] == "done"
+        assert "bypass_cache" not in events[-1]["result"]
+
+
+class TestCheckpointedRuns:
+    @pytest.fixture
+    def llm_calls(self, stubbed, monkeypatch):
+        calls = []
+        complete = workflow.llm
+
+        def counting(*args, **kwargs):
+            calls.append(args[0])
+            return complete(*args, **kwargs)
+
+        monkeypatch.setattr(workflow, "llm", counting)
+        return calls
+
+    def test_resumes_after_the_last_completed_node(self, llm_calls, monkeypatch):
+        from run_checkpoints import RunCheckpointer
+
+        saver = RunCheckpointer(":memory:")
+        check_weather = workflow.check_weather
+
+        def weather_down(state):
+            raise RuntimeError("weather service down")
+
+        # The sequential graph runs check_weather after generation
+        monkeypatch.setattr(workflow, "check_weather", weather_down)
+        failing = workflow.build_workflow(parallel=False).compile(checkpointer=saver)
+        with pytest.raises(RuntimeError):
+            workflow.plan_run(PREFERENCES, run_id="trip-1", bypass_cache=True, graph=failing)
+        assert len(llm_calls) == 1
+
+        monkeypatch.setattr(workflow, "check_weather", check_weather)
+        restarted = workflow.build_workflow(parallel=False).compile(checkpointer=saver)
+        result = workflow.plan_run(PREFERENCES, run_id="trip-1", bypass_cache=True, graph=restarted)
+
+        assert len(llm_calls) == 1
+        assert result["run_id"] == "trip-1"
+        assert result["weather"].startswith("Stub result for: Weather")
+        assert result["itinerary_json"]["itinerary"]["daily_plans"]
+
+    def test_finished_run_returns_stored_result(self, llm_calls):
+        from run_checkpoints import RunCheckpointer
+
+        graph = workflow.checkpointed_app(RunCheckpointer(":memory:"))
+        first = workflow.plan_run(PREFERENCES, bypass_cache=True, graph=graph)
+        again, seconds = timed(lambda: workflow.plan_run(PREFERENCES, run_id=first["run_id"], graph=graph))
+
+        assert again == first
+        assert len(llm_calls) == 1
+        assert seconds < LATENCY
+
+    def test_async_resume(self, llm_calls, monkeypatch):
+        from run_checkpoints import RunCheckpointer
+
+        saver = RunCheckpointer(":memory:")
+        fetch = workflow.fetch_destination_info
+        calls = []
+
+        def flaky_fetch(state):
+            calls.append(state)
+            if len(calls) == 1:
+                raise ConnectionError("connection reset")
+            return fetch(state)
+
+        monkeypatch.setattr(workflow, "fetch_destination_info", flaky_fetch)
+        graph = workflow.checkpointed_app(saver)
+        with pytest.raises(ConnectionError):
+            asyncio.run(workflow.aplan_run(PREFERENCES, run_id="trip-2", bypass_cache=True, graph=graph))
+        result = asyncio.run(workflow.aplan_run(PREFERENCES, run_id="trip-2", graph=graph))
+
+        assert len(calls) == 2
+        assert len(llm_calls) == 1
+        assert result["destination_info"].startswith("Stub result for: Top attractions")
+
+
+class TestDeadlines:
+    @pytest.fixture
+    def searches(self, stubbed, monkeypatch):
+        calls = []
+
+        class RecordingTavily(StubTavily):
+            def search(self, query, **kwargs):
+                calls.append(kwargs)
+                return super().search(query, **kwargs)
+
+        monkeypatch.setattr(workflow, "tavily_client", RecordingTavily)
+        monkeypatch.setattr(workflow_simple, "tavily_client", RecordingTavily)
+        return calls
+
+    def test_short_budget_degrades_instead_of_waiting(self, searches):
+        result, seconds = timed(lambda: workflow.app.invoke(
+            {"preferences": PREFERENCES, "bypass_cache": True},
+            deadlines.plan_config(1.5)
+        ))
+
+        # Only the destination search ran, as a basic search bounded by the budget
+        assert [kwargs["search_depth"] for kwargs in searches] == ["basic"]
+        assert 0 < searches[0]["timeout"] <= 1.5
+        assert result["weather"].startswith("Weather information unavailable")
+        assert "time budget" in result["errors"][0]
+        assert result["itinerary_json"]["itinerary"]["daily_plans"]
+        assert seconds < 1.5
+
+    def test_no_budget_keeps_the_full_plan(self, searches):
+        result = workflow.app.invoke({"preferences": PREFERENCES, "bypass_cache": True}, deadlines.plan_config(0))
+
+        assert sorted(kwargs.get("search_depth", "") for kwargs in searches) == ["", "advanced"]
+        assert all("timeout" not in kwargs for kwargs in searches)
+        assert result["errors"] == []
+
+    def test_stream_plan_stops_generation_at_the_deadline(self, searches, monkeypatch):
+        class SlowMock(MockBackend):
+            def stream(self, prompt, system_prompt=None, max_new_tokens=None):
+                for chunk in super().stream(prompt, system_prompt, max_new_tokens):
+                    time.sleep(0.02)
+                    yield chunk
+
+        registry = BackendRegistry()
+        registry.register(SlowMock(), max_concurrency=1)
+        router = LLMRouter(registry)
+        monkeypatch.setattr(workflow, "get_router", lambda: router)
+        monkeypatch.setattr(workflow, "MIN_GENERATION_SECONDS", 0.1)
+
+        events, seconds = timed(lambda: list(workflow.stream_plan(PREFERENCES, bypass_cache=True, sla_seconds=1.0)))
+        result = events[-1]["result"]
+
+        assert seconds < 1.5
+        assert "Time budget of 1s ran out" in result["errors"][0]
+        assert result["itinerary_json"]["itinerary"]["daily_plans"]
+        # The abandoned stream gave its concurrency slot back
+        assert registry.slot("mock").acquire(blocking=False)
+
+    def test_simple_workflow_takes_the_deadline_from_config(self, searches):
+        result = workflow_simple.app.invoke(
+            {"preferences": PREFERENCES, "bypass_cache": True},
+            deadlines.plan_config(1.5)
+        )
+
+        assert [kwargs["search_depth"] for kwargs in searches] == ["basic"]
+        assert result["weather"].startswith("Weather information unavailable")
+        assert "time budget" in result["errors"][0]
+
+    def test_resumed_run_gets_a_fresh_budget(self, stubbed, monkeypatch):
+        from run_checkpoints import RunCheckpointer
+
+        saver = RunCheckpointer(":memory:")
+        check_weather = workflow.check_weather
+
+        def weather_down(state):
+            raise RuntimeError("weather service down")
+
+        monkeypatch.setattr(workflow, "check_weather", weather_down)
+        failing = workflow.build_workflow(parallel=False).compile(checkpointer=saver)
+        with pytest.raises(RuntimeError):
+            workflow.plan_run(PREFERENCES, run_id="trip-2", bypass_cache=True, graph=failing, sla_seconds=60)
+
+        monkeypatch.setattr(workflow, "check_weather", check_weather)
+        restarted = workflow.build_workflow(parallel=False).compile(checkpointer=saver)
+        result = workflow.plan_run(PREFERENCES, run_id="trip-2", graph=restarted, sla_seconds=60)
+
+        assert result["weather"].startswith("Stub result for: Weather")
+        assert "deadline" not in result
+
+
+class TestHedgedGeneration:
+    def test_schema_valid_itinerary_wins_the_race(self, stubbed, monkeypatch):
+        class Garbled(MockBackend):
+            name, degraded = "garbled", False
+
+            def generate(self, prompt, system_prompt=None, max_new_tokens=None):
+                return '{"itinerary": "not really"}'
+
+        class SlowValid(MockBackend):
+            name, degraded = "slow_valid", False
+
+            def generate(self, prompt, system_prompt=None, max_new_tokens=None):
+                time.sleep(0.2)
+                return super().generate(prompt, system_prompt, max_new_tokens)
+
+        registry = BackendRegistry()
+        registry.register(SlowValid())
+        registry.register(Garbled())
+        router = LLMRouter(registry, hedge_after=0.05)
+        monkeypatch.setattr(workflow, "get_router", lambda: router)
+
+        result = workflow.app.invoke({"preferences": PREFERENCES, "bypass_cache": True, "generation_mode": "single"})
+
+        assert result["errors"] == []
+        assert router.stats()["garbled"]["calls"] == 1
+        assert result["itinerary_json"]["itinerary"]["daily_plans"]
+
+
+class TestIncrementalRegeneration:
+    TRIP = dict(PREFERENCES, interests=["food", "art", "history"], dates="2025-05-01 to 2025-05-05")
+    EDITED = dict(TRIP, budget=1500, interests=["food", "art", "history", "nature"])
+
+    @pytest.fixture
+    def llm_calls(self, stubbed, monkeypatch):
+        calls = []
+
+        def counting(module):
+            complete = module.llm
+
+            def llm(*args, **kwargs):
+                calls.append(args[0])
+                return complete(*args, **kwargs)
+            return llm
+
+        monkeypatch.setattr(workflow, "llm", counting(workflow))
+        monkeypatch.setattr(workflow_simple, "llm", counting(workflow_simple))
+        return calls
+
+    @pytest.mark.parametrize("module", [workflow, workflow_simple], ids=["langgraph", "simple"])
+    def test_edit_regenerates_only_the_affected_day(self, llm_calls, module):
+        first = module.app.invoke({"preferences": self.TRIP, "bypass_cache": True, "generation_mode": "per_day"})
+        assert len(llm_calls) == 5
+
+        updated = module.app.invoke({
+            "preferences": self.EDITED,
+            "bypass_cache": True,
+            "previous_preferences": self.TRIP,
+            "previous_itinerary": first["itinerary_json"]
+        })
+
+        assert len(llm_calls) == 6 and "nature" in llm_calls[-1]
+        plans = updated["itinerary_json"]["itinerary"]["daily_plans"]
+        assert updated["errors"] == []
+        assert [p["title"] for p in plans[0]["activities"]] == [p["title"] for p in first["itinerary_json"]["itinerary"]["daily_plans"][0]["activities"]]
+        assert updated["itinerary_json"]["itinerary"]["total_estimated_cost"] == sum(p["estimated_daily_cost"] for p in plans)
+
+    def test_backend_accepts_the_previous_plan(self, llm_calls):
+        from fastapi.testclient import TestClient
+        from backend.api_server import app as api
+
+        first = TestClient(api).post("/api/plan", json={"preferences": self.TRIP, "bypass_cache": True}).json()
+        calls = len(llm_calls)
+        response = TestClient(api).post("/api/plan", json={
+            "preferences": dict(self.TRIP, budget=2000),
+            "bypass_cache": True,
+            "previous_preferences": self.TRIP,
+            "previous_itinerary": first["itinerary_json"]
+        })
+
+        assert response.status_code == 200
+        assert len(llm_calls) == calls
+        assert "previous_itinerary" not in response.json()
+        assert response.json()["itinerary_json"]["itinerary"]["total_estimated_cost"] == 2000
+
+
+class TestTruncatedOutput:
+    class CutOff(MockBackend):
+        name, degraded = "cut_off", False
+
+        def generate(self, prompt, system_prompt=None, max_new_tokens=None):
+            text = super().generate(prompt, system_prompt, max_new_tokens)
+            return text[:text.index('"day": 2')]
+
+    def test_cut_off_itinerary_is_repaired_not_replaced(self, stubbed, monkeypatch):
+        registry = BackendRegistry()
+        registry.register(self.CutOff())
+        router = LLMRouter(registry)
+        monkeypatch.setattr(workflow, "get_router", lambda: router)
+
+        result = workflow.app.invoke({"preferences": PREFERENCES, "bypass_cache": True, "generation_mode": "single"})
+
+        plans = result["itinerary_json"]["itinerary"]["daily_plans"]
+        assert [p["day"] for p in plans] == [1]
+        assert "cut off and repaired" in result["errors"][0]
+        assert result["itinerary_json"]["human_readable"]
+
+    def test_simple_workflow_repairs_too(self):
+        state = workflow_simple.TravelPlanState(PREFERENCES)
+        text = workflow_simple.llm("Plan a trip to Lisbon from 2025-05-01 to 2025-05-02")
+
+        workflow_simple.apply_llm_output(state, text[:text.index('"day": 2')], 2)
+
+        assert len(state.itinerary_json["itinerary"]["daily_plans"]) == 1
+        assert state.errors and "repaired" in state.errors[0]
@@ -2,8 +2,11 @@
 TripCraft Configuration Module
 Centralizes system prompts and JSON schemas for itinerary generation
 """
-import json
-from typing import Dict, Any
+import hashlib
+from typing import Dict, Any, List
+
+from json_stream import extract_json
+from schema_validator import SchemaError, compile_schema
 
 TRIPCRAFT_SYSTEM_PROMPT = """You are **TripCraft**, a professional travel itinerary assistant.
 
@@ -83,13 +86,53 @@ You MUST respond with a JSON object following this exact schema:
 - Safety: Always include relevant safety considerations
 """
 
+# Every itinerary prompt starts with this exact text, so backends can cache its encoding
+ITINERARY_PROMPT_PREFIX = f"""{TRIPCRAFT_SYSTEM_PROMPT}
+
+## User Request
+
+"""
+
+# Same contract as the full system prompt in a fraction of the tokens: one line
+# of rules and a type sketch of the schema instead of a commented example
+COMPACT_ITINERARY_SCHEMA = """{"itinerary":{"destination":str,"start_date":"YYYY-MM-DD","end_date":"YYYY-MM-DD","timezone":str,"currency":str,
+"daily_plans":[{"day":int,"date":"YYYY-MM-DD","summary":str,
+"activities":[{"start_time":"HH:MM","end_time":"HH:MM","title":str,"type":str,"address":str,"notes":str,
+"transportation":{"mode":str,"duration_min":int,"est_cost":num}}],
+"meals":[{"time":"HH:MM","suggestion":str,"est_cost":num}],"estimated_daily_cost":num}],
+"total_estimated_cost":num,"assumptions":[str],"packing_list":[str],"safety_notes":[str]},
+"human_readable":str}"""
+
+COMPACT_ITINERARY_PROMPT_PREFIX = f"""You are TripCraft, a travel itinerary assistant. Plan realistic days: real opening hours, 15-30 min travel buffers, costs in local currency, safety notes.
+Respond with one JSON object of this shape (str/int/num are value types):
+{COMPACT_ITINERARY_SCHEMA}
+
+## User Request
+
+"""
+
+# Itinerary prompt prefixes by schema variant
+ITINERARY_PROMPT_PREFIXES = {
+    "full": ITINERARY_PROMPT_PREFIX,
+    "compact": COMPACT_ITINERARY_PROMPT_PREFIX,
+}
+
+
+def prompt_version(schema_variant: str = "full") -> str:
+    """Bump when build_itinerary_prompt changes; the prefix hash tracks system prompt edits"""
+    prefix = ITINERARY_PROMPT_PREFIXES[schema_variant]
+    return "itinerary-v1-" + hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:12]
+
+
+PROMPT_VERSION = prompt_version("full")
+
 ITINERARY_JSON_SCHEMA = {
     "type": "object",
     "required": ["itinerary", "human_readable"],
     "properties": {
         "itinerary": {
             "type": "object",
-            "required": ["destination", "start_date", "end_date", "daily_plans"],
+            "required": ["destination", "start_date", "end_date", "daily_plans", "total_estimated_cost"],
             "properties": {
                 "destination": {"type": "string"},
                 "start_date": {"type": "string", "format": "date"},
@@ -116,12 +159,33 @@ ITINERARY_JSON_SCHEMA = {
                                         "title": {"type": "string"},
                                         "type": {"type": "string"},
                                         "address": {"type": "string"},
+                                        "transportation": {
+                                            "type": "object",
+                                            "properties": {
+                                                "from": {"type": "string"},
+                                                "mode": {"type": "string"},
+                                                "duration_min": {"type": "number"},
+                                                "est_cost": {"type": "number"}
+                                            }
+                                        },
                                         "notes": {"type": "string"},
                                         "booking_info": {"type": "string"}
                                     }
                                 }
                             },
-                            "meals": {"type": "array"},
+                            "meals": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "required": ["time", "suggestion"],
+                                    "properties": {
+                                        "time": {"type": "string"},
+                                        "suggestion": {"type": "string"},
+                                        "est_cost": {"type": "number"},
+                                        "dietary_notes": {"type": "string"}
+                                    }
+                                }
+                            },
                             "estimated_daily_cost": {"type": "number"},
                             "alternative_options": {"type": "array"}
                         }
@@ -163,9 +227,26 @@ EDIT_DELTA_SCHEMA = {
     }
 }
 
+# Compiled once at import; cheap enough to run on every generation and edit
+ITINERARY_VALIDATOR = compile_schema(ITINERARY_JSON_SCHEMA)
+DAY_PLAN_VALIDATOR = compile_schema(
+    ITINERARY_JSON_SCHEMA["properties"]["itinerary"]["properties"]["daily_plans"]["items"]
+)
+# Supabase stores the inner "itinerary" object, without human_readable
+STORED_ITINERARY_VALIDATOR = compile_schema(ITINERARY_JSON_SCHEMA["properties"]["itinerary"])
 
-def build_itinerary_prompt(preferences: Dict[str, Any], destination_info: str, num_days: int) -> str:
-    """Build a comprehensive prompt for itinerary generation"""
+
+def build_itinerary_prompt(
+    preferences: Dict[str, Any],
+    destination_info: str,
+    num_days: int,
+    schema_variant: str = "full"
+) -> str:
+    """Build a comprehensive prompt for itinerary generation
+
+    schema_variant picks the system prompt: "full" (annotated example) or
+    "compact" (type sketch, far fewer tokens).
+    """
 
     destination = preferences.get('destination', 'Unknown')
     budget = preferences.get('budget', 'Not specified')
@@ -174,11 +255,7 @@ def build_itinerary_prompt(preferences: Dict[str, Any], destination_info: str, n
 
     interests_str = ', '.join(interests) if isinstance(interests, list) else str(interests)
 
-    prompt = f"""{TRIPCRAFT_SYSTEM_PROMPT}
-
-## User Request
-
-Generate a {num_days}-day itinerary for:
+    prompt = f"""{ITINERARY_PROMPT_PREFIXES[schema_variant]}Generate a {num_days}-day itinerary for:
 - **Destination**: {destination}
 - **Dates**: {dates}
 - **Budget**: ${budget}
@@ -205,6 +282,98 @@ Return ONLY valid JSON matching the schema. Do not include markdown code fences
     return prompt
 
 
+DAY_PLAN_SCHEMA_EXAMPLE = """{
+  "day": 1,
+  "date": "YYYY-MM-DD",
+  "summary": "Brief day overview",
+  "activities": [
+    {
+      "start_time": "HH:MM",
+      "end_time": "HH:MM",
+      "title": "Activity Name",
+      "type": "category",
+      "address": "Full address",
+      "transportation": {"from": "previous location", "mode": "transport type", "duration_min": 30, "est_cost": 10},
+      "notes": "Important details, tips, or warnings"
+    }
+  ],
+  "meals": [
+    {"time": "HH:MM", "suggestion": "Restaurant name and dish type", "est_cost": 50}
+  ],
+  "estimated_daily_cost": 200,
+  "alternative_options": ["Backup plan for weather/closures"]
+}"""
+
+
+def build_day_prompt(
+    preferences: Dict[str, Any],
+    destination_info: str,
+    day: int,
+    date: str,
+    theme: str,
+    daily_budget: Any,
+    num_days: int
+) -> str:
+    """Build a prompt for a single day of a trip, used when days are generated in parallel"""
+
+    destination = preferences.get('destination', 'Unknown')
+
+    prompt = f"""You are **TripCraft**, a professional travel itinerary assistant.
+
+Plan day {day} of a {num_days}-day trip.
+
+- **Destination**: {destination}
+- **Dates**: {date} to {date}
+- **Day Theme**: {theme}
+- **Budget**: ${daily_budget} for this day
+
+## Available Information
+{destination_info}
+
+Respond with ONE JSON object for this day only, following this schema:
+
+{DAY_PLAN_SCHEMA_EXAMPLE}
+
+Use "day": {day} and "date": "{date}". Return ONLY valid JSON. Do not include markdown code fences or explanations.
+"""
+
+    return prompt
+
+
+# Approximate decode cost (tokens) of the itinerary JSON parts, with headroom for verbose days
+ITINERARY_ENVELOPE_TOKENS = 300
+DAY_OVERHEAD_TOKENS = 160
+ACTIVITY_TOKENS = 120
+TOKEN_BUDGET_MARGIN = 1.25
+MIN_TOKEN_BUDGET = 256
+PACE_ACTIVITIES = {"relaxed": 3, "moderate": 4, "packed": 6}
+
+
+def activities_per_day(preferences: Dict[str, Any]) -> int:
+    """Expected activity density: explicit, from a pace, or one per interest (3-6)"""
+    if preferences.get('activities_per_day'):
+        return int(preferences['activities_per_day'])
+    pace = str(preferences.get('pace', '')).lower()
+    if pace in PACE_ACTIVITIES:
+        return PACE_ACTIVITIES[pace]
+    interests = preferences.get('interests') or []
+    if isinstance(interests, str):
+        interests = [i for i in interests.split(',') if i.strip()]
+    return max(3, min(6, len(interests) + 2))
+
+
+def day_token_budget(activities: int = 4) -> int:
+    """max_new_tokens for a single day plan (build_day_prompt)"""
+    tokens = DAY_OVERHEAD_TOKENS + activities * ACTIVITY_TOKENS
+    return max(MIN_TOKEN_BUDGET, int(tokens * TOKEN_BUDGET_MARGIN))
+
+
+def itinerary_token_budget(num_days: int, activities: int = 4) -> int:
+    """max_new_tokens for a whole-trip itinerary (build_itinerary_prompt)"""
+    tokens = ITINERARY_ENVELOPE_TOKENS + max(1, num_days) * (DAY_OVERHEAD_TOKENS + activities * ACTIVITY_TOKENS)
+    return max(MIN_TOKEN_BUDGET, int(tokens * TOKEN_BUDGET_MARGIN))
+
+
 def build_edit_prompt(message: str, current_itinerary: Dict[str, Any]) -> str:
     """Build prompt for conversational editing"""
 
@@ -249,56 +418,73 @@ Return JSON in this format:
 
 
 def validate_itinerary_json(data: Any) -> bool:
-    """Validate itinerary JSON against schema"""
+    """Validate itinerary JSON against schema, at every level"""
+    return ITINERARY_VALIDATOR.is_valid(data)
+
+
+def itinerary_schema_errors(data: Any) -> List[SchemaError]:
+    """Where and how data breaks ITINERARY_JSON_SCHEMA; empty when valid"""
+    return ITINERARY_VALIDATOR.errors(data)
+
+
+def edit_schema_errors(before: Any, after: Any) -> List[SchemaError]:
+    """Schema errors an edit introduced into a stored itinerary; ones it already had are ignored"""
+    existing = {str(error) for error in STORED_ITINERARY_VALIDATOR.errors(before)}
+    return [error for error in STORED_ITINERARY_VALIDATOR.errors(after) if str(error) not in existing]
+
+
+def complete_truncated_itinerary(data: Any, destination: str = "Unknown") -> Any:
+    """Fill the top-level fields a repaired, cut-off itinerary lost, from the days it kept"""
+    if not isinstance(data, dict) or not isinstance(data.get("itinerary"), dict):
+        return data
+    itinerary = data["itinerary"]
+    plans = itinerary.setdefault("daily_plans", [])
+    if not isinstance(plans, list):
+        return data
+    dates = [plan["date"] for plan in plans if isinstance(plan, dict) and plan.get("date")]
+    itinerary.setdefault("destination", destination)
+    itinerary.setdefault("start_date", dates[0] if dates else "")
+    itinerary.setdefault("end_date", dates[-1] if dates else "")
+    itinerary.setdefault(
+        "total_estimated_cost",
+        sum(plan.get("estimated_daily_cost", 0) for plan in plans if isinstance(plan, dict)
+            and isinstance(plan.get("estimated_daily_cost", 0), (int, float)))
+    )
+    data.setdefault(
+        "human_readable",
+        f"{len(plans)}-day itinerary for {itinerary['destination']}; generation was cut off, so it may be incomplete."
+    )
+    return data
+
+
+def extract_json_from_text(text: str, repair: bool = False) -> Dict[str, Any]:
+    """Extract JSON from text that may contain markdown or extra text
+
+    The first top-level object is found in one scan (json_stream.extract_json);
+    with repair=True output cut off mid-object is closed instead of rejected.
+    """
     try:
-        if not isinstance(data, dict):
-            return False
-
-        if 'itinerary' not in data or 'human_readable' not in data:
-            return False
-
-        itinerary = data['itinerary']
-        required_fields = ['destination', 'start_date', 'end_date', 'daily_plans']
+        return extract_json(text, repair=repair).value
+    except ValueError as e:
+        raise ValueError(f"Could not extract valid JSON from text: {e}") from e
 
-        for field in required_fields:
-            if field not in itinerary:
-                return False
 
-        if not isinstance(itinerary['daily_plans'], list):
-            return False
+_env_loaded = False
 
-        return True
-    except Exception:
-        return False
 
+def load_env():
+    """Load .env into the environment once (python-dotenv is optional)
 
-def extract_json_from_text(text: str) -> Dict[str, Any]:
-    """Extract JSON from text that may contain markdown or extra text"""
-    import re
-
-    text = text.strip()
-
-    json_match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
-    if json_match:
-        text = json_match.group(1)
-
-    text = re.sub(r'^```.*?\n', '', text, flags=re.MULTILINE)
-    text = re.sub(r'\n```$', '', text)
-
-    text = text.strip()
-
-    if text.startswith('{') or text.startswith('['):
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-    start = text.find('{')
-    end = text.rfind('}')
-    if start != -1 and end != -1 and end > start:
-        try:
-            return json.loads(text[start:end+1])
-        except json.JSONDecodeError:
-            pass
-
-    raise ValueError("Could not extract valid JSON from text")
+    Called by the accessors that read their configuration on first use, so
+    importing the workflows has no side effects; entry points call it first
+    thing so import-time settings see .env too.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
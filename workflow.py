@@ -1,42 +1,72 @@
-from langgraph.graph import StateGraph, END
-from tavily import TavilyClient
-from typing import TypedDict, Dict, Any
+"""
+Travel planning workflow on LangGraph
+
+Importing this module has no side effects: the graph (and langgraph itself),
+the LLM router and the Tavily client are all built on first use.
+"""
+from typing import TYPE_CHECKING, TypedDict, Dict, Any, Iterator, AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import asyncio
+import contextvars
 import os
 import json
-from dotenv import load_dotenv
-
-# Try to import real LLM, fallback to mock
-try:
-    from llm import llm
-    print("✅ Using real LLM (transformers/OpenAI)")
-except (ImportError, ModuleNotFoundError):
-    from llm_mock import llm
-    print("✅ Using mock LLM (transformers not available)")
+import threading
+import time
+import uuid
+
+from llm_backends import get_router
 from tripcraft_config import (
-    build_itinerary_prompt,
     validate_itinerary_json,
-    extract_json_from_text
-)  # our TinyLlama-based LLM function
-
-# Load environment variables
-try:
-    load_dotenv()
-except:
-    pass
-
-# Tavily API client (optional)
-tavily_key = os.getenv("TAVILY_API_KEY")
-if tavily_key:
-    try:
-        tavily = TavilyClient(api_key=tavily_key)
-        print("✅ Tavily search enabled")
-    except Exception as e:
-        tavily = None
-        print(f"⚠️  Tavily unavailable: {e}")
-else:
-    tavily = None
-    print("⚠️  Tavily API key not set (search disabled)")
+    itinerary_schema_errors,
+    complete_truncated_itinerary,
+    activities_per_day,
+    day_token_budget,
+    itinerary_token_budget
+)
+from json_stream import DailyPlanStreamParser, extract_json
+from schema_validator import summarize_errors
+from prompt_builder import active_token_counter, build_budgeted_itinerary_prompt
+from result_cache import itinerary_cache, itinerary_cache_key
+from search_cache import search_cache, tavily_client, attractions_query, weather_query
+from day_planner import plan_itinerary_by_day, replan_itinerary_by_day, use_per_day_generation
+from progress_events import node_started, node_finished, timed_call
+from metrics import FALLBACK_ITINERARIES, DEADLINE_DEGRADATIONS
+from deadlines import (
+    DeadlineExceeded,
+    MIN_ADVANCED_SEARCH_SECONDS,
+    MIN_GENERATION_SECONDS,
+    MIN_SEARCH_SECONDS,
+    MIN_WEATHER_SECONDS,
+    config_deadline,
+    current_deadline,
+    deadline_context,
+    deadline_for,
+    deadline_scope,
+    plan_config
+)
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph
+
+
+# OpenAI, a local model server, TinyLlama and the mock behind one router
+# (get_router) that picks a backend per call and fails over on errors
+def llm(*args, **kwargs) -> str:
+    return get_router().complete(*args, **kwargs)
+
+
+def llm_stream(*args, **kwargs) -> Iterator[str]:
+    return get_router().stream(*args, **kwargs)
+
+
+def preload_llm():
+    """Start loading the primary backend in the background"""
+    router = get_router()
+    print(f"✅ LLM backends: {', '.join(router.registry.names())} (primary: {router.model_version})")
+    return router.preload()
+
 
 class TravelPlanState(TypedDict):
     preferences: dict
@@ -45,6 +75,12 @@ class TravelPlanState(TypedDict):
     itinerary_json: dict
     weather: str
     errors: list
+    prompt_stats: dict
+    bypass_cache: bool
+    generation_mode: str
+    # An earlier plan and its preferences: only the days the change affects are regenerated
+    previous_preferences: dict
+    previous_itinerary: dict
 
 
 # Step 1: Gather preferences
@@ -59,11 +95,27 @@ def fetch_destination_info(state: TravelPlanState):
     if not dest:
         return {"destination_info": "Destination not specified."}
 
-    # Try Tavily if available
-    if tavily:
+    # Try Tavily if available and there is time for it; a short budget gets a basic search
+    deadline = current_deadline()
+    tavily = tavily_client()
+    if tavily and not deadline.allows(MIN_SEARCH_SECONDS):
+        print(f"⏱️  Skipping destination search: {deadline.remaining():.1f}s left")
+        DEADLINE_DEGRADATIONS.inc(node="fetch_info", action="skipped")
+    elif tavily:
+        depth = "advanced"
+        if not deadline.allows(MIN_ADVANCED_SEARCH_SECONDS):
+            depth = "basic"
+            DEADLINE_DEGRADATIONS.inc(node="fetch_info", action="basic_search")
         try:
-            query = f"Top attractions and activities in {dest} for {interests}"
-            info = tavily.search(query=query, max_results=3, search_depth="advanced")
+            searches = search_cache()
+            info = searches.search(
+                tavily,
+                attractions_query(dest, interests),
+                kind="attractions",
+                timeout=deadline.timeout(),
+                max_results=3,
+                search_depth=depth
+            )
 
             results = info.get("results", [])
             if results:
@@ -74,14 +126,8 @@ def fetch_destination_info(state: TravelPlanState):
                     if content:
                         snippets.append(content.strip())
 
-                combined_info = " ".join(snippets)
-                if len(combined_info) > 500:
-                    combined_info = combined_info[:500]
-                    last_space = combined_info.rfind(" ")
-                    if last_space != -1:
-                        combined_info = combined_info[:last_space] + "…"
-
-                return {"destination_info": combined_info}
+                # Kept whole; the prompt builder packs it to a token budget
+                return {"destination_info": "\n\n".join(snippets), "cache_hit": searches.last_hit()}
         except Exception as e:
             print(f"⚠️  Tavily search failed: {e}")
 
@@ -93,66 +139,241 @@ def fetch_destination_info(state: TravelPlanState):
 
 
 
-def generate_itinerary(state: TravelPlanState):
-    """Generate itinerary using TripCraft JSON format"""
-    dates = state['preferences'].get('dates', "")
+def count_trip_days(preferences: Dict[str, Any]) -> int:
+    """Number of days covered by the 'YYYY-MM-DD to YYYY-MM-DD' dates preference"""
+    dates = preferences.get('dates', "")
     try:
         start_date, end_date = dates.split(" to ")
         start = datetime.strptime(start_date, "%Y-%m-%d")
         end = datetime.strptime(end_date, "%Y-%m-%d")
-        num_days = (end - start).days + 1
+        return (end - start).days + 1
     except (ValueError, AttributeError):
-        num_days = 5
-
-    prompt = build_itinerary_prompt(
-        preferences=state['preferences'],
-        destination_info=state['destination_info'],
-        num_days=num_days
-    )
-
-    try:
-        raw_output = llm(prompt, return_json=True)
+        return 5
 
-        try:
-            itinerary_data = json.loads(raw_output)
-        except json.JSONDecodeError:
-            itinerary_data = extract_json_from_text(raw_output)
 
-        if not validate_itinerary_json(itinerary_data):
-            fallback_itinerary = create_fallback_itinerary(
-                state['preferences'],
-                num_days,
-                raw_output
-            )
-            return {
-                "itinerary": format_itinerary_as_markdown(fallback_itinerary),
-                "itinerary_json": fallback_itinerary,
-                "errors": ["Generated itinerary did not match schema, using fallback"]
-            }
+def parse_itinerary_output(raw_output: str) -> Any:
+    return extract_json(raw_output, repair=False).value
 
-        markdown_output = format_itinerary_as_markdown(itinerary_data)
 
-        return {
-            "itinerary": markdown_output,
-            "itinerary_json": itinerary_data,
-            "errors": []
-        }
-
-    except Exception as e:
+def is_valid_itinerary_output(raw_output: str) -> bool:
+    """Whether raw LLM output holds a complete, schema-valid itinerary (decides hedged races)"""
+    try:
+        return validate_itinerary_json(parse_itinerary_output(raw_output))
+    except Exception:
+        return False
+
+
+def itinerary_from_output(raw_output: str, preferences: Dict[str, Any], num_days: int) -> Dict[str, Any]:
+    """Parse and validate raw LLM output into the generate_itinerary state update
+
+    Output cut off mid-JSON is repaired and keeps the days that were
+    generated; the repair is reported in errors, so it is not cached.
+    """
+    extraction = extract_json(raw_output, repair=True)
+    itinerary_data = extraction.value
+    errors = []
+    if extraction.repaired:
+        itinerary_data = complete_truncated_itinerary(itinerary_data, preferences.get("destination", "Unknown"))
+        errors.append(f"Generated itinerary was cut off and repaired ({'; '.join(extraction.repairs)})")
+
+    # A repair that kept no day is no better than the fallback
+    schema_errors = itinerary_schema_errors(itinerary_data)
+    if schema_errors or (extraction.repaired and not itinerary_data["itinerary"]["daily_plans"]):
+        reason = f" ({summarize_errors(schema_errors)})" if schema_errors else ""
         fallback_itinerary = create_fallback_itinerary(
-            state['preferences'],
+            preferences,
             num_days,
-            str(e)
+            raw_output
         )
         return {
             "itinerary": format_itinerary_as_markdown(fallback_itinerary),
             "itinerary_json": fallback_itinerary,
-            "errors": [f"Error generating itinerary: {str(e)}"]
+            "errors": [f"Generated itinerary did not match schema, using fallback{reason}"]
         }
 
+    return {
+        "itinerary": format_itinerary_as_markdown(itinerary_data),
+        "itinerary_json": itinerary_data,
+        "errors": errors
+    }
+
+
+def fallback_result(preferences: Dict[str, Any], num_days: int, error: Exception) -> Dict[str, Any]:
+    """State update used when generation raised"""
+    fallback_itinerary = create_fallback_itinerary(
+        preferences,
+        num_days,
+        str(error)
+    )
+    return {
+        "itinerary": format_itinerary_as_markdown(fallback_itinerary),
+        "itinerary_json": fallback_itinerary,
+        "errors": [f"Error generating itinerary: {str(error)}"]
+    }
+
+
+def build_prompt_request(preferences: Dict[str, Any], destination_info: str, num_days: int) -> Dict[str, Any]:
+    """Token-budgeted itinerary prompt, measured with the primary backend's tokenizer"""
+    primary = get_router().primary()
+    request = build_budgeted_itinerary_prompt(
+        preferences,
+        destination_info,
+        num_days,
+        counter=active_token_counter(primary.name, primary.degraded) if primary else active_token_counter()
+    )
+    stats = request["prompt_stats"]
+    print(
+        f"🧮 Prompt: {stats['prompt_tokens']} tokens ({stats['schema_variant']} schema, "
+        f"context {stats['context_tokens']}/{stats['context_budget']}, {stats['tokenizer']})"
+    )
+    return request
+
+
+def check_generation_time(deadline):
+    """Raise DeadlineExceeded when generation is not expected to finish in the time left"""
+    expected = get_router().expected_latency() or MIN_GENERATION_SECONDS
+    if not deadline.allows(expected):
+        DEADLINE_DEGRADATIONS.inc(node="generate_itinerary", action="fallback")
+        raise DeadlineExceeded(
+            f"{deadline.remaining():.1f}s left of the time budget, generation needs about {expected:.1f}s"
+        )
+
+
+def generate_itinerary(state: TravelPlanState):
+    """Generate itinerary using TripCraft JSON format"""
+    num_days = count_trip_days(state['preferences'])
+
+    request = build_prompt_request(state['preferences'], state['destination_info'], num_days)
+    prompt = request["prompt"]
+
+    cache = itinerary_cache()
+    model_version = get_router().model_version
+    cache_key = itinerary_cache_key(state['preferences'], state['destination_info'], model_version, request["prompt_version"])
+    # Versions of the backends that actually answered; failover may change them
+    served = set()
+    activities = activities_per_day(state['preferences'])
+
+    deadline = current_deadline()
+
+    def generate(text: str, max_new_tokens: int, accept: Callable[[str], bool] = None) -> str:
+        # Per-day prompts run on their own threads, which do not inherit the scope
+        with deadline_scope(deadline):
+            output = llm(text, return_json=True, max_new_tokens=max_new_tokens, accept=accept)
+        served.add(get_router().last_served().model_version)
+        return output
+
+    cache_hit = False
+    try:
+        raw_output = None if state.get('bypass_cache') else cache.get(cache_key)
+        cache_hit = raw_output is not None
+        if not cache_hit:
+            check_generation_time(deadline)
+        if not cache_hit and state.get('previous_itinerary') and state.get('previous_preferences'):
+            updated = replan_itinerary_by_day(
+                state['previous_itinerary'],
+                state['previous_preferences'],
+                state['preferences'],
+                request["context"],
+                num_days,
+                generate=lambda day_prompt: generate(day_prompt, day_token_budget(activities))
+            )
+            raw_output = json.dumps(updated) if updated else None
+        if raw_output is None and use_per_day_generation(num_days, state.get('generation_mode')):
+            raw_output = json.dumps(plan_itinerary_by_day(
+                state['preferences'],
+                request["context"],
+                num_days,
+                generate=lambda day_prompt: generate(day_prompt, day_token_budget(activities))
+            ))
+        elif raw_output is None:
+            # With hedging on, only a schema-valid itinerary wins the race
+            raw_output = generate(prompt, itinerary_token_budget(num_days, activities), accept=is_valid_itinerary_output)
+
+        result = itinerary_from_output(raw_output, state['preferences'], num_days)
+        if not cache_hit and not result["errors"] and served == {model_version}:
+            cache.set(cache_key, raw_output)
+    except Exception as e:
+        result = fallback_result(state['preferences'], num_days, e)
+    result["prompt_stats"] = request["prompt_stats"]
+    # Not state: the progress wrapper moves it into the node_finished event
+    result["cache_hit"] = cache_hit
+    return result
+
+
+def stream_plan(preferences: Dict[str, Any], bypass_cache: bool = False, sla_seconds: float = None) -> Iterator[Dict[str, Any]]:
+    """Plan a trip, yielding each day as soon as the model has finished it
+
+    Yields {"event": "day", "day": {...}} for every completed daily plan and
+    node_started/node_finished progress events, then {"event": "done",
+    "result": {...}} with the same keys as app.invoke(). With a time budget
+    (sla_seconds, default TRIPCRAFT_PLAN_SLA) generation that runs out of
+    time stops and the fallback itinerary is used.
+    """
+    deadline = deadline_for(sla_seconds)
+    # A generator runs in whichever context resumes it, so steps run in this one
+    scope = deadline_context(deadline)
+    state = {"preferences": preferences, "errors": [], "bypass_cache": bypass_cache}
+    state.update(gather_preferences(state))
+    # Like the graph's parallel branch: weather only needs preferences
+    yield node_started("check_weather")
+    weather = weather_pool.submit(deadline_context(deadline).run, timed_call, check_weather, dict(state))
+
+    yield node_started("fetch_info")
+    update, seconds = scope.run(timed_call, fetch_destination_info, state)
+    cache_hit = update.pop("cache_hit", None)
+    state.update(update)
+    yield node_finished("fetch_info", seconds, cache_hit=cache_hit)
+
+    yield node_started("generate_itinerary")
+    start = time.perf_counter()
+    num_days = count_trip_days(preferences)
+    request = build_prompt_request(preferences, state['destination_info'], num_days)
+    prompt = request["prompt"]
+    state["prompt_stats"] = request["prompt_stats"]
+
+    cache = itinerary_cache()
+    model_version = get_router().model_version
+    cache_key = itinerary_cache_key(preferences, state['destination_info'], model_version, request["prompt_version"])
+
+    parser = DailyPlanStreamParser()
+    cached = None
+    chunks = iter(())
+    try:
+        cached = None if bypass_cache else cache.get(cache_key)
+        if cached is None:
+            check_generation_time(deadline)
+        chunks = iter([cached]) if cached is not None else llm_stream(
+            prompt,
+            max_new_tokens=itinerary_token_budget(num_days, activities_per_day(preferences))
+        )
+        for chunk in iter(lambda: scope.run(next, chunks, None), None):
+            for day in parser.feed(chunk):
+                yield {"event": "day", "day": day}
+            # Stop generating once the budget is spent; the fallback takes over
+            if cached is None:
+                deadline.check("itinerary generation")
+        state.update(itinerary_from_output(parser.text, preferences, num_days))
+        if cached is None and not state["errors"] and get_router().last_served().model_version == model_version:
+            cache.set(cache_key, parser.text)
+    except Exception as e:
+        state.update(fallback_result(preferences, num_days, e))
+    finally:
+        # Releases the backend's concurrency slot when generation stopped early
+        close = getattr(chunks, "close", None)
+        if close:
+            scope.run(close)
+    yield node_finished("generate_itinerary", time.perf_counter() - start, cache_hit=cached is not None)
+
+    update, seconds = weather.result()
+    cache_hit = update.pop("cache_hit", None)
+    state.update(update)
+    yield node_finished("check_weather", seconds, cache_hit=cache_hit)
+    yield {"event": "done", "result": state}
+
 
 def create_fallback_itinerary(preferences: Dict[str, Any], num_days: int, error_info: str) -> Dict[str, Any]:
     """Create a basic fallback itinerary when generation fails"""
+    FALLBACK_ITINERARIES.inc(workflow="langgraph")
     destination = preferences.get('destination', 'Unknown Destination')
     dates = preferences.get('dates', '')
     budget = preferences.get('budget', 0)
@@ -211,6 +432,37 @@ def create_fallback_itinerary(preferences: Dict[str, Any], num_days: int, error_
     }
 
 
+def _day_markdown_lines(day_plan: Dict[str, Any]) -> list:
+    lines = [f"## Day {day_plan['day']} - {day_plan['date']}"]
+    if day_plan.get('summary'):
+        lines.append(f"*{day_plan['summary']}*\n")
+
+    for activity in day_plan.get('activities', []):
+        lines.append(f"### {activity['start_time']} - {activity['end_time']}: {activity['title']}")
+        if activity.get('address'):
+            lines.append(f"📍 {activity['address']}")
+        if activity.get('notes'):
+            lines.append(f"ℹ️ {activity['notes']}")
+        lines.append("")
+
+    if day_plan.get('meals'):
+        lines.append("**Meals:**")
+        for meal in day_plan['meals']:
+            lines.append(f"- {meal['time']}: {meal['suggestion']} (${meal.get('est_cost', 0)})")
+        lines.append("")
+
+    lines.append(f"💰 **Daily Cost: ${day_plan.get('estimated_daily_cost', 0)}**\n")
+    return lines
+
+
+def format_day_as_markdown(day_plan: Dict[str, Any]) -> str:
+    """Render a single daily plan, e.g. while the rest of the itinerary is still streaming"""
+    try:
+        return "\n".join(_day_markdown_lines(day_plan))
+    except Exception as e:
+        return f"Error formatting day: {str(e)}"
+
+
 def format_itinerary_as_markdown(itinerary_data: Dict[str, Any]) -> str:
     """Convert JSON itinerary to markdown format for display"""
     try:
@@ -222,25 +474,7 @@ def format_itinerary_as_markdown(itinerary_data: Dict[str, Any]) -> str:
         lines.append(f"**Total Budget: {itinerary.get('currency', 'USD')} {itinerary['total_estimated_cost']}**\n")
 
         for day_plan in itinerary['daily_plans']:
-            lines.append(f"## Day {day_plan['day']} - {day_plan['date']}")
-            if day_plan.get('summary'):
-                lines.append(f"*{day_plan['summary']}*\n")
-
-            for activity in day_plan.get('activities', []):
-                lines.append(f"### {activity['start_time']} - {activity['end_time']}: {activity['title']}")
-                if activity.get('address'):
-                    lines.append(f"📍 {activity['address']}")
-                if activity.get('notes'):
-                    lines.append(f"ℹ️ {activity['notes']}")
-                lines.append("")
-
-            if day_plan.get('meals'):
-                lines.append("**Meals:**")
-                for meal in day_plan['meals']:
-                    lines.append(f"- {meal['time']}: {meal['suggestion']} (${meal.get('est_cost', 0)})")
-                lines.append("")
-
-            lines.append(f"💰 **Daily Cost: ${day_plan.get('estimated_daily_cost', 0)}**\n")
+            lines.extend(_day_markdown_lines(day_plan))
 
         if itinerary.get('safety_notes'):
             lines.append("## Safety Notes")
@@ -260,17 +494,29 @@ def format_itinerary_as_markdown(itinerary_data: Dict[str, Any]) -> str:
 
 
 # Step 4: Fetch weather
+# Weather lookups for stream_plan, which runs outside the graph
+weather_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather")
+
+
 def check_weather(state: TravelPlanState):
-    """Check weather forecast if Tavily is available"""
-    if tavily:
+    """Check weather forecast if Tavily is available and the time budget allows"""
+    deadline = current_deadline()
+    tavily = tavily_client()
+    if tavily and not deadline.allows(MIN_WEATHER_SECONDS):
+        print(f"⏱️  Skipping weather lookup: {deadline.remaining():.1f}s left")
+        DEADLINE_DEGRADATIONS.inc(node="check_weather", action="skipped")
+    elif tavily:
         try:
-            query = (
-                f"Weather forecast for {state['preferences']['destination']} "
-                f"on {state['preferences']['dates']}"
+            searches = search_cache()
+            weather_data = searches.search(
+                tavily,
+                weather_query(state['preferences']['destination'], state['preferences']['dates']),
+                kind="weather",
+                timeout=deadline.timeout(),
+                max_results=1
             )
-            weather_data = tavily.search(query=query, max_results=1)
             weather_text = weather_data["results"][0]["content"] if weather_data.get("results") else "No weather data found."
-            return {"weather": weather_text}
+            return {"weather": weather_text, "cache_hit": searches.last_hit()}
         except Exception as e:
             print(f"⚠️  Weather check failed: {e}")
 
@@ -278,21 +524,261 @@ def check_weather(state: TravelPlanState):
     return {"weather": "Weather information unavailable. Please check local weather services for your travel dates."}
 
 
-# Build the workflow graph
-workflow = StateGraph(TravelPlanState)
-workflow.add_node("gather_preferences", gather_preferences)
-workflow.add_node("fetch_info", fetch_destination_info)
-workflow.add_node("generate_itinerary", generate_itinerary)
-workflow.add_node("check_weather", check_weather)
+# Async nodes for app.ainvoke()/app.astream(). Tavily and the LLM router are
+# blocking clients, so each node runs its sync counterpart on node_pool: the
+# event loop stays free to drive other plans, and concurrent generations still
+# meet in the micro-batcher or the OpenAI connection pool.
+node_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TRIPCRAFT_NODE_WORKERS", "16")),
+    thread_name_prefix="node"
+)
+
+
+async def run_in_node_pool(func: Callable, state: TravelPlanState):
+    """func(state) on node_pool, with the caller's context variables"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(node_pool, context.run, func, state)
+
+
+async def agather_preferences(state: TravelPlanState):
+    return gather_preferences(state)
+
+
+async def afetch_destination_info(state: TravelPlanState):
+    return await run_in_node_pool(fetch_destination_info, state)
+
 
-# Define flow
-workflow.add_edge("gather_preferences", "fetch_info")
-workflow.add_edge("fetch_info", "generate_itinerary")
-workflow.add_edge("generate_itinerary", "check_weather")
+async def agenerate_itinerary(state: TravelPlanState):
+    return await run_in_node_pool(generate_itinerary, state)
 
-# Entry and exit
-workflow.set_entry_point("gather_preferences")
-workflow.add_edge("check_weather", END)
 
-# Compile app
-app = workflow.compile()
+async def acheck_weather(state: TravelPlanState):
+    return await run_in_node_pool(check_weather, state)
+
+
+def progress_node(name: str, func: Callable, afunc: Callable) -> "RunnableLambda":
+    """Graph node running func (invoke/stream) or afunc (ainvoke/astream)
+
+    Writes node_started/node_finished events to the graph's "custom" stream.
+    A "cache_hit" key in the node's update is moved into the finished event.
+    The run's deadline (config["configurable"]["deadline"]) is current while
+    the node runs.
+    """
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.config import get_config, get_stream_writer
+
+    def finished(writer, start: float, update: Dict[str, Any]) -> Dict[str, Any]:
+        update = dict(update)
+        cache_hit = update.pop("cache_hit", None)
+        writer(node_finished(name, time.perf_counter() - start, cache_hit=cache_hit))
+        return update
+
+    def failed(writer, start: float, error: Exception):
+        writer(node_finished(name, time.perf_counter() - start, error=str(error)))
+
+    def run(state: TravelPlanState):
+        writer = get_stream_writer()
+        writer(node_started(name))
+        start = time.perf_counter()
+        try:
+            with deadline_scope(config_deadline(get_config())):
+                update = func(state)
+        except Exception as e:
+            failed(writer, start, e)
+            raise
+        return finished(writer, start, update)
+
+    async def arun(state: TravelPlanState):
+        writer = get_stream_writer()
+        writer(node_started(name))
+        start = time.perf_counter()
+        try:
+            with deadline_scope(config_deadline(get_config())):
+                update = await afunc(state)
+        except Exception as e:
+            failed(writer, start, e)
+            raise
+        return finished(writer, start, update)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+def initial_state(preferences: Dict[str, Any], bypass_cache: bool = False) -> Dict[str, Any]:
+    return {"preferences": preferences, "bypass_cache": bypass_cache}
+
+
+def stream_progress(
+    preferences: Dict[str, Any],
+    bypass_cache: bool = False,
+    graph=None,
+    sla_seconds: float = None
+) -> Iterator[Dict[str, Any]]:
+    """Run the graph, yielding progress events and finally {"event": "done", "result": {...}}
+
+    sla_seconds is the run's time budget (default TRIPCRAFT_PLAN_SLA, 0 for none).
+    """
+    result = {}
+    config = plan_config(sla_seconds)
+    for mode, chunk in (graph or compiled_app()).stream(initial_state(preferences, bypass_cache), config, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            yield chunk
+        else:
+            result = chunk
+    yield {"event": "done", "result": result}
+
+
+async def astream_progress(
+    preferences: Dict[str, Any],
+    bypass_cache: bool = False,
+    graph=None,
+    sla_seconds: float = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """stream_progress on the event loop; many plans can run concurrently"""
+    result = {}
+    config = plan_config(sla_seconds)
+    async for mode, chunk in (graph or compiled_app()).astream(initial_state(preferences, bypass_cache), config, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            yield chunk
+        else:
+            result = chunk
+    yield {"event": "done", "result": result}
+
+
+def build_workflow(parallel: bool = True) -> "StateGraph":
+    """Build the planning graph
+
+    In the parallel graph the weather lookup only depends on preferences, so
+    it runs alongside the destination search and joins at the end; the
+    sequential graph is the original chain, kept for comparison. Every node
+    has a sync and an async implementation, so the compiled graph supports
+    invoke/stream and ainvoke/astream alike.
+    """
+    from langgraph.graph import StateGraph, END
+
+    graph = StateGraph(TravelPlanState)
+    graph.add_node("gather_preferences", progress_node("gather_preferences", gather_preferences, agather_preferences))
+    graph.add_node("fetch_info", progress_node("fetch_info", fetch_destination_info, afetch_destination_info))
+    graph.add_node("generate_itinerary", progress_node("generate_itinerary", generate_itinerary, agenerate_itinerary))
+    graph.add_node("check_weather", progress_node("check_weather", check_weather, acheck_weather))
+    graph.set_entry_point("gather_preferences")
+
+    if parallel:
+        # gather_preferences -> {fetch_info -> generate_itinerary, check_weather} -> END
+        graph.add_edge("gather_preferences", "fetch_info")
+        graph.add_edge("gather_preferences", "check_weather")
+        graph.add_edge("fetch_info", "generate_itinerary")
+        graph.add_edge(["generate_itinerary", "check_weather"], END)
+    else:
+        graph.add_edge("gather_preferences", "fetch_info")
+        graph.add_edge("fetch_info", "generate_itinerary")
+        graph.add_edge("generate_itinerary", "check_weather")
+        graph.add_edge("check_weather", END)
+    return graph
+
+
+_app = None
+_app_lock = threading.Lock()
+
+
+def compiled_app():
+    """The planning graph compiled without a checkpointer, built on first use"""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = build_workflow().compile()
+    return _app
+
+
+def __getattr__(name: str):
+    # workflow.app (and `from workflow import app`) compiles the graph on first access
+    if name == "app":
+        return compiled_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_checkpointed_app = None
+_checkpointed_app_lock = threading.Lock()
+
+
+def checkpointed_app(checkpointer=None):
+    """The planning graph compiled with a persistent checkpointer, keyed by run id
+
+    Without an argument this is the process-wide app on run_checkpointer()
+    (TRIPCRAFT_CHECKPOINT_PATH), built on first use. Stale runs are
+    garbage-collected when it is created.
+    """
+    global _checkpointed_app
+    if checkpointer is not None:
+        return build_workflow().compile(checkpointer=checkpointer)
+    if _checkpointed_app is None:
+        with _checkpointed_app_lock:
+            if _checkpointed_app is None:
+                from run_checkpoints import run_checkpointer
+
+                saver = run_checkpointer()
+                removed = saver.gc()
+                if removed:
+                    print(f"🧹 Removed {removed} expired workflow runs")
+                _checkpointed_app = build_workflow().compile(checkpointer=saver)
+    return _checkpointed_app
+
+
+def run_config(run_id: str, sla_seconds: float = None) -> Dict[str, Any]:
+    return plan_config(sla_seconds, thread_id=run_id)
+
+
+def _collect_garbage(graph):
+    maybe_gc = getattr(graph.checkpointer, "maybe_gc", None)
+    if maybe_gc:
+        maybe_gc()
+
+
+def plan_run(
+    preferences: Dict[str, Any],
+    run_id: str = None,
+    bypass_cache: bool = False,
+    graph=None,
+    sla_seconds: float = None
+) -> Dict[str, Any]:
+    """Plan under a run id, checkpointing after every node
+
+    Re-running an id that stopped part-way (an exception, a killed process)
+    resumes after its last completed node, so e.g. a finished generation is
+    not repeated; preferences are then taken from the checkpoint. A finished
+    run returns its stored result. The result includes "run_id". The time
+    budget (sla_seconds) starts afresh on each call.
+    """
+    graph = graph or checkpointed_app()
+    run_id = run_id or uuid.uuid4().hex
+    config = run_config(run_id, sla_seconds)
+    _collect_garbage(graph)
+
+    snapshot = graph.get_state(config)
+    if snapshot.values and not snapshot.next:
+        result = snapshot.values
+    else:
+        # None continues from the checkpoint instead of starting over
+        result = graph.invoke(None if snapshot.next else initial_state(preferences, bypass_cache), config)
+    return dict(result, run_id=run_id)
+
+
+async def aplan_run(
+    preferences: Dict[str, Any],
+    run_id: str = None,
+    bypass_cache: bool = False,
+    graph=None,
+    sla_seconds: float = None
+) -> Dict[str, Any]:
+    """plan_run on the event loop"""
+    graph = graph or await asyncio.to_thread(checkpointed_app)
+    run_id = run_id or uuid.uuid4().hex
+    config = run_config(run_id, sla_seconds)
+    await asyncio.to_thread(_collect_garbage, graph)
+
+    snapshot = await graph.aget_state(config)
+    if snapshot.values and not snapshot.next:
+        result = snapshot.values
+    else:
+        result = await graph.ainvoke(None if snapshot.next else initial_state(preferences, bypass_cache), config)
+    return dict(result, run_id=run_id)
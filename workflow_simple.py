@@ -2,52 +2,75 @@
 Simplified workflow without LangGraph dependency
 Maintains the same functionality using simple function calls
 """
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, AsyncIterator, Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import os
 import json
-
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except:
-    pass
+import time
 
 # Import mock LLM
-from llm_mock import llm
+import llm_mock
+from llm_mock import MODEL_VERSION
 from tripcraft_config import (
-    build_itinerary_prompt,
-    validate_itinerary_json,
-    extract_json_from_text
+    itinerary_schema_errors,
+    complete_truncated_itinerary,
+    activities_per_day,
+    day_token_budget,
+    itinerary_token_budget
+)
+from json_stream import DailyPlanStreamParser, extract_json
+from schema_validator import summarize_errors
+from prompt_builder import active_token_counter, build_budgeted_itinerary_prompt
+from result_cache import itinerary_cache, itinerary_cache_key
+from search_cache import search_cache, tavily_client, attractions_query, weather_query
+from day_planner import plan_itinerary_by_day, replan_itinerary_by_day, use_per_day_generation
+from progress_events import node_started, node_finished, timed_call
+from metrics import instrumented_llm, instrumented_llm_stream, FALLBACK_ITINERARIES, DEADLINE_DEGRADATIONS
+from deadlines import (
+    Deadline,
+    DeadlineExceeded,
+    MIN_ADVANCED_SEARCH_SECONDS,
+    MIN_GENERATION_SECONDS,
+    MIN_SEARCH_SECONDS,
+    MIN_WEATHER_SECONDS,
+    config_deadline,
+    deadline_for,
+    plan_config
 )
 
-# Tavily is optional
-try:
-    from tavily import TavilyClient
-    tavily_key = os.getenv("TAVILY_API_KEY")
-    if tavily_key:
-        tavily = TavilyClient(api_key=tavily_key)
-        print("✅ Tavily search enabled")
-    else:
-        tavily = None
-        print("⚠️  Tavily API key not set (search disabled)")
-except:
-    tavily = None
-    print("⚠️  Tavily not available")
-
-print("✅ Using mock LLM (transformers not available)")
+# Tavily (optional) is set up by tavily_client() on the first search, not at import
+llm = instrumented_llm(llm_mock.llm, "llm_mock")
+llm_stream = instrumented_llm_stream(llm_mock.llm_stream, "llm_mock")
 
 
 class TravelPlanState:
     """State container for travel planning"""
 
-    def __init__(self, preferences: Dict[str, Any]):
+    def __init__(
+        self,
+        preferences: Dict[str, Any],
+        bypass_cache: bool = False,
+        generation_mode: str = None,
+        deadline: Optional[Deadline] = None,
+        previous_preferences: Optional[Dict[str, Any]] = None,
+        previous_itinerary: Optional[Dict[str, Any]] = None
+    ):
         self.preferences = preferences
+        self.bypass_cache = bypass_cache
+        self.generation_mode = generation_mode
+        # An earlier plan and its preferences: only the days the change affects are regenerated
+        self.previous_preferences = previous_preferences
+        self.previous_itinerary = previous_itinerary
+        # Time budget for the run; optional steps are skipped when it runs short
+        self.deadline = deadline or Deadline()
         self.destination_info = ""
         self.itinerary = ""
         self.itinerary_json = {}
         self.weather = ""
         self.errors = []
+        self.prompt_stats = {}
+        # Set by generate_itinerary for progress events; not part of the result
+        self.cache_hit = None
 
 
 def gather_preferences(state: TravelPlanState) -> TravelPlanState:
@@ -64,11 +87,26 @@ def fetch_destination_info(state: TravelPlanState) -> TravelPlanState:
         state.destination_info = "Destination not specified."
         return state
 
-    # Try Tavily if available
-    if tavily:
+    # Try Tavily if available and there is time for it; a short budget gets a basic search
+    deadline = state.deadline
+    tavily = tavily_client()
+    if tavily and not deadline.allows(MIN_SEARCH_SECONDS):
+        print(f"⏱️  Skipping destination search: {deadline.remaining():.1f}s left")
+        DEADLINE_DEGRADATIONS.inc(node="fetch_info", action="skipped")
+    elif tavily:
+        depth = "advanced"
+        if not deadline.allows(MIN_ADVANCED_SEARCH_SECONDS):
+            depth = "basic"
+            DEADLINE_DEGRADATIONS.inc(node="fetch_info", action="basic_search")
         try:
-            query = f"Top attractions and activities in {dest} for {interests}"
-            info = tavily.search(query=query, max_results=3, search_depth="advanced")
+            info = search_cache().search(
+                tavily,
+                attractions_query(dest, interests),
+                kind="attractions",
+                timeout=deadline.timeout(),
+                max_results=3,
+                search_depth=depth
+            )
 
             results = info.get("results", [])
             if results:
@@ -78,14 +116,8 @@ def fetch_destination_info(state: TravelPlanState) -> TravelPlanState:
                     if content:
                         snippets.append(content.strip())
 
-                combined_info = " ".join(snippets)
-                if len(combined_info) > 500:
-                    combined_info = combined_info[:500]
-                    last_space = combined_info.rfind(" ")
-                    if last_space != -1:
-                        combined_info = combined_info[:last_space] + "…"
-
-                state.destination_info = combined_info
+                # Kept whole; the prompt builder packs it to a token budget
+                state.destination_info = "\n\n".join(snippets)
                 return state
         except Exception as e:
             print(f"⚠️  Tavily search failed: {e}")
@@ -97,69 +129,143 @@ def fetch_destination_info(state: TravelPlanState) -> TravelPlanState:
     return state
 
 
-def generate_itinerary(state: TravelPlanState) -> TravelPlanState:
-    """Step 3: Generate itinerary using LLM"""
-    dates = state.preferences.get('dates', "")
+def count_trip_days(preferences: Dict[str, Any]) -> int:
+    """Number of days covered by the 'YYYY-MM-DD to YYYY-MM-DD' dates preference"""
+    dates = preferences.get('dates', "")
 
     try:
         start_date, end_date = dates.split(" to ")
         start = datetime.strptime(start_date, "%Y-%m-%d")
         end = datetime.strptime(end_date, "%Y-%m-%d")
-        num_days = (end - start).days + 1
+        return (end - start).days + 1
     except (ValueError, AttributeError):
-        num_days = 5
-
-    try:
-        # Build prompt
-        prompt = build_itinerary_prompt(
-            preferences=state.preferences,
-            destination_info=state.destination_info,
-            num_days=num_days
-        )
+        return 5
 
-        # Generate with LLM
-        raw_output = llm(prompt, return_json=True)
 
-        try:
-            itinerary_data = json.loads(raw_output)
-        except json.JSONDecodeError:
-            itinerary_data = extract_json_from_text(raw_output)
+def apply_llm_output(state: TravelPlanState, raw_output: str, num_days: int) -> TravelPlanState:
+    """Parse and validate raw LLM output into the state, falling back if it is unusable
 
-        if not validate_itinerary_json(itinerary_data):
-            fallback_itinerary = create_fallback_itinerary(
-                state.preferences,
-                num_days,
-                "Generated itinerary did not match schema"
-            )
-            state.itinerary = format_itinerary_as_markdown(fallback_itinerary)
-            state.itinerary_json = fallback_itinerary
-            state.errors.append("Generated itinerary did not match schema, using fallback")
-        else:
-            state.itinerary = format_itinerary_as_markdown(itinerary_data)
-            state.itinerary_json = itinerary_data
+    Output cut off mid-JSON is repaired and the repair recorded in errors.
+    """
+    extraction = extract_json(raw_output, repair=True)
+    itinerary_data = extraction.value
+    if extraction.repaired:
+        itinerary_data = complete_truncated_itinerary(itinerary_data, state.preferences.get("destination", "Unknown"))
 
-    except Exception as e:
+    # A repair that kept no day is no better than the fallback
+    schema_errors = itinerary_schema_errors(itinerary_data)
+    if schema_errors or (extraction.repaired and not itinerary_data["itinerary"]["daily_plans"]):
+        reason = f" ({summarize_errors(schema_errors)})" if schema_errors else ""
         fallback_itinerary = create_fallback_itinerary(
             state.preferences,
             num_days,
-            str(e)
+            f"Generated itinerary did not match schema{reason}"
         )
         state.itinerary = format_itinerary_as_markdown(fallback_itinerary)
         state.itinerary_json = fallback_itinerary
-        state.errors.append(f"Error generating itinerary: {str(e)}")
+        state.errors.append(f"Generated itinerary did not match schema, using fallback{reason}")
+    else:
+        state.itinerary = format_itinerary_as_markdown(itinerary_data)
+        state.itinerary_json = itinerary_data
+        if extraction.repaired:
+            state.errors.append(f"Generated itinerary was cut off and repaired ({'; '.join(extraction.repairs)})")
 
     return state
 
 
+def apply_generation_error(state: TravelPlanState, error: Exception, num_days: int) -> TravelPlanState:
+    """Store a fallback itinerary after generation raised"""
+    fallback_itinerary = create_fallback_itinerary(
+        state.preferences,
+        num_days,
+        str(error)
+    )
+    state.itinerary = format_itinerary_as_markdown(fallback_itinerary)
+    state.itinerary_json = fallback_itinerary
+    state.errors.append(f"Error generating itinerary: {str(error)}")
+    return state
+
+
+def check_generation_time(deadline: Deadline):
+    """Raise DeadlineExceeded when generation is not expected to finish in the time left"""
+    if not deadline.allows(MIN_GENERATION_SECONDS):
+        DEADLINE_DEGRADATIONS.inc(node="generate_itinerary", action="fallback")
+        raise DeadlineExceeded(
+            f"{deadline.remaining():.1f}s left of the time budget, generation needs about {MIN_GENERATION_SECONDS:.1f}s"
+        )
+
+
+def generate_itinerary(state: TravelPlanState) -> TravelPlanState:
+    """Step 3: Generate itinerary using LLM"""
+    num_days = count_trip_days(state.preferences)
+
+    try:
+        # Build prompt, with destination context packed to a token budget
+        request = build_budgeted_itinerary_prompt(
+            state.preferences, state.destination_info, num_days, counter=active_token_counter("llm_mock")
+        )
+        prompt = request["prompt"]
+        state.prompt_stats = request["prompt_stats"]
+
+        # Reuse a cached generation for the same request unless bypassed
+        cache = itinerary_cache()
+        cache_key = itinerary_cache_key(state.preferences, state.destination_info, MODEL_VERSION, request["prompt_version"])
+        raw_output = None if state.bypass_cache else cache.get(cache_key)
+        cache_hit = state.cache_hit = raw_output is not None
+        if not cache_hit:
+            check_generation_time(state.deadline)
+
+        # Generate with LLM: only the changed days of an earlier plan, or day by
+        # day in parallel for long trips
+        activities = activities_per_day(state.preferences)
+
+        def generate_day(day_prompt: str) -> str:
+            return llm(day_prompt, return_json=True, max_new_tokens=day_token_budget(activities))
+
+        if not cache_hit and state.previous_itinerary and state.previous_preferences:
+            updated = replan_itinerary_by_day(
+                state.previous_itinerary,
+                state.previous_preferences,
+                state.preferences,
+                request["context"],
+                num_days,
+                generate=generate_day
+            )
+            raw_output = json.dumps(updated) if updated else None
+        if raw_output is None and use_per_day_generation(num_days, state.generation_mode):
+            raw_output = json.dumps(plan_itinerary_by_day(state.preferences, request["context"], num_days, generate=generate_day))
+        elif raw_output is None:
+            raw_output = llm(prompt, return_json=True, max_new_tokens=itinerary_token_budget(num_days, activities))
+        apply_llm_output(state, raw_output, num_days)
+
+        if not cache_hit and not state.errors:
+            cache.set(cache_key, raw_output)
+
+    except Exception as e:
+        apply_generation_error(state, e, num_days)
+
+    return state
+
+
+# check_weather runs here while the destination search and generation proceed
+weather_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather")
+
+
 def check_weather(state: TravelPlanState) -> TravelPlanState:
-    """Step 4: Check weather forecast"""
-    if tavily:
+    """Step 4: Check weather forecast, unless the time budget is nearly spent"""
+    tavily = tavily_client()
+    if tavily and not state.deadline.allows(MIN_WEATHER_SECONDS):
+        print(f"⏱️  Skipping weather lookup: {state.deadline.remaining():.1f}s left")
+        DEADLINE_DEGRADATIONS.inc(node="check_weather", action="skipped")
+    elif tavily:
         try:
-            query = (
-                f"Weather forecast for {state.preferences['destination']} "
-                f"on {state.preferences['dates']}"
+            weather_data = search_cache().search(
+                tavily,
+                weather_query(state.preferences['destination'], state.preferences['dates']),
+                kind="weather",
+                timeout=state.deadline.timeout(),
+                max_results=1
             )
-            weather_data = tavily.search(query=query, max_results=1)
             state.weather = weather_data["results"][0]["content"] if weather_data.get("results") else "No weather data found."
             return state
         except Exception as e:
@@ -173,6 +279,8 @@ def create_fallback_itinerary(preferences: Dict[str, Any], num_days: int, error_
     """Create a basic fallback itinerary"""
     from datetime import timedelta
 
+    FALLBACK_ITINERARIES.inc(workflow="simple")
+
     destination = preferences.get('destination', 'Unknown Destination')
     dates = preferences.get('dates', '')
     budget = preferences.get('budget', 0)
@@ -231,6 +339,37 @@ def create_fallback_itinerary(preferences: Dict[str, Any], num_days: int, error_
     }
 
 
+def _day_markdown_lines(day_plan: Dict[str, Any]) -> list:
+    lines = [f"## Day {day_plan['day']} - {day_plan['date']}"]
+    if day_plan.get('summary'):
+        lines.append(f"*{day_plan['summary']}*\n")
+
+    for activity in day_plan.get('activities', []):
+        lines.append(f"### {activity['start_time']} - {activity['end_time']}: {activity['title']}")
+        if activity.get('address'):
+            lines.append(f"📍 {activity['address']}")
+        if activity.get('notes'):
+            lines.append(f"ℹ️ {activity['notes']}")
+        lines.append("")
+
+    if day_plan.get('meals'):
+        lines.append("**Meals:**")
+        for meal in day_plan['meals']:
+            lines.append(f"- {meal['time']}: {meal['suggestion']} (${meal.get('est_cost', 0)})")
+        lines.append("")
+
+    lines.append(f"💰 **Daily Cost: ${day_plan.get('estimated_daily_cost', 0)}**\n")
+    return lines
+
+
+def format_day_as_markdown(day_plan: Dict[str, Any]) -> str:
+    """Render a single daily plan, e.g. while the rest of the itinerary is still streaming"""
+    try:
+        return "\n".join(_day_markdown_lines(day_plan))
+    except Exception as e:
+        return f"Error formatting day: {str(e)}"
+
+
 def format_itinerary_as_markdown(itinerary_data: Dict[str, Any]) -> str:
     """Convert JSON itinerary to markdown"""
     try:
@@ -242,25 +381,7 @@ def format_itinerary_as_markdown(itinerary_data: Dict[str, Any]) -> str:
         lines.append(f"**Total Budget: {itinerary.get('currency', 'USD')} {itinerary['total_estimated_cost']}**\n")
 
         for day_plan in itinerary['daily_plans']:
-            lines.append(f"## Day {day_plan['day']} - {day_plan['date']}")
-            if day_plan.get('summary'):
-                lines.append(f"*{day_plan['summary']}*\n")
-
-            for activity in day_plan.get('activities', []):
-                lines.append(f"### {activity['start_time']} - {activity['end_time']}: {activity['title']}")
-                if activity.get('address'):
-                    lines.append(f"📍 {activity['address']}")
-                if activity.get('notes'):
-                    lines.append(f"ℹ️ {activity['notes']}")
-                lines.append("")
-
-            if day_plan.get('meals'):
-                lines.append("**Meals:**")
-                for meal in day_plan['meals']:
-                    lines.append(f"- {meal['time']}: {meal['suggestion']} (${meal.get('est_cost', 0)})")
-                lines.append("")
-
-            lines.append(f"💰 **Daily Cost: ${day_plan.get('estimated_daily_cost', 0)}**\n")
+            lines.extend(_day_markdown_lines(day_plan))
 
         if itinerary.get('safety_notes'):
             lines.append("## Safety Notes")
@@ -280,31 +401,147 @@ def format_itinerary_as_markdown(itinerary_data: Dict[str, Any]) -> str:
 
 
 class SimpleWorkflowApp:
-    """Simple workflow executor"""
+    """Simple workflow executor
 
-    def invoke(self, initial_state: Dict[str, Any]) -> Dict[str, Any]:
+    Like the LangGraph app, a run's deadline comes from
+    config["configurable"]["deadline"] (see deadlines.plan_config).
+    """
+
+    def invoke(self, initial_state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Execute the workflow"""
-        # Create state
-        state = TravelPlanState(initial_state.get("preferences", {}))
+        for event in self.stream(initial_state, config):
+            pass
+        return event["result"]
+
+    async def ainvoke(self, initial_state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """invoke() in a worker thread so the event loop can drive other plans"""
+        import asyncio
+
+        return await asyncio.to_thread(self.invoke, initial_state, config)
+
+    def stream(self, initial_state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Execute the workflow, yielding progress events, then {"event": "done", "result": {...}}"""
+        state = TravelPlanState(
+            initial_state.get("preferences", {}),
+            bypass_cache=initial_state.get("bypass_cache", False),
+            generation_mode=initial_state.get("generation_mode"),
+            deadline=config_deadline(config),
+            previous_preferences=initial_state.get("previous_preferences"),
+            previous_itinerary=initial_state.get("previous_itinerary")
+        )
 
-        # Run steps in sequence
+        # Weather only needs preferences, so it runs alongside search and generation
         state = gather_preferences(state)
-        state = fetch_destination_info(state)
-        state = generate_itinerary(state)
-        state = check_weather(state)
-
-        # Return as dict
+        yield node_started("check_weather")
+        weather = weather_pool.submit(timed_call, check_weather, state)
+
+        yield node_started("fetch_info")
+        state, seconds = timed_call(fetch_destination_info, state)
+        yield node_finished("fetch_info", seconds)
+
+        yield node_started("generate_itinerary")
+        state, seconds = timed_call(generate_itinerary, state)
+        yield node_finished("generate_itinerary", seconds, cache_hit=state.cache_hit)
+
+        _, seconds = weather.result()
+        yield node_finished("check_weather", seconds)
+        yield {"event": "done", "result": self.as_dict(state)}
+
+    async def astream(self, initial_state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """stream() with each step pulled in a worker thread"""
+        import asyncio
+
+        events = self.stream(initial_state, config)
+        while True:
+            event = await asyncio.to_thread(next, events, None)
+            if event is None:
+                return
+            yield event
+
+    @staticmethod
+    def as_dict(state: TravelPlanState) -> Dict[str, Any]:
+        """Return the state as the dict callers of invoke() expect"""
         return {
             "preferences": state.preferences,
             "destination_info": state.destination_info,
             "itinerary": state.itinerary,
             "itinerary_json": state.itinerary_json,
             "weather": state.weather,
-            "errors": state.errors
+            "errors": state.errors,
+            "prompt_stats": state.prompt_stats
         }
 
 
+def stream_plan(preferences: Dict[str, Any], bypass_cache: bool = False, sla_seconds: float = None) -> Iterator[Dict[str, Any]]:
+    """Plan a trip, yielding each day as soon as the model has finished it
+
+    Yields {"event": "day", "day": {...}} for every completed daily plan and
+    node_started/node_finished progress events, then {"event": "done",
+    "result": {...}} with the same keys as app.invoke(). With a time budget
+    (sla_seconds, default TRIPCRAFT_PLAN_SLA) generation that runs out of
+    time stops and the fallback itinerary is used.
+    """
+    state = TravelPlanState(preferences, bypass_cache=bypass_cache, deadline=deadline_for(sla_seconds))
+    state = gather_preferences(state)
+    yield node_started("check_weather")
+    weather = weather_pool.submit(timed_call, check_weather, state)
+
+    yield node_started("fetch_info")
+    state, seconds = timed_call(fetch_destination_info, state)
+    yield node_finished("fetch_info", seconds)
+
+    yield node_started("generate_itinerary")
+    start = time.perf_counter()
+    num_days = count_trip_days(state.preferences)
+    parser = DailyPlanStreamParser()
+    cached = None
+
+    try:
+        request = build_budgeted_itinerary_prompt(
+            state.preferences, state.destination_info, num_days, counter=active_token_counter("llm_mock")
+        )
+        prompt = request["prompt"]
+        state.prompt_stats = request["prompt_stats"]
+        cache = itinerary_cache()
+        cache_key = itinerary_cache_key(state.preferences, state.destination_info, MODEL_VERSION, request["prompt_version"])
+        cached = None if bypass_cache else cache.get(cache_key)
+        if cached is None:
+            check_generation_time(state.deadline)
+
+        for chunk in [cached] if cached is not None else llm_stream(
+            prompt,
+            max_new_tokens=itinerary_token_budget(num_days, activities_per_day(state.preferences))
+        ):
+            for day in parser.feed(chunk):
+                yield {"event": "day", "day": day}
+            # Stop generating once the budget is spent; the fallback takes over
+            if cached is None:
+                state.deadline.check("itinerary generation")
+        apply_llm_output(state, parser.text, num_days)
+
+        if cached is None and not state.errors:
+            cache.set(cache_key, parser.text)
+    except Exception as e:
+        apply_generation_error(state, e, num_days)
+    yield node_finished("generate_itinerary", time.perf_counter() - start, cache_hit=cached is not None)
+
+    _, seconds = weather.result()
+    yield node_finished("check_weather", seconds)
+    yield {"event": "done", "result": SimpleWorkflowApp.as_dict(state)}
+
+
+def stream_progress(preferences: Dict[str, Any], bypass_cache: bool = False, sla_seconds: float = None) -> Iterator[Dict[str, Any]]:
+    """Progress events for one plan, then {"event": "done", "result": {...}}
+
+    sla_seconds is the run's time budget (default TRIPCRAFT_PLAN_SLA, 0 for none).
+    """
+    return app.stream({"preferences": preferences, "bypass_cache": bypass_cache}, plan_config(sla_seconds))
+
+
+def astream_progress(preferences: Dict[str, Any], bypass_cache: bool = False, sla_seconds: float = None) -> AsyncIterator[Dict[str, Any]]:
+    """stream_progress for async callers"""
+    return app.astream({"preferences": preferences, "bypass_cache": bypass_cache}, plan_config(sla_seconds))
+
+
 # Create app instance
 app = SimpleWorkflowApp()
-
-print("✅ Simple workflow initialized (no LangGraph)")